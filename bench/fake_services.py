@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+本地假服务：模拟 searchTopic 文章接口、合同PDF下载接口和飞书多维表格接口，供基准测试使用
+
+    python bench/fake_services.py --port 8790 --articles 100000 --latency-ms 20 --error-rate 0.01
+
+    SCYS_API_URL=http://127.0.0.1:8790/shengcai-web/client/homePage/searchTopic  爬虫
+    gen_data.py contracts --base-url http://127.0.0.1:8790                         合同下载
+    FEISHU_API_BASE=http://127.0.0.1:8790/open-apis                                飞书导出
+
+延迟、错误率和 429 限流比例可以按服务分别配置，运行中也可以通过 POST /_config 修改；
+GET /_stats 返回各服务的请求数、错误数、限流数和发送字节数
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "scys_perfect_articles"))
+
+from async_http import serve, Response, json_response, HTTPError
+from gen_data import article_item, topic_articles, pdf_bytes, PDF_SIZE
+
+SERVICES = ("articles", "pdf", "feishu")
+# 飞书令牌的有效期（秒）和表示令牌无效的错误码
+TOKEN_TTL = 7200
+TOKEN_INVALID_CODE = 99991663
+
+class Faults:
+    """一个服务的延迟和故障注入配置"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0, throttle_rate=0, retry_after=1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+    def update(self, values):
+        for key, value in values.items():
+            if not hasattr(self, key):
+                raise ValueError(f"未知配置项: {key}")
+            setattr(self, key, float(value))
+
+    async def delay(self):
+        latency = random.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def pick(self):
+        """本次请求的结果：'throttle'、'error' 或 None（正常）"""
+        r = random.random()
+        if r < self.throttle_rate:
+            return "throttle"
+        if r < self.throttle_rate + self.error_rate:
+            return "error"
+        return None
+
+class Stats:
+    def __init__(self):
+        self.counts = {name: {"requests": 0, "ok": 0, "errors": 0, "throttled": 0, "bytes": 0}
+                       for name in SERVICES}
+
+    def record(self, service, outcome, size):
+        counts = self.counts[service]
+        counts["requests"] += 1
+        counts[{"throttle": "throttled", "error": "errors"}.get(outcome, "ok")] += 1
+        counts["bytes"] += size
+
+class FakeFeishu:
+    """飞书多维表格的最小实现：令牌、多维表格、数据表和记录的批量写入（client_token 幂等）"""
+
+    def __init__(self, token_ttl=TOKEN_TTL):
+        self.token_ttl = token_ttl
+        self.tokens = {}
+        self.tables = {}
+        self.records = {}
+        self.client_tokens = {}
+        self.next_record = 0
+
+    def check_token(self, request):
+        token = request.headers.get("authorization", "")[len("Bearer "):]
+        if self.tokens.get(token, 0) < time.time():
+            return json_response({"code": TOKEN_INVALID_CODE, "msg": "Invalid access token"}, 400)
+        return None
+
+    def handle(self, request, path):
+        if path == "/auth/v3/tenant_access_token/internal":
+            token = f"t-{uuid.uuid4().hex}"
+            self.tokens[token] = time.time() + self.token_ttl
+            return json_response({"code": 0, "tenant_access_token": token,
+                                  "expire": self.token_ttl})
+        rejected = self.check_token(request)
+        if rejected:
+            return rejected
+
+        parts = path.strip("/").split("/")
+        # bitable/v1/apps[/{app}/tables[/{table}/records/{action}]]
+        if parts[:3] != ["bitable", "v1", "apps"]:
+            raise HTTPError(404)
+        if len(parts) == 3 and request.method == "POST":
+            app_token = f"app{uuid.uuid4().hex[:12]}"
+            self.tables[app_token] = {}
+            return json_response({"code": 0, "data": {"app": {"app_token": app_token}}})
+        app_token = parts[3] if len(parts) > 3 else None
+        tables = self.tables.setdefault(app_token, {})
+        if len(parts) == 5 and parts[4] == "tables":
+            if request.method == "GET":
+                items = [{"table_id": table_id, "name": name} for table_id, name in tables.items()]
+                return json_response({"code": 0, "data": {"items": items, "has_more": False}})
+            table_id = f"tbl{uuid.uuid4().hex[:12]}"
+            tables[table_id] = (request.json() or {}).get("table", {}).get("name", "")
+            self.records[table_id] = set()
+            return json_response({"code": 0, "data": {"table_id": table_id}})
+        if len(parts) == 8 and parts[6] == "records" and request.method == "POST":
+            return self.write_records(parts[5], parts[7], request)
+        raise HTTPError(404)
+
+    def write_records(self, table_id, action, request):
+        records = self.records.setdefault(table_id, set())
+        client_token = request.query.get("client_token")
+        if client_token and client_token in self.client_tokens:
+            return json_response({"code": 0, "data": {"records": self.client_tokens[client_token]}})
+        items = (request.json() or {}).get("records") or []
+        if len(items) > 500:
+            return json_response({"code": 1254104, "msg": "RecordExceedLimit"}, 400)
+        result = []
+        for item in items:
+            if action == "batch_create":
+                self.next_record += 1
+                record_id = f"rec{self.next_record}"
+                records.add(record_id)
+            elif action == "batch_update":
+                record_id = item.get("record_id")
+                if record_id not in records:
+                    return json_response({"code": 1254043, "msg": "RecordIdNotFound"}, 400)
+            else:
+                raise HTTPError(404)
+            result.append({"record_id": record_id, "fields": item.get("fields", {})})
+        if client_token:
+            # 重复请求只需返回相同的记录ID
+            self.client_tokens[client_token] = [{"record_id": r["record_id"]} for r in result]
+        return json_response({"code": 0, "data": {"records": result}})
+
+def searchtopic_response(request, total):
+    data = request.json() or {}
+    page = int(data.get("pageIndex", 1))
+    page_size = int(data.get("pageSize", 20))
+    ids = topic_articles(total, str(data.get("topicTypeId") or ""))
+    items = [article_item(n) for n in ids[(page - 1) * page_size:page * page_size]]
+    return json_response({"success": True, "data": {"items": items}})
+
+def pdf_response(request, pdf_size):
+    contract_id = request.query.get("docId")
+    if not contract_id:
+        raise HTTPError(404)
+    content = pdf_bytes(contract_id, pdf_size)
+    range_header = request.headers.get("range", "")
+    if range_header.startswith("bytes=") and range_header.endswith("-"):
+        offset = int(range_header[len("bytes="):-1] or 0)
+        if offset >= len(content):
+            return Response(416, b"", "application/pdf",
+                            {"Content-Range": f"bytes */{len(content)}"})
+        return Response(206, content[offset:], "application/pdf",
+                        {"Content-Range": f"bytes {offset}-{len(content) - 1}/{len(content)}"})
+    return Response(200, content, "application/pdf")
+
+def fault_response(service, outcome, faults):
+    retry_after = f"{faults.retry_after:g}"
+    if service == "articles":
+        if outcome == "throttle":
+            return json_response({"success": False, "message": "请求过于频繁"}, 429,
+                                 {"Retry-After": retry_after})
+        # 一半是 HTTP 错误，一半是 success 为 false 的业务错误
+        if random.random() < 0.5:
+            return json_response({"success": False, "message": "系统繁忙"}, 500)
+        return json_response({"success": False, "message": "系统繁忙"})
+    if service == "pdf":
+        if outcome == "throttle":
+            return Response(429, b"", headers={"Retry-After": retry_after})
+        return Response(500, b"internal error")
+    if outcome == "throttle":
+        return json_response({"code": 99991400, "msg": "request trigger frequency limit"}, 429,
+                             {"x-ogw-ratelimit-reset": retry_after})
+    return json_response({"code": 1255040, "msg": "internal error"}, 500)
+
+def make_handler(faults, stats, feishu, total_articles, pdf_size):
+    """请求路由
+
+    POST /shengcai-web/client/homePage/searchTopic   文章列表（分页，可按 topicTypeId 过滤）
+    GET  /viewdocs/getdocs.action?docId=...           合同PDF（支持 Range 续传）
+    *    /open-apis/...                               飞书多维表格接口
+    GET  /_stats                                      各服务的统计
+    POST /_config                                     修改故障配置 {"service": 服务, 配置项: 值}
+    POST /_reset                                      清零统计
+    """
+
+    def service_of(path):
+        if path.endswith("/homePage/searchTopic"):
+            return "articles"
+        if path.endswith("/getdocs.action"):
+            return "pdf"
+        if path.startswith("/open-apis/"):
+            return "feishu"
+        return None
+
+    async def handle(request):
+        if request.path == "/_stats":
+            return json_response(stats.counts)
+        if request.path == "/_reset" and request.method == "POST":
+            stats.__init__()
+            return json_response({"reset": True})
+        if request.path == "/_config" and request.method == "POST":
+            values = dict(request.json() or {})
+            names = [values.pop("service")] if values.get("service") else list(SERVICES)
+            for name in names:
+                if name not in faults:
+                    raise HTTPError(400, f"未知服务: {name}")
+                try:
+                    faults[name].update(values)
+                except ValueError as e:
+                    raise HTTPError(400, str(e))
+            return json_response({name: vars(f) for name, f in faults.items()})
+
+        service = service_of(request.path)
+        if service is None:
+            raise HTTPError(404)
+        await faults[service].delay()
+        outcome = faults[service].pick()
+        if outcome:
+            response = fault_response(service, outcome, faults[service])
+        elif service == "articles":
+            response = searchtopic_response(request, total_articles)
+        elif service == "pdf":
+            response = pdf_response(request, pdf_size)
+        else:
+            response = feishu.handle(request, request.path[len("/open-apis"):])
+        stats.record(service, outcome, len(response.body))
+        return response
+
+    return handle
+
+async def run(host, port, faults, total_articles, pdf_size, token_ttl):
+    server = await serve(make_handler(faults, Stats(), FakeFeishu(token_ttl), total_articles,
+                                      pdf_size), host, port)
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基准测试用的本地假服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8790, help="监听端口")
+    parser.add_argument("--articles", type=int, default=100000, help="文章接口提供的文章总数")
+    parser.add_argument("--pdf-kb", type=int, default=PDF_SIZE // 1024, help="每份合同PDF的大小（KB）")
+    parser.add_argument("--token-ttl", type=int, default=TOKEN_TTL, help="飞书令牌的有效期（秒）")
+    parser.add_argument("--latency-ms", type=float, default=0, help="每个请求的平均延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟的标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回服务端错误的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0, help="返回 429 限流的比例")
+    parser.add_argument("--retry-after", type=float, default=1, help="429 响应建议的等待秒数")
+    parser.add_argument("--service-config", default="{}",
+                        help='按服务覆盖的配置（JSON），如 {"feishu": {"throttle_rate": 0.05}}')
+    args = parser.parse_args()
+
+    faults = {name: Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate,
+                           args.retry_after) for name in SERVICES}
+    for name, values in json.loads(args.service_config).items():
+        faults[name].update(values)
+    try:
+        asyncio.run(run(args.host, args.port, faults, args.articles, args.pdf_kb * 1024,
+                        args.token_ttl))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基准测试用的合成数据
+
+    python bench/gen_data.py articles --count 100000 --db /tmp/bench/scys_articles.db
+    python bench/gen_data.py contracts --count 50000 --csv /tmp/bench/contracts.csv
+
+文章和合同PDF都由编号确定性地生成，本地假服务（fake_services.py）返回的内容与这里一致
+"""
+
+import os
+import sys
+import csv
+import time
+import random
+import hashlib
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "scys_perfect_articles"))
+
+# 第一篇文章的创建时间（毫秒），之后每篇早一分钟
+BASE_GMT = 1745000000000
+# 分类数量：第 n 篇文章属于分类 n % TOPIC_TYPES
+TOPIC_TYPES = 3
+# 作者数量
+AUTHORS = 97
+# 合成PDF的默认大小（字节）
+PDF_SIZE = 64 * 1024
+
+WORDS = ("私域 流量 变现 小红书 抖音 副业 电商 选品 直播 带货 AI 工具 写作 公众号 社群 运营 "
+         "增长 复盘 项目 出海 跨境 闲鱼 视频号 知识付费 投放 转化 客单价 复购 供应链 短视频").split()
+
+def article_item(n):
+    """第 n 篇文章，结构与 searchTopic 接口返回的 items 元素相同"""
+    rng = random.Random(n)
+    return {
+        "topicDTO": {
+            "entityId": f"B{n}",
+            "topicId": n,
+            "topicTypeId": str(n % TOPIC_TYPES),
+            "articleContent": "".join(rng.choice(WORDS) + "的方法，" for _ in range(150)),
+            "aiSummaryContent": "".join(rng.choice(WORDS) for _ in range(20)),
+            "gmtCreate": BASE_GMT - n * 60000,
+        },
+        "topicUserDTO": {"name": f"作者{n % AUTHORS}"},
+    }
+
+def topic_articles(total, topic_type_id=""):
+    """某个分类（默认全部）的文章编号序列，按创建时间从新到旧"""
+    if not topic_type_id:
+        return range(total)
+    return range(int(topic_type_id) % TOPIC_TYPES, total, TOPIC_TYPES)
+
+def pdf_bytes(contract_id, size=PDF_SIZE):
+    """合同的PDF内容，每份合同内容不同，长度固定为 size"""
+    head = f"%PDF-1.4\n% contract {contract_id}\n".encode("ascii")
+    tail = b"\n%%EOF\n"
+    block = hashlib.sha256(str(contract_id).encode("utf-8")).digest() * 32
+    body_size = max(size - len(head) - len(tail), 0)
+    body = (block * (body_size // len(block) + 1))[:body_size]
+    return head + body + tail
+
+def contract_url(base_url, contract_id):
+    return f"{base_url.rstrip('/')}/viewdocs/viewdocs.action?docId={contract_id}"
+
+def generate_articles(db_file, count, page_size=500):
+    """通过爬虫的 ArticleWriter 写入 count 篇文章（含正文压缩和全文索引）"""
+    import scys_crawler
+
+    scys_crawler.DB_FILE = db_file
+    scys_crawler.init_database()
+    writer = scys_crawler.ArticleWriter(db_file)
+    started = time.time()
+    try:
+        for start in range(0, count, page_size):
+            writer.save_page([article_item(n) for n in range(start, min(start + page_size, count))])
+    finally:
+        writer.close()
+    print(f"已生成 {count} 篇文章，用时 {time.time() - started:.1f} 秒: {db_file}")
+
+def generate_contracts(csv_path, count, base_url):
+    """生成 importFDD 使用的合同CSV，合同地址指向假服务"""
+    os.makedirs(os.path.dirname(os.path.abspath(csv_path)), exist_ok=True)
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["合同ID", "合同文件", "合同地址"])
+        for n in range(count):
+            contract_id = f"C{n:07d}"
+            writer.writerow([contract_id, f"合同_{contract_id}", contract_url(base_url, contract_id)])
+    print(f"已生成 {count} 份合同: {csv_path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="生成基准测试用的合成数据")
+    parser.add_argument("kind", choices=["articles", "contracts"], help="生成文章数据库或合同CSV")
+    parser.add_argument("--count", type=int, default=None,
+                        help="数量，默认文章 100000 篇、合同 50000 份")
+    parser.add_argument("--db", default="scys_articles.db", help="articles 写入的数据库文件")
+    parser.add_argument("--csv", default="contracts.csv", help="contracts 写入的CSV文件")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8790",
+                        help="合同地址指向的假服务地址")
+    args = parser.parse_args()
+
+    if args.kind == "articles":
+        generate_articles(args.db, args.count or 100000)
+    else:
+        generate_contracts(args.csv, args.count or 50000, args.base_url)
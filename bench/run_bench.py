@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+端到端基准测试：对本地假服务运行爬虫、合同下载、HTML导出和飞书导出，按阶段输出 JSON
+
+    python bench/run_bench.py --output bench_result.json
+    python bench/run_bench.py --articles 20000 --contracts 5000 --baseline bench_result.json
+
+每个阶段在独立的子进程中运行，报告耗时、pages/s、MB/s、records/s 和该进程的峰值内存；
+指定 --baseline 时与之前的结果比较，吞吐下降或内存增长超过 --tolerance 时以状态码 1 退出
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import resource
+import subprocess
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+ARTICLES_DIR = os.path.join(ROOT, "scys_perfect_articles")
+sys.path.insert(0, ARTICLES_DIR)
+sys.path.insert(0, ROOT)
+
+import gen_data
+
+STAGES = ("crawl", "download", "export_html", "export_feishu")
+# 比较时越大越好的指标和越小越好的指标
+THROUGHPUT_METRICS = ("pages_per_s", "mb_per_s", "records_per_s")
+COST_METRICS = ("peak_rss_mb",)
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），Linux 上 ru_maxrss 单位为 KB，macOS 上为字节"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def count_rows(db_file, sql):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(sql).fetchone()[0]
+    finally:
+        conn.close()
+
+def run_stage(stage, args):
+    """在当前（子）进程中运行一个阶段，返回 {records, bytes}"""
+    os.chdir(args.workdir)
+    if stage == "crawl":
+        # 爬虫在导入时读取这些配置
+        os.environ.update({
+            "SCYS_API_URL": f"{args.base_url}/shengcai-web/client/homePage/searchTopic",
+            "TOTAL_ARTICLES": str(args.articles),
+            "CRAWL_RPS": "0",
+            "CRAWL_CONCURRENCY": str(args.workers),
+        })
+        import scys_crawler
+        for path in ("scys_articles.db", "scys_articles.db-wal", "scys_articles.db-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(scys_crawler.RAW_DATA_DIR, ignore_errors=True)
+        scys_crawler.main()
+        return {"records": count_rows("scys_articles.db", "SELECT COUNT(*) FROM articles")}
+
+    if stage == "download":
+        import importFDD
+        shutil.rmtree("contracts", ignore_errors=True)
+        importFDD.download_contracts("contracts.csv", "contracts", max_retries=3, retry_delay=0.2,
+                                     workers=args.workers, per_host_limit=args.workers)
+        manifest = os.path.join("contracts", importFDD.MANIFEST_NAME)
+        return {"records": count_rows(manifest,
+                                      "SELECT COUNT(*) FROM contracts WHERE state = 'done'")}
+
+    if stage == "export_html":
+        import export_to_html
+        shutil.rmtree(export_to_html.EXPORT_DIR, ignore_errors=True)
+        export_to_html.export_to_html(0, open_browser=False)
+        return {"records": count_rows("scys_articles.db", "SELECT COUNT(*) FROM articles"),
+                "bytes": dir_size(export_to_html.EXPORT_DIR)}
+
+    if stage == "export_feishu":
+        for path in (".feishu_token.json", "feishu_sync.db"):
+            if os.path.exists(path):
+                os.remove(path)
+        os.environ.update({
+            "FEISHU_API_BASE": f"{args.base_url}/open-apis",
+            "FEISHU_APP_ID": "cli_bench",
+            "FEISHU_APP_SECRET": "bench",
+            "FEISHU_BITABLE_ID": "app_bench",
+        })
+        import export_to_feishu
+        ok = export_to_feishu.export_to_feishu_bitable(0, use_existing=True)
+        records = count_rows("scys_articles.db", "SELECT COUNT(*) FROM articles") if ok else 0
+        return {"records": records}
+
+    raise ValueError(f"未知阶段: {stage}")
+
+def stage_main(args):
+    """子进程入口：运行阶段并把结果写入 --metrics-file"""
+    started = time.perf_counter()
+    result = run_stage(args.stage, args)
+    result["seconds"] = time.perf_counter() - started
+    result["peak_rss_mb"] = peak_rss_mb()
+    with open(args.metrics_file, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+def call_service(base_url, path, data=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    request = urllib.request.Request(base_url + path, data=body, method="POST" if body else "GET",
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+def start_services(args):
+    """启动假服务子进程，等待其可以访问"""
+    command = [sys.executable, os.path.join(BENCH_DIR, "fake_services.py"),
+               "--port", str(args.port), "--articles", str(args.articles),
+               "--pdf-kb", str(args.pdf_kb), "--latency-ms", str(args.latency_ms),
+               "--jitter-ms", str(args.jitter_ms), "--error-rate", str(args.error_rate),
+               "--throttle-rate", str(args.throttle_rate), "--retry-after", str(args.retry_after)]
+    log = open(os.path.join(args.workdir, "fake_services.log"), "w")
+    process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+    for _ in range(100):
+        try:
+            call_service(args.base_url, "/_stats")
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("假服务启动失败，见 fake_services.log")
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("假服务启动超时")
+
+def prepare_data(args, stages):
+    """生成阶段需要的输入数据（不计入耗时）"""
+    if "download" in stages:
+        gen_data.generate_contracts(os.path.join(args.workdir, "contracts.csv"), args.contracts,
+                                    args.base_url)
+    db_file = os.path.join(args.workdir, "scys_articles.db")
+    if "crawl" not in stages and ({"export_html", "export_feishu"} & set(stages)):
+        if not os.path.exists(db_file) or count_rows(
+                db_file, "SELECT COUNT(*) FROM articles") != args.articles:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_file + suffix):
+                    os.remove(db_file + suffix)
+            gen_data.generate_articles(db_file, args.articles)
+
+def measure(stage, args):
+    """在子进程中运行一个阶段，结合假服务的统计计算各项指标"""
+    call_service(args.base_url, "/_reset", {})
+    metrics_file = os.path.join(args.workdir, f".metrics_{stage}.json")
+    command = [sys.executable, os.path.abspath(__file__), "--stage", stage,
+               "--metrics-file", metrics_file] + args.forward
+    log_path = os.path.join(args.workdir, "logs", f"{stage}.log")
+    print(f"运行阶段 {stage} ...", flush=True)
+    with open(log_path, "w") as log:
+        code = subprocess.call(command, stdout=log, stderr=subprocess.STDOUT, cwd=args.workdir)
+    if code != 0:
+        print(f"阶段 {stage} 失败（退出码 {code}），见 {log_path}")
+        return {"error": f"exit code {code}"}
+    with open(metrics_file, encoding="utf-8") as f:
+        result = json.load(f)
+    os.remove(metrics_file)
+    stats = call_service(args.base_url, "/_stats")
+
+    seconds = max(result["seconds"], 1e-9)
+    metrics = {
+        "seconds": round(seconds, 3),
+        "records": result["records"],
+        "records_per_s": round(result["records"] / seconds, 1),
+        "peak_rss_mb": round(result["peak_rss_mb"], 1),
+    }
+    if stage == "crawl":
+        metrics["pages"] = stats["articles"]["ok"]
+        metrics["pages_per_s"] = round(stats["articles"]["ok"] / seconds, 1)
+    size = {"download": stats["pdf"]["bytes"], "crawl": stats["articles"]["bytes"],
+            "export_feishu": stats["feishu"]["bytes"]}.get(stage, result.get("bytes", 0))
+    metrics["mb_per_s"] = round(size / (1024 * 1024) / seconds, 2)
+    service = {"crawl": "articles", "download": "pdf", "export_feishu": "feishu"}.get(stage)
+    if service:
+        metrics["requests"] = stats[service]["requests"]
+        metrics["errors"] = stats[service]["errors"]
+        metrics["throttled"] = stats[service]["throttled"]
+    print(f"  {json.dumps(metrics, ensure_ascii=False)}", flush=True)
+    return metrics
+
+def compare(report, baseline, tolerance):
+    """与基准结果比较，返回回退项列表"""
+    regressions = []
+    for stage, metrics in report["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before or "error" in metrics or "error" in before:
+            continue
+        for name in THROUGHPUT_METRICS + COST_METRICS:
+            if not before.get(name) or name not in metrics:
+                continue
+            change = (metrics[name] - before[name]) / before[name]
+            worse = change < -tolerance if name in THROUGHPUT_METRICS else change > tolerance
+            marker = "  <-- 回退" if worse else ""
+            print(f"{stage:14} {name:14} {before[name]:>10} -> {metrics[name]:>10} "
+                  f"({change:+.1%}){marker}")
+            if worse:
+                regressions.append(f"{stage}.{name}")
+    return regressions
+
+def main(args):
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            raise SystemExit(f"未知阶段: {stage}，可选 {', '.join(STAGES)}")
+    os.makedirs(os.path.join(args.workdir, "logs"), exist_ok=True)
+
+    services = None if args.external else start_services(args)
+    try:
+        prepare_data(args, stages)
+        report = {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {k: getattr(args, k) for k in (
+                "articles", "contracts", "pdf_kb", "workers", "latency_ms", "jitter_ms",
+                "error_rate", "throttle_rate")},
+            "stages": {stage: measure(stage, args) for stage in stages},
+        }
+    finally:
+        if services:
+            services.terminate()
+            services.wait()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"性能回退: {', '.join(regressions)}")
+            raise SystemExit(1)
+    if any("error" in metrics for metrics in report["stages"].values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端基准测试")
+    parser.add_argument("--stages", default=",".join(STAGES), help="要运行的阶段，逗号分隔")
+    parser.add_argument("--workdir", default=os.path.join(ROOT, "bench_work"),
+                        help="数据和输出目录")
+    parser.add_argument("--articles", type=int, default=100000, help="文章数量")
+    parser.add_argument("--contracts", type=int, default=50000, help="合同数量")
+    parser.add_argument("--pdf-kb", type=int, default=gen_data.PDF_SIZE // 1024,
+                        help="每份合同PDF的大小（KB）")
+    parser.add_argument("--workers", type=int, default=8, help="爬虫和下载的并发数")
+    parser.add_argument("--port", type=int, default=8790, help="假服务端口")
+    parser.add_argument("--external", action="store_true",
+                        help="使用已经启动的假服务（--port 指定端口），不自动启动")
+    parser.add_argument("--latency-ms", type=float, default=20, help="假服务的平均延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=5, help="延迟的标准差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.01, help="假服务返回错误的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.01, help="假服务返回 429 的比例")
+    parser.add_argument("--retry-after", type=float, default=1, help="429 响应建议的等待秒数")
+    parser.add_argument("--output", help="结果 JSON 的保存路径")
+    parser.add_argument("--baseline", help="与之前保存的结果 JSON 比较")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="允许的性能波动比例，超过视为回退")
+    parser.add_argument("--stage", help=argparse.SUPPRESS)
+    parser.add_argument("--metrics-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+    args.base_url = f"http://127.0.0.1:{args.port}"
+    # 子进程使用相同的数据规模和并发配置
+    args.forward = ["--workdir", args.workdir, "--articles", str(args.articles),
+                    "--workers", str(args.workers), "--port", str(args.port)]
+
+    if args.stage:
+        stage_main(args)
+    else:
+        main(args)
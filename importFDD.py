@@ -1,21 +1,563 @@
 import os
+import sys
 import csv
 import requests
 import time
 from datetime import datetime
 import re
+import argparse
+import sqlite3
+import hashlib
+import random
+import mmap
+import multiprocessing
+import json
+import glob
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+
+try:
+    from pypdf import PdfReader  # 可选依赖，仅全文索引需要
+except ImportError:
+    PdfReader = None
+
+# 全文检索的切词与文章爬虫共用
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'scys_perfect_articles'))
+from text_search import bigram_tokens, build_match_query, make_snippet
+
+# 下载请求头
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
+                'AppleWebKit/537.36 (KHTML, like Gecko) '
+                'Chrome/58.0.3029.110 Safari/537.3'
+}
+
+# 下载清单数据库（位于输出目录下）
+MANIFEST_NAME = 'manifest.db'
+# 清单批量提交的间隔（条）
+COMMIT_EVERY = 100
+# 指数退避的最大等待时间（秒）
+MAX_BACKOFF = 60
+# 内容寻址存储目录（位于输出目录下），文件按SHA-256存放
+STORE_DIR = '.store'
+# 分片进度文件目录（位于输出目录下）
+PROGRESS_DIR = 'progress'
+# 进度文件刷新间隔（秒）
+PROGRESS_INTERVAL = 5
+# 调度器中最多排队的任务数（按主机分组），限制内存占用
+QUEUE_WINDOW = 1000
+# 单个任务因限流（429/503）被重新排队的最大次数
+MAX_THROTTLES = 10
+# 全文索引数据库（位于输出目录下）
+TEXT_INDEX_NAME = 'contracts_text.db'
+# 全文索引的词元格式版本，变化后旧索引清空，下次 index 时重新提取
+TEXT_INDEX_VERSION = 2
 
 def sanitize_filename(filename):
     """清理文件名中的非法字符"""
     return re.sub(r'[\\/*?:"<>|]', '_', filename)
 
-def download_contracts(csv_path, output_dir, max_retries=3, retry_delay=1):
-    """下载合同文件主函数"""
+def create_session(workers=1, per_host_limit=4):
+    """创建带连接池的会话，所有下载线程共享
+
+    per_host_limit 限制同一主机的并发连接数，连接池耗尽时线程阻塞等待
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(workers, 10),
+                          pool_maxsize=per_host_limit,
+                          pool_block=True)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(HEADERS)
+    return session
+
+class IncompleteDownloadError(requests.exceptions.RequestException):
+    """下载长度与 Content-Length 不一致"""
+
+class ThrottledError(requests.exceptions.RequestException):
+    """服务器返回 429/503，要求降低请求频率"""
+
+    def __init__(self, *args, retry_after=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """线程安全的令牌桶，rate 为每秒补充的令牌数
+
+    令牌允许透支：消费者先预定令牌，再按欠额睡眠，多线程下平均速率不超过 rate
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount=1):
+        """取出 amount 个令牌，不足时阻塞等待"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait_time = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait_time:
+            time.sleep(wait_time)
+
+class HostScheduler:
+    """按主机分组的下载任务调度器（仅在主线程中使用）
+
+    各主机轮询出队，保证一个慢主机不会占满所有下载线程；
+    每个主机的在途任务数不超过 per_host_limit，被限流的主机单独退避
+    """
+
+    def __init__(self, per_host_limit=4, retry_delay=1):
+        self.per_host_limit = per_host_limit
+        self.retry_delay = retry_delay
+        self.queues = {}
+        self.order = deque()
+        self.active = {}
+        self.blocked_until = {}
+        self.penalty = {}
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, host, task, front=False):
+        """加入任务；front 为真时放到该主机队首（用于限流后重新排队）"""
+        if host not in self.queues:
+            self.queues[host] = deque()
+            self.order.append(host)
+            self.active[host] = 0
+        if front:
+            self.queues[host].appendleft(task)
+        else:
+            self.queues[host].append(task)
+        self.size += 1
+
+    def next_ready(self):
+        """轮询取出下一个可执行的任务，返回 (主机, 任务)，没有时返回 None"""
+        now = time.monotonic()
+        for _ in range(len(self.order)):
+            host = self.order[0]
+            self.order.rotate(-1)
+            queue = self.queues[host]
+            if (queue and self.active[host] < self.per_host_limit
+                    and self.blocked_until.get(host, 0) <= now):
+                self.active[host] += 1
+                self.size -= 1
+                return host, queue.popleft()
+        return None
+
+    def finished(self, host, throttled=False, retry_after=None):
+        """任务结束；被限流时按 Retry-After 或指数退避暂停该主机"""
+        self.active[host] -= 1
+        if not throttled:
+            self.penalty.pop(host, None)
+            return
+        delay = min(MAX_BACKOFF, self.penalty.get(host, self.retry_delay / 2) * 2)
+        self.penalty[host] = delay
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.blocked_until[host] = time.monotonic() + delay
+        print(f"主机 {host} 限流，暂停 {delay:.1f} 秒")
+
+    def next_wakeup(self):
+        """距离最近一个被暂停且有任务的主机恢复还有多少秒，没有时返回 None"""
+        now = time.monotonic()
+        delays = [self.blocked_until[host] - now for host, queue in self.queues.items()
+                  if queue and self.blocked_until.get(host, 0) > now]
+        return max(0, min(delays)) if delays else None
+
+def parse_total_length(response, offset):
+    """根据响应头计算文件总长度，未知时返回 None"""
+    content_range = response.headers.get('Content-Range')
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return offset + int(content_length)
+    return None
+
+def file_sha256(filepath):
+    """计算文件的SHA-256"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def parse_retry_after(response):
+    """解析 Retry-After 响应头（秒数），无法解析时返回 None"""
+    value = response.headers.get('Retry-After', '').strip()
+    return int(value) if value.isdigit() else None
+
+def retry_wait(attempt, retry_delay, backoff=False):
+    """计算第 attempt 次失败后的等待时间
+
+    backoff 为真时使用带抖动的指数退避，避免大量重试同时打到服务器
+    """
+    if not backoff:
+        return retry_delay
+    ceiling = min(MAX_BACKOFF, retry_delay * (2 ** attempt))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+def fetch_pdf(session, pdf_url, filepath, max_retries=3, retry_delay=1, backoff=False,
+              request_bucket=None, byte_bucket=None):
+    """带重试机制下载单个PDF，返回 (sha256, 文件大小, 最后一次错误)
+
+    失败时 sha256 为 None。数据先写入 filepath + '.part'，校验完整后再原子重命名；
+    中断留下的 .part 文件会通过 Range 请求续传。
+    request_bucket / byte_bucket 为全局的请求数和字节数令牌桶；
+    遇到 429/503 时不在本线程重试，直接返回 ThrottledError 交给调度器退避
+    """
+    part_path = filepath + '.part'
+    error = None
+    for attempt in range(max_retries):
+        try:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            # 续传时按字节偏移请求，禁用压缩以保证偏移准确
+            headers = {'Accept-Encoding': 'identity'}
+            if offset:
+                headers['Range'] = f'bytes={offset}-'
+
+            if request_bucket:
+                request_bucket.consume()
+            with session.get(pdf_url, headers=headers, stream=True, timeout=10) as response:
+                if response.status_code in (429, 503):
+                    raise ThrottledError(f"服务器限流: HTTP {response.status_code}",
+                                         retry_after=parse_retry_after(response),
+                                         response=response)
+                if response.status_code == 416:
+                    # 服务器无法满足续传范围，丢弃临时文件重新下载
+                    os.remove(part_path)
+                    raise IncompleteDownloadError(f"续传范围无效: {offset}", response=response)
+                response.raise_for_status()
+
+                if response.status_code != 206:
+                    # 服务器不支持Range，从头开始下载
+                    offset = 0
+                expected = parse_total_length(response, offset)
+
+                # 保存文件
+                with open(part_path, 'ab' if offset else 'wb') as pdf_file:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:  # 过滤保持连接的空白块
+                            pdf_file.write(chunk)
+                            if byte_bucket:
+                                byte_bucket.consume(len(chunk))
+
+            size = os.path.getsize(part_path)
+            if expected is not None and size != expected:
+                raise IncompleteDownloadError(f"文件不完整: {size}/{expected} 字节")
+
+            digest = file_sha256(part_path)
+            os.replace(part_path, filepath)
+            return digest, size, None
+
+        except ThrottledError as e:
+            return None, 0, e
+        except requests.exceptions.RequestException as e:
+            error = e
+            if attempt < max_retries - 1:
+                print(f"第{attempt+1}次尝试失败，正在重试...")
+                time.sleep(retry_wait(attempt, retry_delay, backoff))
+    return None, 0, error
+
+def blob_path(output_dir, digest):
+    """内容寻址存储中的文件路径"""
+    return os.path.join(output_dir, STORE_DIR, digest[:2], f"{digest}.pdf")
+
+def incoming_path(output_dir, contract_id):
+    """下载中的临时文件路径，按合同ID区分以便续传"""
+    return os.path.join(output_dir, STORE_DIR, 'incoming',
+                        f"{sanitize_filename(contract_id)}.pdf")
+
+def link_name(output_dir, digest, filename, contract_id):
+    """为存储中的文件创建可读名称的硬链接
+
+    同名文件已存在且内容不同时视为命名冲突，改用 "名称_合同ID.pdf"。
+    返回 (最终文件名, 是否发生命名冲突)
+    """
+    blob = blob_path(output_dir, digest)
+    stem = os.path.splitext(filename)[0]
+    for candidate in (filename, f"{stem}_{sanitize_filename(contract_id)}.pdf"):
+        path = os.path.join(output_dir, candidate)
+        try:
+            os.link(blob, path)
+        except FileExistsError:
+            if not os.path.samefile(blob, path):
+                continue
+        return candidate, candidate != filename
+    raise FileExistsError(f"命名冲突无法解决: {filename}")
+
+def store_file(output_dir, src_path, digest):
+    """把已下载的文件放入内容寻址存储，内容重复时不占用额外空间"""
+    blob = blob_path(output_dir, digest)
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    try:
+        os.link(src_path, blob)
+    except FileExistsError:
+        pass  # 相同内容已存在，直接复用
+    os.remove(src_path)
+
+def legacy_digest(output_dir, filepath):
+    """文件是旧目录遗留的独立文件时返回其SHA-256，否则返回 None
+
+    已经硬链接到存储中的文件（链接数大于1），或存储中已有相同内容的文件，
+    都是其他合同下载的结果，不能当作本合同的旧文件
+    """
+    if os.stat(filepath).st_nlink != 1:
+        return None
+    digest = file_sha256(filepath)
+    if os.path.exists(blob_path(output_dir, digest)):
+        return None
+    return digest
+
+def adopt_file(output_dir, filepath, digest=None):
+    """把旧目录中按名称保存的文件纳入内容寻址存储，返回其SHA-256"""
+    digest = digest or file_sha256(filepath)
+    blob = blob_path(output_dir, digest)
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    try:
+        os.link(filepath, blob)
+    except FileExistsError:
+        if not os.path.samefile(filepath, blob):
+            # 内容重复的旧文件替换为指向存储的硬链接
+            tmp_path = filepath + '.link'
+            os.link(blob, tmp_path)
+            os.replace(tmp_path, filepath)
+    return digest
+
+def download_to_store(session, pdf_url, output_dir, contract_id, filename,
+                      max_retries=3, retry_delay=1, backoff=False,
+                      request_bucket=None, byte_bucket=None):
+    """下载PDF到内容寻址存储并创建可读名称的硬链接
+
+    返回 (sha256, 文件大小, 最终文件名, 是否命名冲突, 错误)
+    """
+    incoming = incoming_path(output_dir, contract_id)
+    try:
+        digest, size, error = fetch_pdf(session, pdf_url, incoming,
+                                        max_retries, retry_delay, backoff,
+                                        request_bucket, byte_bucket)
+        if digest is None:
+            return None, 0, filename, False, error
+        store_file(output_dir, incoming, digest)
+        final_name, collided = link_name(output_dir, digest, filename, contract_id)
+    except OSError as e:
+        return None, 0, filename, False, e
+    return digest, size, final_name, collided, None
+
+def parse_shard(text):
+    """解析 "i/N" 形式的分片参数，返回 (i, N)，i 从0开始"""
+    index, count = (int(part) for part in text.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"无效的分片参数: {text}")
+    return index, count
+
+def shard_of(contract_id, count):
+    """按合同ID的稳定哈希计算所属分片，与进程和主机无关"""
+    digest = hashlib.md5(contract_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count
+
+def shard_suffix(shard):
+    """分片专用文件名后缀，未分片时为空"""
+    return f"-{shard[0]}-of-{shard[1]}" if shard else ''
+
+def manifest_path(output_dir, shard=None):
+    """清单数据库路径；各分片使用独立的清单，多主机运行时互不加锁"""
+    name, ext = os.path.splitext(MANIFEST_NAME)
+    return os.path.join(output_dir, f"{name}{shard_suffix(shard)}{ext}")
+
+def open_manifest(output_dir, shard=None):
+    """打开下载清单数据库，记录每个合同的下载状态"""
+    conn = sqlite3.connect(manifest_path(output_dir, shard), timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS contracts (
+        contract_id TEXT PRIMARY KEY,
+        name TEXT,
+        filename TEXT,
+        url TEXT,
+        state TEXT NOT NULL,
+        size INTEGER,
+        sha256 TEXT,
+        last_error TEXT,
+        attempts INTEGER DEFAULT 0,
+        updated_at TEXT
+    )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_contracts_state ON contracts(state)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_contracts_filename ON contracts(filename)')
+    conn.commit()
+    return conn
+
+def manifest_state(conn, contract_id):
+    """查询合同的下载状态，不存在时返回 None"""
+    row = conn.execute('SELECT state FROM contracts WHERE contract_id = ?',
+                       (contract_id,)).fetchone()
+    return row[0] if row else None
+
+class ManifestSet:
+    """同一输出目录下其他分片（或未分片）的清单，只读查询文件名的归属"""
+
+    def __init__(self, output_dir, own_path):
+        self.output_dir = output_dir
+        self.own_path = os.path.abspath(own_path)
+        self.conns = {}
+
+    def refresh(self):
+        # 其他进程可能在运行期间创建新的分片清单
+        name, ext = os.path.splitext(MANIFEST_NAME)
+        for path in glob.glob(os.path.join(self.output_dir, f"{name}*{ext}")):
+            path = os.path.abspath(path)
+            if path != self.own_path and path not in self.conns:
+                self.conns[path] = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30)
+
+    def owner(self, filename):
+        """在其他清单中查询占用该文件名的合同，返回 (合同ID, 地址, 大小, sha256) 或 None"""
+        self.refresh()
+        for conn in self.conns.values():
+            try:
+                row = conn.execute(
+                    "SELECT contract_id, url, size, sha256 FROM contracts "
+                    "WHERE filename = ? AND state = 'done' LIMIT 1", (filename,)).fetchone()
+            except sqlite3.Error:
+                continue
+            if row:
+                return row
+        return None
+
+    def close(self):
+        for conn in self.conns.values():
+            conn.close()
+        self.conns.clear()
+
+def filename_owner(conn, filename):
+    """查询占用该文件名的合同ID"""
+    row = conn.execute('SELECT contract_id FROM contracts WHERE filename = ? LIMIT 1',
+                       (filename,)).fetchone()
+    return row[0] if row else None
+
+def mark_done(conn, contract_id, name, filename, url, size, sha256):
+    """记录下载成功"""
+    conn.execute('''
+    INSERT INTO contracts (contract_id, name, filename, url, state, size, sha256,
+                           last_error, attempts, updated_at)
+    VALUES (?, ?, ?, ?, 'done', ?, ?, NULL, 1, ?)
+    ON CONFLICT(contract_id) DO UPDATE SET
+        name = excluded.name, filename = excluded.filename, url = excluded.url,
+        state = 'done', size = excluded.size, sha256 = excluded.sha256,
+        last_error = NULL, attempts = attempts + 1, updated_at = excluded.updated_at
+    ''', (contract_id, name, filename, url, size, sha256,
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+def mark_failed(conn, contract_id, name, filename, url, error_msg):
+    """记录下载失败"""
+    conn.execute('''
+    INSERT INTO contracts (contract_id, name, filename, url, state, last_error,
+                           attempts, updated_at)
+    VALUES (?, ?, ?, ?, 'failed', ?, 1, ?)
+    ON CONFLICT(contract_id) DO UPDATE SET
+        name = excluded.name, filename = excluded.filename, url = excluded.url,
+        state = 'failed', last_error = excluded.last_error,
+        attempts = attempts + 1, updated_at = excluded.updated_at
+    ''', (contract_id, name, filename, url, error_msg,
+          datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+def iter_csv_rows(csv_path, position=None):
+    """逐行流式读取CSV，返回 (合同ID, 合同文件, 合同地址)
+
+    position 为字典时，持续更新已读取字节数 'read' 和文件总大小 'size'
+    """
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        if position is not None:
+            position['size'] = os.fstat(f.fileno()).st_size
+        reader = csv.DictReader(f)
+        for row in reader:
+            if position is not None:
+                position['read'] = f.buffer.tell()
+            yield row['合同ID'], row['合同文件'], row['合同地址']
+
+def iter_failed_rows(conn):
+    """从清单中读取失败的合同，返回 (合同ID, 合同文件, 下载地址)"""
+    rows = conn.execute(
+        "SELECT contract_id, name, url FROM contracts WHERE state = 'failed'"
+    ).fetchall()
+    yield from rows
+
+def write_json_atomic(path, data):
+    """原子写入JSON文件，读取方不会看到写了一半的内容"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def merge_progress(output_dir):
+    """汇总所有分片的进度文件，写入 progress/summary.json 并返回汇总结果"""
+    progress_dir = os.path.join(output_dir, PROGRESS_DIR)
+    shards = []
+    for path in sorted(glob.glob(os.path.join(progress_dir, 'shard-*.json'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            shards.append(json.load(f))
+
+    summary = {
+        'shards': len(shards),
+        'finished_shards': sum(1 for p in shards if p['finished']),
+        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    for key in ('total', 'success', 'skipped', 'failed', 'collisions'):
+        summary[key] = sum(p[key] for p in shards)
+    etas = [p['eta_seconds'] for p in shards if not p['finished']]
+    # 整体完成时间取决于最慢的分片
+    summary['eta_seconds'] = None if None in etas else max(etas, default=0)
+
+    os.makedirs(progress_dir, exist_ok=True)
+    write_json_atomic(os.path.join(progress_dir, 'summary.json'), summary)
+    for p in shards:
+        eta = p['eta_seconds']
+        print(f"分片 {p['shard']}/{p['shards']}: 处理 {p['total']}，成功 {p['success']}，"
+              f"跳过 {p['skipped']}，失败 {p['failed']}，"
+              f"{'已完成' if p['finished'] else f'剩余约 {eta} 秒' if eta is not None else '进行中'}")
+    print(f"\n共 {summary['shards']} 个分片，已完成 {summary['finished_shards']} 个，"
+          f"成功 {summary['success']}，跳过 {summary['skipped']}，失败 {summary['failed']}")
+    return summary
+
+def download_contracts(csv_path, output_dir, max_retries=3, retry_delay=1,
+                       workers=1, per_host_limit=4, retry_failed=False, shard=None,
+                       max_rps=None, max_bandwidth=None, extract_text=False):
+    """下载合同文件主函数
+
+    任务按 合同地址 的主机分组，由 HostScheduler 轮询分派给最多 workers 个下载线程；
+    max_rps / max_bandwidth（字节/秒）为全局的请求频率和带宽上限。
+    结果统一在主线程汇总，计数与失败记录和串行模式一致。
+    下载状态记录在清单数据库中，重启时已完成的合同只需一次索引查询即可跳过。
+    文件按内容哈希保存在 STORE_DIR 中，可读名称为硬链接，重复内容不占额外空间。
+    retry_failed 为真时只重试清单中失败的合同，并使用带抖动的指数退避。
+    shard 为 (i, N) 时只处理合同ID哈希落在第 i 片的行，清单、失败记录和
+    进度文件按分片独立保存，多个进程或主机可以无协调地分担同一个CSV。
+    extract_text 为真时，下载完成的文件同时在进程池中提取文本并写入全文索引
+    """
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
+    os.makedirs(os.path.join(output_dir, STORE_DIR, 'incoming'), exist_ok=True)
     
     # 失败记录文件路径
-    failed_path = os.path.join(output_dir, 'failed_downloads.csv')
+    failed_path = os.path.join(output_dir, f'failed_downloads{shard_suffix(shard)}.csv')
+    shard_index, shard_count = shard or (0, 1)
+    progress_path = os.path.join(output_dir, PROGRESS_DIR,
+                                 f"shard-{shard_index}-of-{shard_count}.json")
+    os.makedirs(os.path.dirname(progress_path), exist_ok=True)
     failed_fields = ['合同ID', '合同文件', 'URL', '错误信息', '时间']
     
     # 初始化计数器
@@ -23,84 +565,209 @@ def download_contracts(csv_path, output_dir, max_retries=3, retry_delay=1):
     success_count = 0
     failure_count = 0
     skipped_count = 0
+    collision_count = 0
+    unsaved = 0
+    started = time.time()
+    last_report = 0
+    position = {'read': 0, 'size': 0}
 
-    # 读取CSV文件
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
+    manifest = open_manifest(output_dir, shard)
+    other_manifests = ManifestSet(output_dir, manifest_path(output_dir, shard))
+    session = create_session(workers, per_host_limit)
+    executor = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    scheduler = HostScheduler(per_host_limit, retry_delay)
+    request_bucket = TokenBucket(max_rps) if max_rps else None
+    byte_bucket = TokenBucket(max_bandwidth) if max_bandwidth else None
+    pending = {}
+    # 各任务被限流的次数
+    throttles = {}
+    if extract_text and PdfReader is None:
+        print("全文索引需要 pypdf，请先安装: pip install pypdf，本次跳过文本提取")
+    indexer = TextIndexer(output_dir) if extract_text and PdfReader else None
+    # 在途的合同ID和文件名，避免重复下载或误认旧文件；完成后即移除，内存占用有界
+    claimed = set()
+    claimed_names = set()
+
+    # 失败日志只打开一次（追加模式）
+    f_failed = open(failed_path, 'a', newline='', encoding='utf-8')
+    failed_writer = csv.DictWriter(f_failed, fieldnames=failed_fields)
+    if f_failed.tell() == 0:
+        failed_writer.writeheader()
+
+    def checkpoint():
+        """批量提交清单，避免每行一次事务"""
+        nonlocal unsaved
+        unsaved += 1
+        if unsaved >= COMMIT_EVERY:
+            manifest.commit()
+            unsaved = 0
+
+    def report(finished=False):
+        """按间隔写入本分片的进度和预计剩余时间"""
+        nonlocal last_report
+        now = time.time()
+        if not finished and now - last_report < PROGRESS_INTERVAL:
+            return
+        last_report = now
+        elapsed = now - started
+        fraction = position['read'] / position['size'] if position['size'] else 0
+        eta = round(elapsed * (1 - fraction) / fraction) if fraction else None
+        write_json_atomic(progress_path, {
+            'shard': shard_index,
+            'shards': shard_count,
+            'total': total,
+            'success': success_count,
+            'skipped': skipped_count,
+            'failed': failure_count,
+            'collisions': collision_count,
+            'bytes_read': position['read'],
+            'bytes_total': position['size'],
+            'elapsed_seconds': round(elapsed),
+            'eta_seconds': 0 if finished else eta,
+            'finished': finished,
+            'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+
+    def finish(host, task, result):
+        """处理单个下载结果"""
+        nonlocal success_count, failure_count, collision_count
+        contract_id, conname, pdf_url, filename = task
+        digest, size, final_name, collided, error = result
+
+        throttled = isinstance(error, ThrottledError)
+        scheduler.finished(host, throttled, error.retry_after if throttled else None)
+        if throttled and throttles.get(contract_id, 0) < MAX_THROTTLES:
+            # 被限流的任务重新排队，等待该主机退避结束
+            throttles[contract_id] = throttles.get(contract_id, 0) + 1
+            scheduler.add(host, task, front=True)
+            return
+        throttles.pop(contract_id, None)
+        claimed.discard(contract_id)
+        claimed_names.discard(filename)
+        if digest:
+            if collided:
+                print(f"文件名冲突（{conname}）: {filename} 已被占用，另存为 {final_name}")
+                collision_count += 1
+            print(f"下载成功: {final_name}")
+            success_count += 1
+            mark_done(manifest, contract_id, conname, final_name, pdf_url, size, digest)
+            checkpoint()
+            if indexer:
+                indexer.submit(contract_id, conname, digest)
+            return
+
+        # 处理下载失败的情况
+        failure_count += 1
+        error_msg = str(error)
+        print(f"下载失败（{conname}）: {error_msg}")
+        mark_failed(manifest, contract_id, conname, filename, pdf_url, error_msg)
+        checkpoint()
+        
+        # 记录失败信息
+        failed_writer.writerow({
+            '合同ID': contract_id,
+            '合同文件': conname,
+            'URL': pdf_url,
+            '错误信息': error_msg,
+            '时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    def run(task):
+        """在下载线程中执行单个任务"""
+        contract_id, conname, pdf_url, filename = task
+        return download_to_store(session, pdf_url, output_dir, contract_id, filename,
+                                 max_retries, retry_delay, retry_failed,
+                                 request_bucket, byte_bucket)
+
+    def dispatch():
+        """按主机轮询把就绪的任务交给下载线程，串行模式下直接执行"""
+        while len(pending) < workers:
+            item = scheduler.next_ready()
+            if item is None:
+                return
+            host, task = item
+            if executor is None:
+                finish(host, task, run(task))
+            else:
+                pending[executor.submit(run, task)] = (host, task)
+
+    def drain():
+        """分派任务并等待在途任务完成，所有主机都在退避时等待最近的恢复时间"""
+        dispatch()
+        timeout = scheduler.next_wakeup()
+        if not pending:
+            if timeout:
+                time.sleep(timeout)
+            return
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            host, task = pending.pop(future)
+            finish(host, task, future.result())
+        if indexer:
+            indexer.collect()
+
+    rows = iter_failed_rows(manifest) if retry_failed else iter_csv_rows(csv_path, position)
+    try:
+        for contract_id, conname, view_url in rows:
+            if shard and shard_of(contract_id, shard_count) != shard_index:
+                continue
             total += 1
-            contract_id = row['合同ID']
-            view_url = row['合同地址']
-            conname = row['合同文件']
+            report()
             
             # 清理文件名并生成路径
             conname_safe = sanitize_filename(conname)
             filename = f"{conname_safe}.pdf"
             filepath = os.path.join(output_dir, filename)
             
-            # 检查文件是否已存在
-            if os.path.exists(filepath):
+            # 检查清单中是否已完成；清单中没有记录时才检查文件系统（兼容旧目录）。
+            # 各分片共用输出目录，同名文件可能属于其他分片的合同：只有其他清单也确认归属本合同，
+            # 或文件是未纳入存储的旧文件时才直接采用，否则照常下载，由命名冲突处理另存
+            state = manifest_state(manifest, contract_id)
+            if (state is None and filename not in claimed_names
+                    and filename_owner(manifest, filename) is None
+                    and os.path.exists(filepath)):
+                owner = other_manifests.owner(filename)
+                if owner is not None and owner[0] == contract_id:
+                    _, owner_url, owner_size, owner_digest = owner
+                    mark_done(manifest, contract_id, conname, filename, owner_url,
+                              owner_size, owner_digest)
+                    checkpoint()
+                    state = 'done'
+                elif owner is None:
+                    digest = legacy_digest(output_dir, filepath)
+                    if digest:
+                        mark_done(manifest, contract_id, conname, filename, None,
+                                  os.path.getsize(filepath),
+                                  adopt_file(output_dir, filepath, digest))
+                        checkpoint()
+                        state = 'done'
+            if state == 'done' or contract_id in claimed:
                 print(f"文件已存在，跳过: {filename}")
                 skipped_count += 1
                 continue
+            claimed.add(contract_id)
+            claimed_names.add(filename)
 
             # 构造下载URL
             pdf_url = view_url.replace("/viewdocs.action?", "/getdocs.action?")
-            
-            # 配置请求头
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) '
-                            'AppleWebKit/537.36 (KHTML, like Gecko) '
-                            'Chrome/58.0.3029.110 Safari/537.3'
-            }
-
-            # 带重试机制的下载流程
-            success = False
-            error = None
-            for attempt in range(max_retries):
-                try:
-                    response = requests.get(pdf_url, headers=headers, 
-                                           stream=True, timeout=10)
-                    response.raise_for_status()
-                    
-                    # 保存文件
-                    with open(filepath, 'wb') as pdf_file:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:  # 过滤保持连接的空白块
-                                pdf_file.write(chunk)
-                    
-                    print(f"下载成功: {filename}")
-                    success = True
-                    success_count += 1
-                    break  # 成功则退出重试循环
-                
-                except requests.exceptions.RequestException as e:
-                    error = e
-                    if attempt < max_retries - 1:
-                        print(f"第{attempt+1}次尝试失败，正在重试...")
-                        time.sleep(retry_delay)
-            
-            # 处理下载失败的情况
-            if not success:
-                failure_count += 1
-                error_msg = str(error)
-                print(f"下载失败（{conname}）: {error_msg}")
-                
-                # 记录失败信息
-                failed_row = {
-                    '合同ID': contract_id,
-                    '合同文件': conname,
-                    'URL': pdf_url,
-                    '错误信息': error_msg,
-                    '时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                
-                # 写入失败日志（追加模式）
-                with open(failed_path, 'a', newline='', encoding='utf-8') as f_failed:
-                    writer = csv.DictWriter(f_failed, fieldnames=failed_fields)
-                    if os.stat(failed_path).st_size == 0:
-                        writer.writeheader()
-                    writer.writerow(failed_row)
+            scheduler.add(urlparse(pdf_url).netloc, (contract_id, conname, pdf_url, filename))
+            dispatch()
+            while len(scheduler) >= QUEUE_WINDOW:
+                drain()
+
+        while len(scheduler) or pending:
+            drain()
+        report(finished=True)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        session.close()
+        manifest.commit()
+        manifest.close()
+        other_manifests.close()
+        f_failed.close()
+        if indexer:
+            indexer.close()
 
     # 输出统计信息
     print(f"\n处理完成！")
@@ -108,17 +775,282 @@ def download_contracts(csv_path, output_dir, max_retries=3, retry_delay=1):
     print(f"成功下载: {success_count}")
     print(f"跳过已存在: {skipped_count}")
     print(f"失败次数: {failure_count}")
+    print(f"文件名冲突: {collision_count}")
     print(f"失败记录已保存至: {failed_path}")
 
+def check_blob(path):
+    """校验存储中的单个PDF，返回 (路径, 问题列表)
+
+    使用内存映射读取，检查SHA-256与文件名一致、%PDF 文件头和 %%EOF 结尾标记
+    """
+    problems = []
+    expected = os.path.splitext(os.path.basename(path))[0]
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return path, ['空文件']
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hashlib.sha256(mm).hexdigest() != expected:
+                    problems.append('哈希不匹配')
+                if mm[:4] != b'%PDF':
+                    problems.append('缺少%PDF文件头')
+                if mm.rfind(b'%%EOF', max(0, len(mm) - 1024)) == -1:
+                    problems.append('缺少%%EOF结尾（可能被截断）')
+    except OSError as e:
+        problems.append(f'读取失败: {e}')
+    return path, problems
+
+def iter_store_files(output_dir):
+    """遍历内容寻址存储中的所有PDF"""
+    store = os.path.join(output_dir, STORE_DIR)
+    for prefix in sorted(os.listdir(store)) if os.path.isdir(store) else []:
+        prefix_dir = os.path.join(store, prefix)
+        if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name.endswith('.pdf'):
+                yield os.path.join(prefix_dir, name)
+
+def audit_store(output_dir, processes=None):
+    """多进程并行校验整个存储，返回有问题的文件 {路径: 问题列表}"""
+    paths = list(iter_store_files(output_dir))
+    print(f"开始校验 {len(paths)} 个文件...")
+
+    bad = {}
+    with multiprocessing.Pool(processes or os.cpu_count()) as pool:
+        for path, problems in pool.imap_unordered(check_blob, paths, chunksize=16):
+            if problems:
+                bad[path] = problems
+                print(f"异常文件: {path}: {'，'.join(problems)}")
+
+    # 各分片清单中记录为已完成但存储中缺失的文件
+    name, ext = os.path.splitext(MANIFEST_NAME)
+    for manifest_file in glob.glob(os.path.join(output_dir, f"{name}*{ext}")):
+        manifest = sqlite3.connect(manifest_file)
+        for contract_id, digest in manifest.execute(
+                "SELECT contract_id, sha256 FROM contracts WHERE state = 'done'"):
+            blob_file = blob_path(output_dir, digest)
+            if not os.path.exists(blob_file):
+                bad.setdefault(blob_file, []).append(f'文件缺失（合同ID: {contract_id}）')
+                print(f"文件缺失: {blob_file}（合同ID: {contract_id}）")
+        manifest.close()
+
+    print(f"\n校验完成！共 {len(paths)} 个文件，异常 {len(bad)} 个")
+    return bad
+
+def extract_pdf_text(path):
+    """提取PDF文本（在子进程中运行），返回 (页数, 文本, 错误信息)"""
+    try:
+        reader = PdfReader(path)
+        pages = [page.extract_text() or '' for page in reader.pages]
+        return len(pages), '\n'.join(pages), None
+    except Exception as e:
+        return 0, '', str(e)
+
+def open_text_index(output_dir):
+    """打开全文索引数据库"""
+    conn = sqlite3.connect(os.path.join(output_dir, TEXT_INDEX_NAME), timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY,
+        contract_id TEXT UNIQUE,
+        name TEXT,
+        sha256 TEXT,
+        mtime REAL,
+        pages INTEGER,
+        size INTEGER,
+        error TEXT,
+        indexed_at TEXT
+    )
+    ''')
+    # 词元列参与检索，原文列只用于生成摘要；rowid 与 documents.id 对应
+    conn.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS document_fts
+    USING fts5(tokens, text UNINDEXED)
+    ''')
+    if conn.execute('PRAGMA user_version').fetchone()[0] < TEXT_INDEX_VERSION:
+        # 旧版本索引没有单字词元，清空后由 index 命令重新提取
+        conn.execute('DELETE FROM document_fts')
+        conn.execute('DELETE FROM documents')
+        conn.execute(f'PRAGMA user_version = {TEXT_INDEX_VERSION}')
+    conn.commit()
+    return conn
+
+class TextIndexer:
+    """在进程池中提取PDF文本并写入全文索引（仅在主线程中使用）
+
+    按 SHA-256 和文件修改时间增量索引，未变化的文件不会重复提取
+    """
+
+    def __init__(self, output_dir, processes=None):
+        self.output_dir = output_dir
+        self.conn = open_text_index(output_dir)
+        self.pool = ProcessPoolExecutor(processes)
+        self.window = (processes or os.cpu_count()) * 4
+        self.jobs = {}
+        self.indexed = 0
+        self.unsaved = 0
+
+    def is_current(self, contract_id, digest, mtime):
+        """索引中的记录是否与当前文件一致"""
+        row = self.conn.execute('SELECT sha256, mtime FROM documents WHERE contract_id = ?',
+                                (contract_id,)).fetchone()
+        return row is not None and row[0] == digest and row[1] == mtime
+
+    def submit(self, contract_id, name, digest):
+        """提交一个已下载的合同，返回是否需要（重新）提取"""
+        path = blob_path(self.output_dir, digest)
+        stat = os.stat(path)
+        if self.is_current(contract_id, digest, stat.st_mtime):
+            return False
+        while len(self.jobs) >= self.window:
+            self.collect(block=True)
+        future = self.pool.submit(extract_pdf_text, path)
+        self.jobs[future] = (contract_id, name, digest, stat.st_mtime, stat.st_size)
+        return True
+
+    def collect(self, block=False):
+        """写入已完成的提取结果；block 为真时至少等待一个任务完成"""
+        if not self.jobs:
+            return
+        done, _ = wait(list(self.jobs), timeout=None if block else 0,
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            self.save(*self.jobs.pop(future), *future.result())
+
+    def save(self, contract_id, name, digest, mtime, size, pages, text, error):
+        """写入一条索引记录，替换该合同的旧记录"""
+        row = self.conn.execute('SELECT id FROM documents WHERE contract_id = ?',
+                                (contract_id,)).fetchone()
+        if row:
+            self.conn.execute('DELETE FROM document_fts WHERE rowid = ?', (row[0],))
+            self.conn.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+        cursor = self.conn.execute('''
+        INSERT INTO documents (contract_id, name, sha256, mtime, pages, size, error, indexed_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (contract_id, name, digest, mtime, pages, size, error,
+              datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        self.conn.execute('INSERT INTO document_fts (rowid, tokens, text) VALUES (?, ?, ?)',
+                          (cursor.lastrowid, bigram_tokens(f"{name}\n{text}", unigrams=True),
+                           text))
+        if error:
+            print(f"文本提取失败（{name}）: {error}")
+        self.indexed += 1
+        self.unsaved += 1
+        if self.unsaved >= COMMIT_EVERY:
+            self.conn.commit()
+            self.unsaved = 0
+
+    def close(self):
+        """等待所有提取任务完成并关闭索引"""
+        while self.jobs:
+            self.collect(block=True)
+        self.pool.shutdown()
+        self.conn.commit()
+        self.conn.close()
+
+def index_contracts(output_dir, processes=None):
+    """为所有已下载的合同增量建立全文索引"""
+    if PdfReader is None:
+        print("全文索引需要 pypdf，请先安装: pip install pypdf")
+        return 0
+    indexer = TextIndexer(output_dir, processes)
+    name, ext = os.path.splitext(MANIFEST_NAME)
+    try:
+        for path in glob.glob(os.path.join(output_dir, f"{name}*{ext}")):
+            manifest = sqlite3.connect(path)
+            for contract_id, conname, digest in manifest.execute(
+                    "SELECT contract_id, name, sha256 FROM contracts WHERE state = 'done'"):
+                if os.path.exists(blob_path(output_dir, digest)):
+                    indexer.submit(contract_id, conname, digest)
+                indexer.collect()
+            manifest.close()
+    finally:
+        indexer.close()
+    print(f"索引完成！本次新增或更新 {indexer.indexed} 份合同")
+    return indexer.indexed
+
+def search_contracts(output_dir, query, limit=20):
+    """按 bm25 相关度检索合同全文，返回 [(合同ID, 合同文件, 页数, 摘要)]"""
+    match = build_match_query(query)
+    if not match:
+        return []
+    conn = open_text_index(output_dir)
+    rows = conn.execute('''
+    SELECT d.contract_id, d.name, d.pages, f.text
+    FROM document_fts f JOIN documents d ON d.id = f.rowid
+    WHERE document_fts MATCH ?
+    ORDER BY bm25(document_fts)
+    LIMIT ?
+    ''', (match, limit)).fetchall()
+    conn.close()
+    return [(contract_id, name, pages, make_snippet(text or name, query))
+            for contract_id, name, pages, text in rows]
+
 if __name__ == "__main__":
     # 配置路径（根据实际情况修改）
     csv_path = "/Users/zhaoq0103/Desktop/_select_cons_member_id_用户ID_cons_business_type_合同类型_cons_contrac_202504230943.csv"  # CSV文件路径
     output_dir = "./contracts"  # PDF保存目录
+
+    parser = argparse.ArgumentParser(description="批量下载合同PDF文件")
+    parser.add_argument("command", nargs="?", default="download",
+                        choices=["download", "audit", "progress", "index", "search"],
+                        help="download: 下载合同（默认）；audit: 校验已下载的PDF；"
+                             "progress: 汇总各分片进度；index: 建立全文索引；"
+                             "search: 检索合同全文")
+    parser.add_argument("--csv", default=csv_path, help="CSV文件路径")
+    parser.add_argument("--output", default=output_dir, help="PDF保存目录")
+    parser.add_argument("--workers", type=int, default=1, help="并发下载线程数，1为串行")
+    parser.add_argument("--per-host", type=int, default=4, help="每个主机的最大连接数")
+    parser.add_argument("--retries", type=int, default=2, help="每个文件的最大重试次数")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="只重试清单中失败的合同（指数退避）")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="校验和文本提取使用的进程数，默认使用全部CPU核心")
+    parser.add_argument("--extract-text", action="store_true",
+                        help="下载的同时提取文本写入全文索引（需要 pypdf）")
+    parser.add_argument("-q", "--query", help="search 命令的检索词")
+    parser.add_argument("--limit", type=int, default=20, help="search 命令返回的结果数")
+    parser.add_argument("--max-rps", type=float, default=None,
+                        help="全局每秒最大请求数")
+    parser.add_argument("--max-bandwidth", type=float, default=None,
+                        help="全局最大下载带宽（KB/秒）")
+    parser.add_argument("--shard", type=parse_shard, default=None,
+                        help="只处理第 i 片（共 N 片，0 <= i < N），格式 i/N")
+    args = parser.parse_args()
+
+    if args.command == "progress":
+        merge_progress(args.output)
+        raise SystemExit(0)
+
+    if args.command == "audit":
+        bad_files = audit_store(args.output, args.processes)
+        raise SystemExit(1 if bad_files else 0)
+
+    if args.command == "index":
+        index_contracts(args.output, args.processes)
+        raise SystemExit(0)
+
+    if args.command == "search":
+        if not args.query:
+            parser.error("search 命令需要 --query 参数")
+        for rank, (contract_id, conname, pages, snippet) in enumerate(
+                search_contracts(args.output, args.query, args.limit), 1):
+            print(f"{rank}. {conname}（合同ID: {contract_id}，{pages} 页）\n   {snippet}")
+        raise SystemExit(0)
     
     # 执行下载（可调整重试参数）
     download_contracts(
-        csv_path=csv_path,
-        output_dir=output_dir,
-        max_retries=2,     # 最大重试次数
-        retry_delay=1      # 重试间隔（秒）
-    )
\ No newline at end of file
+        csv_path=args.csv,
+        output_dir=args.output,
+        max_retries=args.retries,  # 最大重试次数
+        retry_delay=1,             # 重试间隔（秒）
+        workers=args.workers,
+        per_host_limit=args.per_host,
+        retry_failed=args.retry_failed,
+        shard=args.shard,
+        max_rps=args.max_rps,
+        max_bandwidth=args.max_bandwidth * 1024 if args.max_bandwidth else None,
+        extract_text=args.extract_text
+    )
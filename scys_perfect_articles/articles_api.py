@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+文章数据的只读 JSON 接口
+
+    python articles_api.py --port 8001
+    curl "http://127.0.0.1:8001/api/articles?author=张三&since=2025-04-01&limit=50"
+"""
+
+import gzip
+import json
+import asyncio
+import hashlib
+import sqlite3
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from async_http import serve, Response, HTTPError
+from scys_crawler import DB_FILE, decode_content
+
+# 每页默认和最多返回的文章数
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# 响应缓存的条目数
+CACHE_SIZE = 1024
+# 小于该字节数的响应不压缩
+GZIP_MIN_BYTES = 1024
+
+ARTICLE_FIELDS = ("id", "article_id", "author_name", "gmt_create", "gmt_create_ts",
+                  "ai_summary_content")
+
+def parse_date_arg(value, end=False):
+    """把 YYYY-MM-DD 转换为本地时间的秒级时间戳；end 为真时返回次日零点（不含）"""
+    try:
+        date_obj = datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPError(400, f"日期格式应为 YYYY-MM-DD: {value}")
+    if end:
+        date_obj += timedelta(days=1)
+    return int(date_obj.timestamp())
+
+def parse_int(value, name, default):
+    if value in (None, ""):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(400, f"{name} 应为整数")
+
+class ArticleReader:
+    """只读数据库访问，每个线程一个连接"""
+
+    def __init__(self, db_file=None):
+        self.db_file = db_file or DB_FILE
+        self.local = threading.local()
+        # 检测其他连接（爬虫）提交的专用连接，只在事件循环中使用
+        self.version_conn = self.connect()
+
+    def connect(self):
+        conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @property
+    def conn(self):
+        if not hasattr(self.local, "conn"):
+            self.local.conn = self.connect()
+        return self.local.conn
+
+    def data_version(self):
+        """其他连接每次提交后都会变化"""
+        return self.version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def list_articles(self, author=None, since=None, until=None, cursor=None, limit=DEFAULT_LIMIT):
+        """按 id 从新到旧的键集分页：cursor 为上一页最后一篇的 id"""
+        conditions = []
+        params = []
+        if author:
+            conditions.append("author_name = ?")
+            params.append(author)
+        if since is not None:
+            conditions.append("gmt_create_ts >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("gmt_create_ts < ?")
+            params.append(until)
+        if cursor is not None:
+            conditions.append("id < ?")
+            params.append(cursor)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(f'''
+        SELECT {', '.join(ARTICLE_FIELDS)}
+        FROM articles
+        {where}
+        ORDER BY id DESC
+        LIMIT ?
+        ''', params + [limit + 1]).fetchall()
+        items = [dict(zip(ARTICLE_FIELDS, row)) for row in rows[:limit]]
+        next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get_article(self, article_id):
+        """单篇文章，包含解压后的正文"""
+        row = self.conn.execute(f'''
+        SELECT {', '.join('a.' + f for f in ARTICLE_FIELDS)}, b.content
+        FROM articles a LEFT JOIN article_bodies b ON b.article_id = a.article_id
+        WHERE a.article_id = ?
+        ''', (article_id,)).fetchone()
+        if not row:
+            return None
+        article = dict(zip(ARTICLE_FIELDS, row))
+        article["article_content"] = decode_content(row[-1])
+        return article
+
+class ResponseCache:
+    """LRU 响应缓存，数据库有新的提交时整体失效（仅在事件循环中使用）"""
+
+    def __init__(self, reader, size=CACHE_SIZE):
+        self.reader = reader
+        self.size = size
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = self.misses = 0
+
+    def check_version(self):
+        version = self.reader.data_version()
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+def encode_entry(data):
+    """序列化响应，返回 (ETag, 原始正文, gzip 正文)"""
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    compressed = gzip.compress(body, 5) if len(body) >= GZIP_MIN_BYTES else None
+    return etag, body, compressed
+
+def make_handler(reader, cache):
+    """请求路由
+
+    GET /api/articles?author=&since=&until=&cursor=&limit=   文章列表（键集分页）
+    GET /api/articles/<文章ID>                                单篇文章（含正文）
+    """
+
+    def cache_key(request):
+        return (request.path, tuple(sorted(request.query.items())))
+
+    async def load(request):
+        if request.path == "/api/articles":
+            query = request.query
+            limit = min(max(parse_int(query.get("limit"), "limit", DEFAULT_LIMIT), 1), MAX_LIMIT)
+            since = parse_date_arg(query["since"]) if query.get("since") else None
+            until = parse_date_arg(query["until"], end=True) if query.get("until") else None
+            cursor = parse_int(query.get("cursor"), "cursor", None)
+            return await asyncio.to_thread(reader.list_articles, query.get("author"), since,
+                                           until, cursor, limit)
+        if request.path.startswith("/api/articles/"):
+            article = await asyncio.to_thread(reader.get_article,
+                                              request.path[len("/api/articles/"):])
+            if article is None:
+                raise HTTPError(404, "文章不存在")
+            return article
+        raise HTTPError(404)
+
+    async def handle(request):
+        if request.method not in ("GET", "HEAD"):
+            raise HTTPError(405)
+        cache.check_version()
+        key = cache_key(request)
+        entry = cache.get(key)
+        if entry is None:
+            entry = encode_entry(await load(request))
+            cache.put(key, entry)
+        etag, body, compressed = entry
+
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return Response(304, b"", "application/json; charset=utf-8", headers)
+        if compressed is not None and "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+            body = compressed
+        return Response(200, body, "application/json; charset=utf-8", headers)
+
+    return handle
+
+async def run(host, port, db_file):
+    reader = ArticleReader(db_file)
+    cache = ResponseCache(reader)
+    server = await serve(make_handler(reader, cache), host, port)
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="文章数据的只读 JSON 接口")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8001, help="监听端口")
+    parser.add_argument("--db", default=DB_FILE, help="文章数据库文件")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.host, args.port, args.db))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+基于 asyncio 的最小 HTTP/1.1 服务器，供本地服务使用（只依赖标准库）
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+from urllib.parse import urlsplit, parse_qs, unquote
+
+# 请求头和请求体的大小上限
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 10 * 1024 * 1024
+# 空闲长连接的超时时间（秒）
+KEEP_ALIVE_TIMEOUT = 30
+
+REASONS = {
+    200: "OK", 202: "Accepted", 204: "No Content", 206: "Partial Content", 304: "Not Modified",
+    400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 416: "Range Not Satisfiable", 429: "Too Many Requests",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+class HTTPError(Exception):
+    """处理请求时返回给客户端的错误"""
+
+    def __init__(self, status, message=""):
+        super().__init__(message)
+        self.status = status
+        self.message = message or REASONS.get(status, "")
+
+class Request:
+    """一个已解析的 HTTP 请求"""
+
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = unquote(parts.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise HTTPError(400, "请求体不是合法的JSON")
+
+class Response:
+    """HTTP 响应"""
+
+    def __init__(self, status=200, body=b"", content_type="text/plain; charset=utf-8", headers=None):
+        self.status = status
+        self.body = body
+        self.headers = {"Content-Type": content_type}
+        self.headers.update(headers or {})
+
+def json_response(data, status=200, headers=None):
+    body = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return Response(status, body, "application/json; charset=utf-8", headers)
+
+def file_response(root, path):
+    """返回 root 目录下的静态文件，禁止访问目录之外的路径"""
+    root = os.path.abspath(root)
+    full_path = os.path.abspath(os.path.join(root, path.lstrip("/")))
+    if os.path.isdir(full_path):
+        full_path = os.path.join(full_path, "index.html")
+    if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+        raise HTTPError(404)
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type.endswith("javascript"):
+        content_type += "; charset=utf-8"
+    with open(full_path, "rb") as f:
+        return Response(200, f.read(), content_type)
+
+async def read_request(reader):
+    """读取一个请求，连接关闭时返回 None"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(413, "请求头过大")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "请求行格式错误")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Content-Length 格式错误")
+    if length < 0:
+        raise HTTPError(400, "Content-Length 格式错误")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413)
+    try:
+        body = await reader.readexactly(length) if length else b""
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    return Request(method.upper(), target, headers, body)
+
+def encode_response(response, keep_alive, head_only=False):
+    status_line = f"HTTP/1.1 {response.status} {REASONS.get(response.status, '')}\r\n"
+    headers = dict(response.headers)
+    headers["Content-Length"] = str(len(response.body))
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    head = status_line + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+    return head.encode("latin-1") + (b"" if head_only else response.body)
+
+async def serve(handler, host="127.0.0.1", port=8000):
+    """启动服务器，handler(request) 为返回 Response 的协程；支持长连接"""
+
+    async def handle_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    response = await handler(request)
+                except HTTPError as e:
+                    request = None
+                    response = json_response({"error": e.message}, e.status)
+                except Exception as e:
+                    request = None
+                    print(f"处理请求出错: {e!r}")
+                    response = json_response({"error": "服务器内部错误"}, 500)
+                keep_alive = (request is not None
+                              and request.headers.get("connection", "").lower() != "close")
+                head_only = request is not None and request.method == "HEAD"
+                writer.write(encode_response(response, keep_alive, head_only))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle_connection, host, port, limit=MAX_HEADER_BYTES,
+                                        backlog=1024)
+    print(f"服务已启动: http://{host}:{port}/")
+    return server
@@ -8,9 +8,17 @@
 import os
 import sqlite3
 import json
+import hashlib
 import requests
 import time
-from datetime import datetime
+import uuid
+import queue
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from tqdm import tqdm
 
@@ -19,6 +27,8 @@ load_dotenv()
 
 # 数据库设置
 DB_FILE = "scys_articles.db"
+# 增量同步状态：复用的数据表和 文章ID → 记录ID + 内容哈希
+SYNC_DB = "feishu_sync.db"
 
 # 飞书API配置
 FEISHU_APP_ID = os.getenv("FEISHU_APP_ID")
@@ -31,9 +41,32 @@ FEISHU_BITABLE_ID = os.getenv("FEISHU_BITABLE_ID")  # 已有多维表格的ID
 # 网站基础URL
 BASE_ARTICLE_URL = "https://scys.com/articleDetail/xq_topic/"
 
+# 飞书开放平台接口地址
+FEISHU_API_BASE = os.getenv("FEISHU_API_BASE", "https://open.feishu.cn/open-apis")
+# 飞书API限制每次最多写入500条记录
+BATCH_SIZE = 500
+# 同时在途的批次数（同一数据表并发写入过多会触发写冲突）
+UPLOAD_CONCURRENCY = int(os.getenv("FEISHU_UPLOAD_CONCURRENCY", "3"))
+# 每个批次的最大重试次数和最长退避时间（秒）
+UPLOAD_RETRIES = 5
+MAX_BACKOFF = 30
+REQUEST_TIMEOUT = 30
+# 频率限制和可重试的错误码（请求过快、写冲突、数据未就绪）
+RATE_LIMIT_CODES = {99991400, 1254290, 1254291, 1254607}
+RETRYABLE_CODES = RATE_LIMIT_CODES | {1254036, 1255040}
+# 从数据库游标每次读取的行数
+FETCH_SIZE = 1000
+# 租户访问令牌的本地缓存，过期前多少秒主动刷新
+TOKEN_CACHE = ".feishu_token.json"
+TOKEN_REFRESH_MARGIN = 300
+# 表示访问令牌无效或过期的错误码
+TOKEN_INVALID_CODES = {99991661, 99991663, 99991668, 99991677}
+# 由阅读者在飞书中填写的字段，同步更新时不覆盖
+READER_FIELDS = ("当前用户", "是否已读", "阅读时间", "阅读摘要")
+
 def get_access_token():
-    """获取飞书访问令牌"""
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+    """向飞书申请租户访问令牌，返回 (令牌, 有效秒数)"""
+    url = f"{FEISHU_API_BASE}/auth/v3/tenant_access_token/internal"
     headers = {
         "Content-Type": "application/json"
     }
@@ -41,21 +74,105 @@ def get_access_token():
         "app_id": FEISHU_APP_ID,
         "app_secret": FEISHU_APP_SECRET
     }
-    
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        result = response.json()
-        if result.get("code") == 0:
-            return result.get("tenant_access_token")
-    
-    print(f"获取飞书令牌失败: {response.text}")
-    return None
 
-def create_bitable(access_token, name):
+    def request_token():
+        try:
+            response = requests.post(url, headers=headers, json=data, timeout=REQUEST_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            raise UploadError(f"请求异常: {e}", retryable=True)
+        return check_response(response)
+
+    # 申请令牌是幂等的，网络错误、服务端错误和频率限制都可以直接重试
+    try:
+        result = retry_call(request_token)
+    except UploadError as e:
+        print(f"获取飞书令牌失败: {e}")
+        return None, 0
+    return result.get("tenant_access_token"), result.get("expire", 7200)
+
+class TenantTokenProvider:
+    """租户访问令牌缓存（内存和磁盘），所有线程共享
+
+    令牌距过期不足 TOKEN_REFRESH_MARGIN 秒时主动刷新；请求被拒绝时调用 invalidate 后重新获取
+    """
+
+    def __init__(self, cache_file=TOKEN_CACHE):
+        self.cache_file = cache_file
+        self.lock = threading.Lock()
+        self.token = None
+        self.expire_at = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("app_id") == FEISHU_APP_ID:
+            self.token = cached.get("token")
+            self.expire_at = cached.get("expire_at", 0)
+
+    def save(self):
+        tmp_file = self.cache_file + ".tmp"
+        try:
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"app_id": FEISHU_APP_ID, "token": self.token,
+                           "expire_at": self.expire_at}, f)
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            print(f"保存飞书令牌缓存失败: {e}")
+
+    def get(self):
+        """返回有效的令牌，获取失败时返回 None"""
+        with self.lock:
+            if self.token and time.time() < self.expire_at - TOKEN_REFRESH_MARGIN:
+                return self.token
+            token, expire = get_access_token()
+            if not token:
+                return None
+            self.token = token
+            self.expire_at = time.time() + expire
+            self.save()
+            return token
+
+    def invalidate(self, token):
+        """令牌被服务端拒绝；其他线程已经刷新过时不重复作废"""
+        with self.lock:
+            if self.token == token:
+                self.token = None
+                self.expire_at = 0
+
+def token_rejected(response):
+    if response.status_code == 401:
+        return True
+    try:
+        return response.json().get("code") in TOKEN_INVALID_CODES
+    except ValueError:
+        return False
+
+def feishu_request(tokens, method, url, session=None, **kwargs):
+    """带访问令牌发送请求，令牌被拒绝时刷新后重试一次"""
+    sender = session or requests
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    headers = dict(kwargs.pop("headers", None) or {})
+    for attempt in range(2):
+        token = tokens.get()
+        if not token:
+            raise requests.exceptions.RequestException("无法获取飞书访问令牌")
+        headers["Authorization"] = f"Bearer {token}"
+        response = sender.request(method, url, headers=headers, **kwargs)
+        if attempt == 0 and token_rejected(response):
+            print("飞书访问令牌已失效，重新获取")
+            tokens.invalidate(token)
+            continue
+        return response
+
+def create_bitable(tokens, name):
     """创建多维表格"""
-    url = "https://open.feishu.cn/open-apis/bitable/v1/apps"
+    url = f"{FEISHU_API_BASE}/bitable/v1/apps"
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
     
@@ -68,20 +185,17 @@ def create_bitable(access_token, name):
     if not FEISHU_FOLDER_TOKEN:
         del data["folder_token"]
     
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        result = response.json()
-        if result.get("code") == 0:
-            return result.get("data", {}).get("app", {}).get("app_token")
-    
-    print(f"创建多维表格失败: {response.text}")
-    return None
+    try:
+        return create_once(lambda: feishu_call(tokens, "POST", url, headers=headers, json=data)
+                           .get("app", {}).get("app_token"))
+    except UploadError as e:
+        print(f"创建多维表格失败: {e}")
+        return None
 
-def create_table(access_token, app_token, table_name, fields):
-    """在多维表格中创建数据表"""
-    url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables"
+def create_table(tokens, app_token, table_name, fields):
+    """在多维表格中创建数据表；请求可能已生效时先按名称查找，不重复创建"""
+    url = f"{FEISHU_API_BASE}/bitable/v1/apps/{app_token}/tables"
     headers = {
-        "Authorization": f"Bearer {access_token}",
         "Content-Type": "application/json"
     }
     
@@ -92,76 +206,516 @@ def create_table(access_token, app_token, table_name, fields):
         }
     }
     
-    response = requests.post(url, headers=headers, json=data)
-    if response.status_code == 200:
-        result = response.json()
-        if result.get("code") == 0:
-            return result.get("data", {}).get("table_id")
-    
-    print(f"创建数据表失败: {response.text}")
+    try:
+        return create_once(
+            lambda: feishu_call(tokens, "POST", url, headers=headers, json=data).get("table_id"),
+            lambda: find_table(tokens, app_token, table_name))
+    except UploadError as e:
+        print(f"创建数据表失败: {e}")
+        return None
+
+def find_table(tokens, app_token, table_name):
+    """按名称查找多维表格中已有的数据表，返回 table_id"""
+    url = f"{FEISHU_API_BASE}/bitable/v1/apps/{app_token}/tables"
+    page_token = None
+    while True:
+        params = {"page_size": 100}
+        if page_token:
+            params["page_token"] = page_token
+        try:
+            data = retry_call(lambda: feishu_call(tokens, "GET", url, params=params))
+        except UploadError as e:
+            print(f"获取数据表列表失败: {e}")
+            return None
+        for table in data.get("items") or []:
+            if table.get("name") == table_name:
+                return table.get("table_id")
+        if not data.get("has_more"):
+            return None
+        page_token = data.get("page_token")
+
+def create_session(concurrency=UPLOAD_CONCURRENCY):
+    """创建带连接池的会话，所有上传线程共享"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(concurrency, 4))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+class RateLimitBackoff:
+    """所有上传线程共享的限流退避
+
+    遇到频率限制时请求间隔加倍（至少遵守服务端给出的等待时间），请求成功后逐步缩短，
+    每次请求前等待到允许的时间点
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.interval = 0.0
+        self.next_time = 0.0
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def on_limited(self, retry_after=None):
+        with self.lock:
+            self.interval = min(max(self.interval * 2, 0.5), MAX_BACKOFF)
+            delay = max(self.interval, retry_after or 0)
+            self.next_time = max(self.next_time, time.monotonic() + delay)
+        return delay
+
+    def on_success(self):
+        with self.lock:
+            self.interval = self.interval * 0.8 if self.interval > 0.05 else 0.0
+
+class UploadError(Exception):
+    """飞书接口调用失败，retryable 表示可以重试
+
+    unprocessed 表示请求确定没有被服务端处理（频率限制、连接超时），非幂等的创建请求可以直接重试
+    """
+
+    def __init__(self, message, retryable=False, retry_after=None, rate_limited=False,
+                 unprocessed=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited
+        self.unprocessed = unprocessed or rate_limited
+
+def parse_retry_after(response):
+    """服务端建议的等待秒数（Retry-After 或 x-ogw-ratelimit-reset）"""
+    for header in ("Retry-After", "x-ogw-ratelimit-reset"):
+        value = response.headers.get(header)
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
     return None
 
-def batch_create_records(access_token, app_token, table_id, records):
-    """批量添加记录到数据表"""
-    url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_create"
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
-    }
-    
-    # 飞书API限制每次最多创建500条记录
-    batch_size = 100
-    total_records = len(records)
-    success_count = 0
-    
-    for i in range(0, total_records, batch_size):
-        batch_records = records[i:i + batch_size]
-        
-        data = {
-            "records": batch_records
+def feishu_call(tokens, method, url, session=None, **kwargs):
+    """调用飞书接口并检查结果，成功时返回响应中的 data
+
+    频率限制、服务端错误和可重试的错误码抛出可重试的 UploadError，其他失败抛出不可重试的 UploadError
+    """
+    try:
+        response = feishu_request(tokens, method, url, session, **kwargs)
+    except requests.exceptions.ConnectTimeout as e:
+        raise UploadError(f"连接超时: {e}", retryable=True, unprocessed=True)
+    except requests.exceptions.RequestException as e:
+        raise UploadError(f"请求异常: {e}", retryable=True)
+    return check_response(response).get("data") or {}
+
+def check_response(response):
+    """检查飞书接口的响应，成功时返回响应 JSON，失败时抛出 UploadError"""
+    try:
+        result = response.json()
+    except ValueError:
+        result = {}
+    code = result.get("code")
+    if response.status_code == 429 or code in RATE_LIMIT_CODES:
+        raise UploadError(f"触发频率限制: {result.get('msg') or response.status_code}",
+                          retryable=True, retry_after=parse_retry_after(response),
+                          rate_limited=True)
+    if response.status_code >= 500 or code in RETRYABLE_CODES:
+        raise UploadError(f"服务端错误: {response.status_code}, {result.get('msg')}",
+                          retryable=True)
+    if response.status_code != 200 or code != 0:
+        raise UploadError(f"请求失败: {response.status_code}, {result.get('msg') or response.text[:200]}")
+    return result
+
+def retry_call(call, backoff=None, retries=UPLOAD_RETRIES):
+    """调用 call()，遇到可重试的 UploadError 时退避后重试，重试用尽或不可重试时抛出
+
+    频率限制按 backoff 的共享间隔等待，其他错误按带抖动的指数退避等待
+    """
+    backoff = backoff or RateLimitBackoff()
+    for attempt in range(retries + 1):
+        backoff.wait()
+        try:
+            result = call()
+        except UploadError as e:
+            if not e.retryable or attempt == retries:
+                raise
+            if e.rate_limited:
+                delay = backoff.on_limited(e.retry_after)
+            else:
+                delay = min(2 ** attempt, MAX_BACKOFF) + random.uniform(0, 0.5)
+            print(f"{e}，{delay:.1f} 秒后重试（第 {attempt + 1} 次）")
+            time.sleep(delay)
+            continue
+        backoff.on_success()
+        return result
+
+def create_once(create, lookup=None, backoff=None, retries=UPLOAD_RETRIES):
+    """调用非幂等的创建接口 create()，返回其结果
+
+    请求确定没有被处理时（频率限制、连接超时）直接重试；服务端错误或读取超时时请求可能已经生效，
+    之后每次重试前先用 lookup() 查找，找到已创建的对象就直接返回，避免重复创建。
+    没有 lookup 时不再重试，抛出不可重试的 UploadError
+    """
+    maybe_created = False
+
+    def call():
+        nonlocal maybe_created
+        if maybe_created:
+            found = lookup()
+            if found:
+                return found
+        try:
+            return create()
+        except UploadError as e:
+            if e.retryable and not e.unprocessed:
+                if lookup is None:
+                    raise UploadError(f"{e}（请求可能已生效，为避免重复创建不再重试）")
+                maybe_created = True
+            raise
+
+    return retry_call(call, backoff, retries)
+
+class RecordUploader:
+    """并发批量写入多维表格记录
+
+    记录按 batch_size 条分批，最多 concurrency 个批次同时在途；输入可以是任意可迭代对象，
+    只在有空闲名额时才读取下一批，内存占用与总记录数无关。失败的批次用同一个 client_token
+    重试，服务端据此去重，重试不会产生重复记录
+    """
+
+    def __init__(self, tokens, app_token, table_id, session=None,
+                 concurrency=UPLOAD_CONCURRENCY, batch_size=BATCH_SIZE):
+        self.tokens = tokens
+        self.app_token = app_token
+        self.table_id = table_id
+        self.session = session or create_session(concurrency)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.backoff = RateLimitBackoff()
+
+    def send(self, action, records, client_token):
+        """发送一个批次，返回接口返回的记录列表"""
+        url = f"{FEISHU_API_BASE}/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records/{action}"
+        headers = {
+            "Content-Type": "application/json"
         }
-        
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("code") == 0:
-                success_count += len(batch_records)
-                print(f"成功添加 {len(batch_records)} 条记录")
+        params = {"client_token": client_token} if action == "batch_create" else None
+        data = feishu_call(self.tokens, "POST", url, self.session, headers=headers,
+                           params=params, json={"records": records})
+        return data.get("records", [])
+
+    def upload_batch(self, action, records):
+        """写入一个批次（在线程中运行），返回 (记录ID列表, 错误信息)"""
+        client_token = str(uuid.uuid4())
+        try:
+            created = retry_call(lambda: self.send(action, records, client_token), self.backoff)
+        except UploadError as e:
+            return [None] * len(records), str(e)
+        # 接口按请求顺序返回记录
+        record_ids = [item.get("record_id") for item in created]
+        record_ids += [None] * (len(records) - len(record_ids))
+        return record_ids, None
+
+    def run(self, records, action="batch_create", on_batch=None):
+        """写入全部记录，返回 (成功条数, 失败条数)
+
+        on_batch(批次记录, 记录ID列表, 错误信息) 在主线程中按完成顺序调用，
+        失败的记录对应的ID为 None
+        """
+        def batches():
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    yield action, batch
+                    batch = []
+            if batch:
+                yield action, batch
+
+        return self.run_batches(batches(), on_batch)
+
+    def run_batches(self, batches, on_batch=None):
+        """写入 (接口, 批次记录) 序列，只在有空闲名额时读取下一批"""
+        succeeded = failed = 0
+        in_flight = {}
+        iterator = iter(batches)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            exhausted = False
+            while True:
+                while not exhausted and len(in_flight) < self.concurrency:
+                    item = next(iterator, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    action, batch = item
+                    in_flight[executor.submit(self.upload_batch, action, batch)] = batch
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = in_flight.pop(future)
+                    record_ids, error = future.result()
+                    ok = sum(1 for record_id in record_ids if record_id)
+                    succeeded += ok
+                    failed += len(batch) - ok
+                    if error:
+                        print(f"{len(batch)} 条记录写入失败: {error}")
+                    if on_batch:
+                        on_batch(batch, record_ids, error)
+        return succeeded, failed
+
+def prefetch(iterable, size):
+    """在后台线程中读取 iterable，通过容量为 size 的队列交给调用方
+
+    读取数据库和生成记录与上传并行，队列满时生产者等待，内存占用有上限。
+    iterable 只在生产者线程中使用（SQLite 连接不能跨线程）：调用方提前结束或抛出异常时
+    通知生产者停止，由生产者在自己的线程中关闭 iterable，调用方等待其退出后再返回
+    """
+    items = queue.Queue(maxsize=size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put(item):
+                    return
+            put((end, None))
+        except Exception as e:
+            put((end, e))
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if type(item) is tuple and item[0] is end:
+                if item[1] is not None:
+                    raise item[1]
+                return
+            yield item
+    finally:
+        stop.set()
+        producer.join()
+
+def batch_create_records(tokens, app_token, table_id, records):
+    """批量添加记录到数据表，返回与 records 一一对应的记录ID列表（失败为 None）"""
+    record_ids = {}
+
+    def on_batch(batch, ids, error):
+        for record, record_id in zip(batch, ids):
+            record_ids[id(record)] = record_id
+        done = len(record_ids)
+        print(f"已处理 {done}/{len(records)} 条记录")
+
+    uploader = RecordUploader(tokens, app_token, table_id)
+    with uploader.session:
+        uploader.run(records, on_batch=on_batch)
+    return [record_ids.get(id(record)) for record in records]
+
+def open_sync_db(db_file=None):
+    """打开增量同步状态数据库"""
+    conn = sqlite3.connect(db_file or SYNC_DB)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_tables (
+        app_token TEXT,
+        table_name TEXT,
+        table_id TEXT,
+        PRIMARY KEY (app_token, table_name)
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS synced_records (
+        table_id TEXT,
+        article_id TEXT,
+        record_id TEXT,
+        content_hash TEXT,
+        synced_at TEXT,
+        PRIMARY KEY (table_id, article_id)
+    )
+    ''')
+    conn.commit()
+    return conn
+
+def get_sync_table(tokens, state, app_token, table_name, fields):
+    """返回同步使用的数据表：优先用记录过的，其次按名称查找，都没有时创建"""
+    row = state.execute(
+        "SELECT table_id FROM sync_tables WHERE app_token = ? AND table_name = ?",
+        (app_token, table_name)).fetchone()
+    if row:
+        return row[0]
+    table_id = find_table(tokens, app_token, table_name)
+    if table_id:
+        print(f"复用已有数据表: {table_name} (ID: {table_id})")
+    else:
+        table_id = create_table(tokens, app_token, table_name, fields)
+        if not table_id:
+            return None
+        print(f"成功创建数据表: {table_name} (ID: {table_id})")
+    with state:
+        state.execute("INSERT OR REPLACE INTO sync_tables VALUES (?, ?, ?)",
+                      (app_token, table_name, table_id))
+    return table_id
+
+def content_hash(fields):
+    """记录内容的哈希，不包含阅读者填写的字段"""
+    content = {k: v for k, v in fields.items() if k not in READER_FIELDS}
+    data = json.dumps(content, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+def sync_batches(articles, table_id, stats, batch_size=BATCH_SIZE):
+    """增量同步的批次生成器：新文章交给 batch_create，内容变化的交给 batch_update，未变化的跳过
+
+    articles 为数据库行的分块序列；每块只查询本块文章的同步记录，内存占用与文章总数无关。
+    stats 中累计新增、更新和未变化的数量
+    """
+    state = open_sync_db()
+    pending = {"batch_create": [], "batch_update": []}
+    try:
+        for chunk in articles:
+            synced = {}
+            ids = [article["article_id"] for article in chunk]
+            for i in range(0, len(ids), 500):
+                part = ids[i:i + 500]
+                synced.update((article_id, (record_id, digest)) for article_id, record_id, digest
+                              in state.execute(
+                    f"SELECT article_id, record_id, content_hash FROM synced_records "
+                    f"WHERE table_id = ? AND article_id IN ({','.join('?' * len(part))})",
+                    [table_id] + part))
+
+            for article in chunk:
+                # 序号使用数据库中的文章序号，保证每次同步时保持不变
+                record = build_record(article, article["id"])
+                fields = record["fields"]
+                known = synced.get(fields["文章ID"])
+                if known is None:
+                    action = "batch_create"
+                elif known[1] != content_hash(fields):
+                    action = "batch_update"
+                    record = {"record_id": known[0],
+                              "fields": {k: v for k, v in fields.items() if k not in READER_FIELDS}}
+                else:
+                    stats["unchanged"] += 1
+                    continue
+                stats[action] += 1
+                pending[action].append(record)
+                if len(pending[action]) >= batch_size:
+                    yield action, pending[action]
+                    pending[action] = []
+        for action, batch in pending.items():
+            if batch:
+                yield action, batch
+    finally:
+        state.close()
+
+def sync_recorder(state, table_id, failed):
+    """返回保存同步结果的 on_batch 回调：每个批次完成后立即保存映射，中断后重新同步不会重复创建"""
+
+    def on_batch(batch, record_ids, error):
+        rows = []
+        now = datetime.now().isoformat(timespec="seconds")
+        for record, record_id in zip(batch, record_ids):
+            article_id = record["fields"]["文章ID"]
+            if record_id:
+                rows.append((table_id, article_id, record_id, content_hash(record["fields"]), now))
             else:
-                print(f"添加记录失败: {result.get('msg')}")
-        else:
-            print(f"添加记录请求失败: {response.status_code}, {response.text}")
-        
-        # 避免API限流
-        if i + batch_size < total_records:
-            time.sleep(0.5)
+                failed.append(article_id)
+        with state:
+            state.executemany('''
+            INSERT INTO synced_records (table_id, article_id, record_id, content_hash, synced_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(table_id, article_id) DO UPDATE SET
+                record_id = excluded.record_id,
+                content_hash = excluded.content_hash,
+                synced_at = excluded.synced_at
+            ''', rows)
+
+    return on_batch
+
+def parse_date_arg(value, end=False):
+    """把 YYYY-MM-DD 转换为本地时间的秒级时间戳；end 为真时返回次日零点（不含）"""
+    date_obj = datetime.strptime(value, "%Y-%m-%d")
+    if end:
+        date_obj += timedelta(days=1)
+    return int(date_obj.timestamp())
+
+def build_query(limit=None, since=None, until=None):
+    """构造文章查询，返回 (SQL, 参数)
+
+    since/until 为 YYYY-MM-DD（均包含当天），通过 gmt_create_ts 索引过滤；
+    创建时间和筛选时间直接由 SQLite 从时间戳批量格式化
+    """
+    conditions = []
+    params = []
+    if since:
+        conditions.append("gmt_create_ts >= ?")
+        params.append(parse_date_arg(since))
+    if until:
+        conditions.append("gmt_create_ts < ?")
+        params.append(parse_date_arg(until, end=True))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit_clause = "LIMIT ?" if limit else ""
+    if limit:
+        params.append(limit)
     
-    return success_count
+    sql = f'''
+    SELECT id, article_id, ai_summary_content, gmt_create, author_name,
+           strftime('%Y/%m/%d', gmt_create_ts, 'unixepoch', 'localtime') AS display_date,
+           strftime('%Y-%m', gmt_create_ts, 'unixepoch', 'localtime') AS filter_month
+    FROM articles 
+    {where}
+    ORDER BY id
+    {limit_clause}
+    '''
+    return sql, params
+
+def count_articles(limit=None, since=None, until=None):
+    """符合条件的文章数"""
+    sql, params = build_query(limit, since, until)
+    conn = sqlite3.connect(DB_FILE)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+    finally:
+        conn.close()
 
-def get_articles_from_db(limit=None):
-    """从数据库获取文章"""
+def iter_articles(limit=None, since=None, until=None, chunk_size=FETCH_SIZE):
+    """从数据库游标分块读取文章，每次产出最多 chunk_size 行"""
+    sql, params = build_query(limit, since, until)
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    if limit:
-        cursor.execute('''
-        SELECT article_id, ai_summary_content, gmt_create, author_name 
-        FROM articles 
-        ORDER BY id  
-        LIMIT ?
-        ''', (limit,))
-    else:
-        cursor.execute('''
-        SELECT article_id, ai_summary_content, gmt_create, author_name 
-        FROM articles 
-        ORDER BY id 
-        ''')
-    
-    articles = cursor.fetchall()
-    conn.close()
-    
-    return articles
+    try:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        conn.close()
+
+def get_articles_from_db(limit=None, since=None, until=None):
+    """从数据库获取文章（一次性读入全部行）"""
+    return [article for chunk in iter_articles(limit, since, until) for article in chunk]
 
 from datetime import datetime
 
@@ -228,8 +782,51 @@ def format_date(gmt_create, date_format="%Y/%m/%d"):
         return gmt_create
 
 
-def export_to_feishu_bitable(num_articles=100, use_existing=False):
-    """导出文章到飞书多维表格"""
+def build_record(article, seq):
+    """把一行文章数据转换为多维表格记录"""
+    article_id = article['article_id']
+    author = article['author_name'] or "佚名"
+    gmt_create = article['display_date'] or format_date(article['gmt_create'])
+    filter_time = article['filter_month'] or format_date(article['gmt_create'], "%Y-%m")
+    ai_summary = article['ai_summary_content'] or "暂无AI摘要"
+    
+    # 构建原文链接
+    original_link = f"{BASE_ARTICLE_URL}{article_id}"
+    
+    return {
+        "fields": {
+            "序号": seq,
+            "文章ID": article_id,
+            "作者": author,
+            "创建时间": gmt_create,
+            "筛选时间": filter_time,
+            "AI摘要": ai_summary,
+            "原文链接": {"text":original_link,"link":original_link},
+            "是否已读": "否"
+        }
+    }
+
+def export_batches(articles, batch_size=BATCH_SIZE):
+    """全量导出的批次生成器，序号从 1 开始连续编号"""
+    batch = []
+    seq = 0
+    for chunk in articles:
+        for article in chunk:
+            seq += 1
+            batch.append(build_record(article, seq))
+            if len(batch) >= batch_size:
+                yield "batch_create", batch
+                batch = []
+    if batch:
+        yield "batch_create", batch
+
+def export_to_feishu_bitable(num_articles=100, use_existing=False, since=None, until=None,
+                             sync=False):
+    """导出文章到飞书多维表格，since/until 按文章创建日期过滤
+
+    sync 为真时增量同步到同一个数据表：只写入新增和内容变化的文章，
+    序号使用数据库中的文章序号，保证每次同步时保持不变
+    """
     if not all([FEISHU_APP_ID, FEISHU_APP_SECRET]):
         print("请先在.env文件中配置飞书API相关参数")
         return False
@@ -239,20 +836,19 @@ def export_to_feishu_bitable(num_articles=100, use_existing=False):
         print("使用现有多维表格需要提供FEISHU_BITABLE_ID")
         use_existing = False
     
-    # 获取访问令牌
+    # 获取访问令牌（优先使用缓存，过期前自动刷新）
     print("正在获取飞书访问令牌...")
-    access_token = get_access_token()
-    if not access_token:
+    tokens = TenantTokenProvider()
+    if not tokens.get():
         return False
     
-    # 获取文章数据
-    print(f"正在从数据库获取最新的{num_articles}篇文章...")
-    articles = get_articles_from_db(limit=num_articles)
-    if not articles:
+    # 统计文章数量，文章本身在上传时从数据库游标中分块读取
+    total = count_articles(limit=num_articles, since=since, until=until)
+    if not total:
         print("没有找到文章")
         return False
     
-    print(f"找到了{len(articles)}篇文章，开始导出到飞书多维表格...")
+    print(f"找到了{total}篇文章，开始导出到飞书多维表格...")
     
     # 定义多维表格的字段结构
     fields = [
@@ -278,7 +874,7 @@ def export_to_feishu_bitable(num_articles=100, use_existing=False):
     else:
         # 创建新的多维表格
         export_date = datetime.now().strftime("%Y年%m月%d日")
-        app_token = create_bitable(access_token, f"盛财有数文章汇总 - {export_date}")
+        app_token = create_bitable(tokens, f"盛财有数文章汇总 - {export_date}")
         if not app_token:
             print("创建多维表格失败")
             return False
@@ -304,52 +900,76 @@ def export_to_feishu_bitable(num_articles=100, use_existing=False):
         except Exception as e:
             print(f"保存多维表格ID到.env文件失败: {str(e)}")
     
-    # 创建数据表
+    # 创建数据表（增量同步时复用同一个数据表）
     table_name = "精华文章"
-    table_id = create_table(access_token, app_token, table_name, fields)
-    if not table_id:
-        print("创建数据表失败")
-        return False
+    # 增量同步状态在整个导出过程中使用，无论成功与否都要关闭
+    state = open_sync_db() if sync else None
+    try:
+        if sync:
+            table_id = get_sync_table(tokens, state, app_token, table_name, fields)
+        else:
+            table_id = create_table(tokens, app_token, table_name, fields)
+        if not table_id:
+            print("创建数据表失败")
+            return False
     
-    print(f"成功创建数据表: {table_name} (ID: {table_id})")
+        if not sync:
+            print(f"成功创建数据表: {table_name} (ID: {table_id})")
     
-    # 准备文章记录
-    records = []
-    for i, article in enumerate(tqdm(articles, desc="准备数据"), 1):
-        article_id = article['article_id']
-        author = article['author_name'] or "佚名"
-        gmt_create = format_date(article['gmt_create'])
-        filter_time = format_date(article['gmt_create'], "%Y-%m")
-        ai_summary = article['ai_summary_content'] or "暂无AI摘要"
-        
-        # 构建原文链接
-        original_link = f"{BASE_ARTICLE_URL}{article_id}"
-        
-        # 创建记录
-        record = {
-            "fields": {
-                "序号": i,
-                "文章ID": article_id,
-                "作者": author,
-                "创建时间": gmt_create,
-                "筛选时间": filter_time,
-                "AI摘要": ai_summary,
-                "原文链接": {"text":original_link,"link":original_link},
-                "是否已读": "否"
-            }
-        }
-        records.append(record)
+        # 读取、转换和上传流水线：后台线程从游标分块读取并生成批次，经有界队列交给上传器
+        articles = iter_articles(limit=num_articles, since=since, until=until)
+        stats = {"batch_create": 0, "batch_update": 0, "unchanged": 0}
+        if sync:
+            batches = sync_batches(articles, table_id, stats)
+        else:
+            batches = export_batches(articles)
+        failed_ids = []
+        progress = tqdm(total=total, desc="同步" if sync else "上传")
     
-    # 批量添加记录
-    success_count = batch_create_records(access_token, app_token, table_id, records)
+        if sync:
+            record_result = sync_recorder(state, table_id, failed_ids)
+        else:
+            def record_result(batch, record_ids, error):
+                failed_ids.extend(record["fields"]["文章ID"]
+                                  for record, record_id in zip(batch, record_ids) if not record_id)
+    
+        def on_batch(batch, record_ids, error):
+            record_result(batch, record_ids, error)
+            progress.update(len(batch))
     
-    print(f"\n导出完成! 成功导出 {success_count}/{len(articles)} 篇文章到飞书多维表格")
-    print(f"请访问以下链接查看: https://bitable.feishu.cn/app/{app_token}")
+        uploader = RecordUploader(tokens, app_token, table_id)
+        with uploader.session:
+            success_count, _ = uploader.run_batches(
+                prefetch(batches, uploader.concurrency * 2), on_batch)
+        progress.update(total - progress.n)
+        progress.close()
+    
+        if sync:
+            print(f"\n同步完成! 新增 {stats['batch_create']} 篇，更新 {stats['batch_update']} 篇，"
+                  f"{stats['unchanged']} 篇未变化，失败 {len(failed_ids)} 篇")
+        else:
+            print(f"\n导出完成! 成功导出 {success_count}/{total} 篇文章到飞书多维表格")
+        if failed_ids:
+            print(f"以下 {len(failed_ids)} 篇文章{'同步' if sync else '导出'}失败"
+                  f"{'，下次同步时重试' if sync else ''}: "
+                  f"{', '.join(failed_ids[:50])}{' ...' if len(failed_ids) > 50 else ''}")
+        print(f"请访问以下链接查看: https://bitable.feishu.cn/app/{app_token}")
     
-    return True
+        return not failed_ids
+    finally:
+        if state is not None:
+            state.close()
 
 if __name__ == "__main__":
     # 默认导出最新的100篇文章到多维表格
     # 设置use_existing=True可以使用已有的多维表格(需在.env中设置FEISHU_BITABLE_ID)
     # export_to_feishu_bitable(10, use_existing=True) 
-    export_to_feishu_bitable(5550, use_existing=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="将爬取的文章导出到飞书多维表格")
+    parser.add_argument("-n", "--num", type=int, default=5550, help="导出的文章数量")
+    parser.add_argument("--since", help="只导出该日期（含）之后创建的文章，格式 YYYY-MM-DD")
+    parser.add_argument("--until", help="只导出该日期（含）之前创建的文章，格式 YYYY-MM-DD")
+    parser.add_argument("--sync", action="store_true",
+                        help="增量同步到同一个数据表，只写入新增和内容变化的文章")
+    args = parser.parse_args()
+    export_to_feishu_bitable(args.num, use_existing=True, since=args.since, until=args.until,
+                             sync=args.sync) 
\ No newline at end of file
@@ -6,9 +6,18 @@
 """
 
 import os
+import re
+import json
+import hashlib
+import inspect
 import sqlite3
-from datetime import datetime
+import tempfile
+from datetime import datetime, timedelta
+from array import array
+from collections import defaultdict
 import webbrowser
+import argparse
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from tqdm import tqdm
 
 # 数据库设置
@@ -17,31 +26,303 @@ DB_FILE = "scys_articles.db"
 # 网站基础URL
 BASE_ARTICLE_URL = "https://scys.com/articleDetail/xq_topic/"
 
-def get_articles_from_db(limit=None):
+# 导出目录
+EXPORT_DIR = "exported_articles"
+# 每个汇总分页包含的文章数
+SUMMARY_PAGE_SIZE = 200
+# 每次从游标读取的行数
+FETCH_SIZE = 500
+# 汇总目录页和分页索引
+INDEX_PAGE = "文章汇总.html"
+PAGES_INDEX = "文章汇总.json"
+# 构建清单，记录已生成文件的输入哈希
+BUILD_MANIFEST = ".build_manifest.db"
+# 交给进程池的每批文章页面数
+RENDER_CHUNK = 200
+# 浏览器端检索数据的目录、倒排索引分片数和元数据中保留的摘要长度
+SEARCH_DIR = "search"
+SEARCH_SHARDS = 64
+SEARCH_SUMMARY_CHARS = 60
+# 检索切词规则：连续汉字按单字和相邻两字切分，连续字母数字作为整词
+TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[0-9A-Za-z]+')
+
+# 目录页的检索脚本：按需加载 meta 和倒排索引分片，在内存中过滤排序，结果列表虚拟滚动
+SEARCH_SCRIPT = r"""// 由 export_to_html.py 生成
+var scysSearch = (function () {
+    var ROW_HEIGHT = 36, OVERSCAN = 10;
+    var TOKEN_RE = /[\u4e00-\u9fff]+|[0-9A-Za-z]+/g;
+    var cache = {}, waiting = {}, resolvers = {};
+    var meta = null, view = [], timer = null;
+
+    // 通过 <script> 加载检索数据，file:// 下同样可用
+    function load(name) {
+        if (cache[name]) return Promise.resolve(cache[name]);
+        if (!waiting[name]) {
+            waiting[name] = new Promise(function (resolve) { resolvers[name] = resolve; });
+            var script = document.createElement('script');
+            script.src = 'search/' + name + '.js';
+            script.onerror = function () { loaded(name, {}); };
+            document.head.appendChild(script);
+        }
+        return waiting[name];
+    }
+
+    function loaded(name, data) {
+        cache[name] = data;
+        if (resolvers[name]) resolvers[name](data);
+    }
+
+    function shardOf(token) {
+        var h = 0x811c9dc5;
+        for (var i = 0; i < token.length; i++) {
+            h = Math.imul(h ^ token.charCodeAt(i), 0x01000193) >>> 0;
+        }
+        return h % meta.shards;
+    }
+
+    // 切分检索词：单个汉字直接按单字检索，连续汉字按相邻两字检索
+    function parseQuery(query) {
+        var tokens = [];
+        (query.match(TOKEN_RE) || []).forEach(function (run) {
+            if (/^[0-9A-Za-z]+$/.test(run)) tokens.push(run.toLowerCase());
+            else if (run.length === 1) tokens.push(run);
+            else for (var i = 0; i < run.length - 1; i++) tokens.push(run.substr(i, 2));
+        });
+        return tokens;
+    }
+
+    function decode(deltas) {
+        var rows = new Array(deltas.length), row = 0;
+        for (var i = 0; i < deltas.length; i++) { row += deltas[i]; rows[i] = row; }
+        return rows;
+    }
+
+    function intersect(a, b) {
+        var out = [], i = 0, j = 0;
+        while (i < a.length && j < b.length) {
+            if (a[i] === b[j]) { out.push(a[i]); i++; j++; }
+            else if (a[i] < b[j]) i++;
+            else j++;
+        }
+        return out;
+    }
+
+    // 返回命中的 meta 行号（升序），未输入关键词时返回 null
+    function matchRows(query) {
+        var tokens = parseQuery(query);
+        if (!tokens.length) return Promise.resolve(null);
+        var shards = tokens.map(function (t) { return 'index_' + shardOf(t); });
+        return Promise.all(shards.map(load)).then(function (indexes) {
+            var rows = null;
+            tokens.forEach(function (token, i) {
+                var postings = decode(indexes[i][token] || []);
+                rows = rows === null ? postings : intersect(rows, postings);
+            });
+            return rows;
+        });
+    }
+
+    function dayStart(value, end) {
+        if (!value) return null;
+        var d = new Date(value + 'T00:00:00');
+        if (end) d.setDate(d.getDate() + 1);
+        return d.getTime() / 1000;
+    }
+
+    function formatDate(ts) {
+        if (!ts) return '';
+        var d = new Date(ts * 1000);
+        function pad(n) { return (n < 10 ? '0' : '') + n; }
+        return d.getFullYear() + '年' + pad(d.getMonth() + 1) + '月' + pad(d.getDate()) + '日 ' +
+            pad(d.getHours()) + ':' + pad(d.getMinutes());
+    }
+
+    function update() {
+        var query = document.getElementById('keyword').value;
+        var author = document.getElementById('author').value;
+        var since = dayStart(document.getElementById('since').value, false);
+        var until = dayStart(document.getElementById('until').value, true);
+        var sort = document.getElementById('sort').value;
+        matchRows(query).then(function (rows) {
+            if (query !== document.getElementById('keyword').value) return;
+            rows = rows || meta.rows.map(function (_, i) { return i; });
+            view = rows.filter(function (i) {
+                var r = meta.rows[i];
+                return (author === '' || r[2] === +author) &&
+                    (since === null || r[3] >= since) && (until === null || r[3] < until);
+            });
+            if (sort === 'oldest') view.sort(function (a, b) { return meta.rows[a][3] - meta.rows[b][3] || b - a; });
+            else if (sort === 'author') view.sort(function (a, b) {
+                return meta.authors[meta.rows[a][2]].localeCompare(meta.authors[meta.rows[b][2]]) || a - b;
+            });
+            else view.sort(function (a, b) { return meta.rows[b][3] - meta.rows[a][3] || a - b; });
+            document.getElementById('status').textContent = '共 ' + view.length + ' 篇';
+            var results = document.getElementById('results');
+            results.firstChild.style.height = (view.length * ROW_HEIGHT) + 'px';
+            results.scrollTop = 0;
+            render();
+        });
+    }
+
+    function cell(cls, text) {
+        var span = document.createElement('span');
+        span.className = cls;
+        span.textContent = text;
+        span.title = text;
+        return span;
+    }
+
+    function link(href, text, blank) {
+        var a = document.createElement('a');
+        a.href = href;
+        a.textContent = text;
+        if (blank) a.target = '_blank';
+        return a;
+    }
+
+    // 只渲染可见区域内的行
+    function render() {
+        var results = document.getElementById('results'), spacer = results.firstChild;
+        var first = Math.max(0, Math.floor(results.scrollTop / ROW_HEIGHT) - OVERSCAN);
+        var last = Math.min(view.length, Math.ceil((results.scrollTop + results.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+        var fragment = document.createDocumentFragment();
+        for (var k = first; k < last; k++) {
+            var r = meta.rows[view[k]], row = document.createElement('div');
+            row.className = 'row';
+            row.style.top = (k * ROW_HEIGHT) + 'px';
+            row.appendChild(cell('num', r[0]));
+            row.appendChild(cell('author', meta.authors[r[2]]));
+            row.appendChild(cell('date', formatDate(r[3])));
+            row.appendChild(cell('summary', r[4]));
+            var links = cell('links', '');
+            links.appendChild(link('https://scys.com/articleDetail/xq_topic/' + r[1], '原文链接', true));
+            links.appendChild(document.createTextNode(' | '));
+            links.appendChild(link('article_' + r[1] + '.html', '本地查看', true));
+            row.appendChild(links);
+            fragment.appendChild(row);
+        }
+        spacer.replaceChildren(fragment);
+    }
+
+    function init() {
+        load('meta').then(function (data) {
+            meta = data;
+            var select = document.getElementById('author');
+            meta.authors.map(function (name, i) { return [name, i]; })
+                .sort(function (a, b) { return a[0].localeCompare(b[0]); })
+                .forEach(function (item) {
+                    var option = document.createElement('option');
+                    option.value = item[1];
+                    option.textContent = item[0];
+                    select.appendChild(option);
+                });
+            ['author', 'since', 'until', 'sort'].forEach(function (id) {
+                document.getElementById(id).addEventListener('change', update);
+            });
+            document.getElementById('keyword').addEventListener('input', function () {
+                clearTimeout(timer);
+                timer = setTimeout(update, 150);
+            });
+            document.getElementById('results').addEventListener('scroll', render);
+            update();
+        });
+    }
+
+    if (document.readyState === 'loading') document.addEventListener('DOMContentLoaded', init);
+    else init();
+
+    return { loaded: loaded };
+})();
+"""
+
+def parse_date_arg(value, end=False):
+    """把 YYYY-MM-DD 转换为本地时间的秒级时间戳；end 为真时返回次日零点（不含）"""
+    date_obj = datetime.strptime(value, "%Y-%m-%d")
+    if end:
+        date_obj += timedelta(days=1)
+    return int(date_obj.timestamp())
+
+def build_query(limit=None, since=None, until=None, columns=None):
+    """构造查询文章的 SQL 和参数
+
+    since/until 为 YYYY-MM-DD（均包含当天），通过 gmt_create_ts 索引过滤；
+    按 (gmt_create_ts, id) 从新到旧排序，与文章序号的排名顺序一致；
+    显示用的日期直接由 SQLite 从时间戳批量格式化
+    """
+    conditions = []
+    params = []
+    if since:
+        conditions.append("gmt_create_ts >= ?")
+        params.append(parse_date_arg(since))
+    if until:
+        conditions.append("gmt_create_ts < ?")
+        params.append(parse_date_arg(until, end=True))
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    limit_clause = "LIMIT ?" if limit else ""
+    if limit:
+        params.append(limit)
+    
+    columns = columns or """id, article_id, ai_summary_content, gmt_create, author_name, gmt_create_ts,
+           strftime('%Y年%m月%d日 %H:%M', gmt_create_ts, 'unixepoch', 'localtime') AS display_date"""
+    sql = f'''
+    SELECT {columns}
+    FROM articles 
+    {where}
+    ORDER BY gmt_create_ts DESC, id DESC
+    {limit_clause}
+    '''
+    return sql, params
+
+def get_articles_from_db(limit=None, since=None, until=None):
     """从数据库获取文章"""
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
-    if limit:
-        cursor.execute('''
-        SELECT article_id, ai_summary_content, gmt_create, author_name 
-        FROM articles 
-        ORDER BY id DESC 
-        LIMIT ?
-        ''', (limit,))
-    else:
-        cursor.execute('''
-        SELECT article_id, ai_summary_content, gmt_create, author_name 
-        FROM articles 
-        ORDER BY id DESC
-        ''')
+    cursor.execute(*build_query(limit, since, until))
     
     articles = cursor.fetchall()
     conn.close()
     
     return articles
 
+def count_articles(conn, limit=None, since=None, until=None):
+    """统计符合条件的文章数"""
+    sql, params = build_query(limit, since, until, columns="id")
+    return conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+def newest_number(conn, since=None, until=None):
+    """导出范围内最新一篇文章的序号
+
+    序号是文章在全表中按 (gmt_create_ts, id) 从旧到新的排名，与导出数量和日期范围无关，
+    新增文章不会改变已有文章的序号。导出的文章在这个顺序中是连续的一段，
+    其余文章的序号依次递减；没有创建时间的文章排在最前
+    """
+    sql, params = build_query(1, since, until, columns="id, gmt_create_ts")
+    row = conn.execute(sql, params).fetchone()
+    if row is None:
+        return 0
+    row_id, gmt_create_ts = row[0], row[1]
+    if gmt_create_ts is None:
+        sql = "SELECT COUNT(*) FROM articles WHERE gmt_create_ts IS NULL AND id <= ?"
+        params = (row_id,)
+    else:
+        sql = '''
+        SELECT COUNT(*) FROM articles
+        WHERE gmt_create_ts IS NULL OR gmt_create_ts < ? OR (gmt_create_ts = ? AND id <= ?)
+        '''
+        params = (gmt_create_ts, gmt_create_ts, row_id)
+    return conn.execute(sql, params).fetchone()[0]
+
+def iter_articles(conn, limit=None, since=None, until=None, fetch_size=FETCH_SIZE):
+    """从游标中逐批读取文章，不一次性载入全部结果"""
+    cursor = conn.execute(*build_query(limit, since, until))
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            break
+        yield from rows
+
 def format_date(gmt_create):
     """格式化日期显示"""
     try:
@@ -57,34 +338,34 @@ def format_date(gmt_create):
     except:
         return gmt_create
 
-def export_to_html(num_articles=20, open_browser=True):
-    """导出文章到HTML文件"""
-    # 获取文章数据
-    print(f"正在从数据库获取最新的{num_articles}篇文章...")
-    articles = get_articles_from_db(limit=num_articles)
-    if not articles:
-        print("没有找到文章")
-        return False
-    
-    print(f"找到了{len(articles)}篇文章，开始导出到HTML...")
-    
-    # 创建导出目录
-    export_dir = "exported_articles"
-    if not os.path.exists(export_dir):
-        os.makedirs(export_dir)
-    
-    # 创建汇总HTML
-    export_date = datetime.now().strftime("%Y年%m月%d日")
-    summary_filename = f"文章汇总_{export_date.replace(':', '-')}.html"
-    summary_file = os.path.join(export_dir, summary_filename)
-    
-    with open(summary_file, "w", encoding="utf-8") as f:
-        # HTML头部
-        f.write(f"""<!DOCTYPE html>
+def summary_page_name(page_no):
+    """汇总分页的文件名
+
+    分页从最早的文章开始编号，新文章只会进入编号最大的分页，已有分页的文件名和内容保持不变
+    """
+    return f"文章汇总_{page_no}.html"
+
+def render_pager(page_no, last_page, first_page=1):
+    """分页导航：上一页为更新的文章，下一页为更早的文章
+
+    只导出部分文章时分页号从 first_page 开始，不链接未导出的分页
+    """
+    links = [f'<a href="{INDEX_PAGE}">检索全部文章</a>']
+    if page_no < last_page:
+        links.append(f'<a href="{summary_page_name(page_no + 1)}">上一页</a>')
+    links.append(f'<span>第 {page_no} 页</span>')
+    if page_no > first_page:
+        links.append(f'<a href="{summary_page_name(page_no - 1)}">下一页</a>')
+    return f'<div class="pager">{" ".join(links)}</div>'
+
+def render_summary_header(page_no, last_page, first_page=1):
+    """汇总分页的头部和表头"""
+    pager = render_pager(page_no, last_page, first_page)
+    return f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
-    <title>盛财有数文章汇总 - {export_date}</title>
+    <title>盛财有数文章汇总 - 第 {page_no} 页</title>
     <style>
         body {{ font-family: Arial, sans-serif; margin: 20px; }}
         table {{ border-collapse: collapse; width: 100%; }}
@@ -93,11 +374,13 @@ def export_to_html(num_articles=20, open_browser=True):
         tr:nth-child(even) {{ background-color: #f9f9f9; }}
         h1 {{ color: #333; }}
         .summary {{ max-width: 400px; overflow: hidden; text-overflow: ellipsis; }}
+        .pager {{ margin: 15px 0; }}
+        .pager a, .pager span {{ margin-right: 15px; }}
     </style>
 </head>
 <body>
-    <h1>盛财有数文章汇总 - {export_date}</h1>
-    <p>共导出 {len(articles)} 篇文章</p>
+    <h1>盛财有数文章汇总 - 第 {page_no} 页</h1>
+    {pager}
     <table>
         <tr>
             <th>序号</th>
@@ -111,46 +394,116 @@ def export_to_html(num_articles=20, open_browser=True):
             <th>阅读时间</th>
             <th>阅读摘要</th>
         </tr>
-""")
-        
-        # 添加每篇文章信息并创建单独的HTML文件
-        for i, article in enumerate(tqdm(articles, desc="生成HTML文件"), 1):
-            article_id = article['article_id']
-            author = article['author_name'] or "佚名"
-            gmt_create = format_date(article['gmt_create'])
-            ai_summary = article['ai_summary_content'] or "未提供AI摘要"
-            
-            # 处理可能过长的摘要
-            if ai_summary and len(ai_summary) > 100:
-                ai_summary_display = ai_summary[:97] + "..."
-            else:
-                ai_summary_display = ai_summary
-                
-            # 构建原文链接
-            original_link = f"{BASE_ARTICLE_URL}{article_id}"
-            
-            # 创建单独的文章HTML文件
-            article_filename = f"article_{article_id}.html"
-            article_path = os.path.join(export_dir, article_filename)
-            
-            # 写入汇总表格
-            f.write(f"""
-        <tr>
+"""
+
+def render_summary_footer(page_no, last_page, first_page=1):
+    """汇总分页的结尾"""
+    pager = render_pager(page_no, last_page, first_page)
+    return f"""
+    </table>
+    {pager}
+    <script>
+        // 通过阅读记录服务（reading_tracker.py）访问时，一次请求取回本页全部文章的阅读状态
+        if (location.protocol.indexOf('http') === 0) {{
+            const rows = document.querySelectorAll('tr[data-article-id]');
+            const ids = Array.from(rows, row => row.dataset.articleId);
+            fetch('/api/reading/status', {{
+                method: 'POST',
+                headers: {{'Content-Type': 'application/json'}},
+                body: JSON.stringify({{article_ids: ids}})
+            }}).then(response => response.json()).then(status => {{
+                rows.forEach(row => {{
+                    const records = status[row.dataset.articleId] || [];
+                    if (!records.length) return;
+                    const latest = records[0];
+                    row.querySelector('.reader').textContent = records.map(r => r.reader).join('、');
+                    row.querySelector('.is-read').textContent = records.some(r => r.is_read === '是') ? '是' : '否';
+                    row.querySelector('.read-date').textContent = latest.read_date || '';
+                    row.querySelector('.notes').textContent = latest.notes || '';
+                }});
+            }}).catch(() => {{}});
+        }}
+    </script>
+</body>
+</html>"""
+
+def render_index_page(export_date, total, last_page, first_page=1):
+    """汇总目录页：检索、筛选和排序全部文章，并列出全部静态分页（从最新的分页开始）
+
+    检索数据在页面打开后按需加载，结果列表只渲染可见的行
+    """
+    page_count = last_page - first_page + 1
+    links = "\n".join(f'        <a href="{summary_page_name(page_no)}">第 {page_no} 页</a>'
+                      for page_no in range(last_page, first_page - 1, -1))
+    return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>盛财有数文章汇总 - {export_date}</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        h1 {{ color: #333; }}
+        .filters {{ display: flex; flex-wrap: wrap; gap: 10px; align-items: center; margin-bottom: 10px; }}
+        .filters input, .filters select {{ padding: 6px; border: 1px solid #ddd; border-radius: 4px; }}
+        #keyword {{ width: 260px; }}
+        #results {{ height: 70vh; overflow-y: auto; border: 1px solid #ddd; position: relative; }}
+        #results .spacer {{ position: relative; }}
+        .row {{ position: absolute; left: 0; right: 0; display: flex; height: 36px; line-height: 36px;
+                border-bottom: 1px solid #eee; white-space: nowrap; }}
+        .row:nth-child(even) {{ background-color: #f9f9f9; }}
+        .row span {{ padding: 0 8px; overflow: hidden; text-overflow: ellipsis; }}
+        .row .num {{ width: 60px; }}
+        .row .author {{ width: 120px; }}
+        .row .date {{ width: 170px; }}
+        .row .summary {{ flex: 1; }}
+        .row .links {{ width: 150px; }}
+        .pages a {{ margin-right: 10px; }}
+    </style>
+</head>
+<body>
+    <h1>盛财有数文章汇总 - {export_date}</h1>
+    <p>共导出 {total} 篇文章，分为 {page_count} 页</p>
+    <div class="filters">
+        <input type="search" id="keyword" placeholder="关键词（AI摘要、作者）">
+        <select id="author"><option value="">全部作者</option></select>
+        <label>从 <input type="date" id="since"></label>
+        <label>到 <input type="date" id="until"></label>
+        <select id="sort">
+            <option value="newest">最新优先</option>
+            <option value="oldest">最早优先</option>
+            <option value="author">按作者</option>
+        </select>
+        <span id="status">正在加载...</span>
+    </div>
+    <div id="results"><div class="spacer"></div></div>
+    <h2>全部分页</h2>
+    <div class="pages">
+{links}
+    </div>
+    <script src="{SEARCH_DIR}/search.js"></script>
+</body>
+</html>"""
+
+def render_summary_row(i, article_id, author, gmt_create, ai_summary_display, original_link,
+                       article_filename):
+    """汇总表格中的一行"""
+    return f"""
+        <tr data-article-id="{article_id}">
             <td>{i}</td>
             <td>{author}</td>
             <td>{gmt_create}</td>
             <td class="summary">{ai_summary_display}</td>
             <td><a href="{original_link}" target="_blank">原文链接</a></td>
             <td><a href="{article_filename}" target="_blank">本地查看</a></td>
-            <td></td>
-            <td></td>
-            <td></td>
-            <td></td>
-        </tr>""")
-            
-            # 创建单独的文章HTML文件
-            with open(article_path, "w", encoding="utf-8") as article_file:
-                article_file.write(f"""<!DOCTYPE html>
+            <td class="reader"></td>
+            <td class="is-read"></td>
+            <td class="read-date"></td>
+            <td class="notes"></td>
+        </tr>"""
+
+def render_article_page(article_id, author, gmt_create, ai_summary, original_link, summary_filename):
+    """单篇文章页面"""
+    return f"""<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -208,9 +561,10 @@ def export_to_html(num_articles=20, open_browser=True):
         // 设置当前日期为默认值
         document.getElementById('read_date').valueAsDate = new Date();
         
+        // 通过阅读记录服务（reading_tracker.py）访问时保存到服务器，直接打开文件时保存在本地浏览器
+        const useServer = location.protocol.indexOf('http') === 0;
+
         function saveNotes() {{
-            // 在实际应用中，这里应该发送数据到服务器
-            // 这里只是一个演示
             const reader = document.getElementById('reader').value;
             const isRead = document.getElementById('is_read').value;
             const readDate = document.getElementById('read_date').value;
@@ -221,42 +575,371 @@ def export_to_html(num_articles=20, open_browser=True):
                 return;
             }}
             
-            // 显示保存成功消息
-            alert('笔记已保存！\\n\\n阅读者: ' + reader + '\\n是否已读: ' + isRead + '\\n阅读时间: ' + readDate + '\\n笔记内容: ' + notes);
-            
-            // 在实际应用中，这里可以将数据保存到localStorage或发送到服务器
+            const saved = () => alert('笔记已保存！\\n\\n阅读者: ' + reader + '\\n是否已读: ' + isRead + '\\n阅读时间: ' + readDate + '\\n笔记内容: ' + notes);
+            localStorage.setItem('scys_reader', reader);
+            if (useServer) {{
+                fetch('/api/reading', {{
+                    method: 'POST',
+                    headers: {{'Content-Type': 'application/json'}},
+                    body: JSON.stringify({{article_id: '{article_id}', reader: reader, is_read: isRead,
+                                          read_date: readDate, notes: notes}})
+                }}).then(response => {{
+                    if (!response.ok) throw new Error(response.status);
+                    saved();
+                }}).catch(error => alert('保存失败: ' + error.message));
+                return;
+            }}
+            saved();
             localStorage.setItem('article_{article_id}_reader', reader);
             localStorage.setItem('article_{article_id}_is_read', isRead);
             localStorage.setItem('article_{article_id}_read_date', readDate);
             localStorage.setItem('article_{article_id}_notes', notes);
         }}
         
+        function showNotes(reader, isRead, readDate, notes) {{
+            if (reader) document.getElementById('reader').value = reader;
+            if (isRead) document.getElementById('is_read').value = isRead;
+            if (readDate) document.getElementById('read_date').value = readDate;
+            if (notes) document.getElementById('notes').value = notes;
+        }}
+
         // 加载保存的数据
         window.onload = function() {{
+            if (useServer) {{
+                const reader = localStorage.getItem('scys_reader') || '';
+                fetch('/api/reading?article_id={article_id}&reader=' + encodeURIComponent(reader))
+                    .then(response => response.json())
+                    .then(records => {{
+                        const record = records[0];
+                        if (record) showNotes(record.reader, record.is_read, record.read_date, record.notes);
+                        else showNotes(reader);
+                    }}).catch(() => {{}});
+                return;
+            }}
             const reader = localStorage.getItem('article_{article_id}_reader');
             const isRead = localStorage.getItem('article_{article_id}_is_read');
             const readDate = localStorage.getItem('article_{article_id}_read_date');
             const notes = localStorage.getItem('article_{article_id}_notes');
-            
-            if (reader) document.getElementById('reader').value = reader;
-            if (isRead) document.getElementById('is_read').value = isRead;
-            if (readDate) document.getElementById('read_date').value = readDate;
-            if (notes) document.getElementById('notes').value = notes;
+            showNotes(reader, isRead, readDate, notes);
         }};
     </script>
 </body>
-</html>""")
-        
-        # 完成汇总HTML
-        f.write("""
-    </table>
-    <script>
-        // 可以在这里添加一些JavaScript功能，例如排序、过滤等
-    </script>
-</body>
-</html>""")
+</html>"""
+
+def search_tokens(text):
+    """检索词元集合：中文按单字和相邻两字切分，字母数字按整词（小写）"""
+    tokens = set()
+    for run in TOKEN_RE.findall(text or ""):
+        if run.isascii():
+            tokens.add(run.lower())
+        else:
+            tokens.update(run)
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+def search_shard(token, shards=SEARCH_SHARDS):
+    """词元所在的倒排索引分片（FNV-1a，与 search.js 中的实现一致）"""
+    h = 0x811c9dc5
+    for ch in token:
+        h = ((h ^ ord(ch)) * 0x01000193) & 0xffffffff
+    return h % shards
+
+def write_search_file(export_dir, name, data):
+    """写入一个检索数据文件
+
+    内容为 JSON，包装成 scysSearch.loaded(...) 调用，
+    以便直接用 file:// 打开导出目录时也能通过 <script> 按需加载
+    """
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    with open(os.path.join(export_dir, SEARCH_DIR, f"{name}.js"), "w", encoding="utf-8") as f:
+        f.write(f"scysSearch.loaded({json.dumps(name)},{payload});\n")
+
+class SearchIndexBuilder:
+    """生成浏览器端的检索数据
+
+    meta 是按导出顺序（最新优先）排列的元数据数组，每行为
+    [序号, 文章ID, 作者编号, 创建时间戳, 摘要开头]；倒排索引按词元哈希分片，
+    每个词元对应 meta 行号的差分编码列表。
+    添加文章时 meta 行和各分片的（词元, 行号）直接追加到临时文件，写出时逐个分片读回合并，
+    内存中只保留作者表和一个分片的倒排表
+    """
+
+    def __init__(self, shards=SEARCH_SHARDS):
+        self.shards = shards
+        self.authors = {}
+        self.count = 0
+        self.spill = tempfile.TemporaryDirectory(prefix="scys_search_")
+        self.meta_file = open(os.path.join(self.spill.name, "meta"), "w", encoding="utf-8")
+        self.shard_files = [open(os.path.join(self.spill.name, f"index_{shard_no}"), "w",
+                                 encoding="utf-8") for shard_no in range(shards)]
+
+    def add(self, number, article_id, author, gmt_create_ts, ai_summary):
+        row = self.count
+        self.count += 1
+        author_no = self.authors.setdefault(author, len(self.authors))
+        self.meta_file.write(json.dumps([number, article_id, author_no, gmt_create_ts or 0,
+                                         ai_summary[:SEARCH_SUMMARY_CHARS]],
+                                        ensure_ascii=False, separators=(",", ":")) + "\n")
+        for token in search_tokens(f"{ai_summary} {author}"):
+            self.shard_files[search_shard(token, self.shards)].write(f"{token}\t{row}\n")
+
+    def write_meta(self, export_dir):
+        """逐行写出 meta，不把全部行载入内存"""
+        header = json.dumps({
+            "shards": self.shards,
+            "fields": ["number", "article_id", "author", "gmt_create_ts", "summary"],
+            "authors": list(self.authors),
+        }, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(export_dir, SEARCH_DIR, "meta.js"), "w", encoding="utf-8") as out, \
+                open(self.meta_file.name, encoding="utf-8") as rows:
+            # 去掉头部 JSON 的右括号，接着写 rows 数组
+            out.write(f'scysSearch.loaded("meta",{header[:-1]},"rows":[')
+            for i, line in enumerate(rows):
+                if i:
+                    out.write(",")
+                out.write(line.rstrip("\n"))
+            out.write("]});\n")
+
+    def write_shard(self, export_dir, shard_no):
+        """读回一个分片的（词元, 行号），合并为差分编码的倒排表后写出"""
+        postings = defaultdict(lambda: array("I"))
+        with open(self.shard_files[shard_no].name, encoding="utf-8") as f:
+            for line in f:
+                token, row = line.rstrip("\n").split("\t")
+                postings[token].append(int(row))
+        index = {}
+        for token, rows in postings.items():
+            # 行号按添加顺序写入，已经有序
+            index[token] = [row - prev for prev, row in zip((0, *rows[:-1]), rows)]
+        write_search_file(export_dir, f"index_{shard_no}", index)
+
+    def write(self, export_dir):
+        try:
+            os.makedirs(os.path.join(export_dir, SEARCH_DIR), exist_ok=True)
+            for f in (self.meta_file, *self.shard_files):
+                f.close()
+            self.write_meta(export_dir)
+            for shard_no in range(self.shards):
+                self.write_shard(export_dir, shard_no)
+            with open(os.path.join(export_dir, SEARCH_DIR, "search.js"), "w", encoding="utf-8") as f:
+                f.write(SEARCH_SCRIPT)
+        finally:
+            self.close()
+
+    def close(self):
+        """关闭并删除临时文件"""
+        for f in (self.meta_file, *self.shard_files):
+            f.close()
+        self.spill.cleanup()
+
+def template_hash():
+    """页面模板的哈希，模板代码修改后所有页面都会重新生成"""
+    source = "".join(inspect.getsource(func) for func in
+                     (render_pager, render_summary_header, render_summary_footer,
+                      render_summary_row, render_article_page))
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+def row_hash(*values):
+    """页面输入的哈希"""
+    return hashlib.sha256("\x1f".join(str(v) for v in values).encode("utf-8")).hexdigest()
+
+def open_build_manifest(export_dir):
+    """打开构建清单，记录每个已生成文件的输入哈希和最近一次出现的构建批次"""
+    conn = sqlite3.connect(os.path.join(export_dir, BUILD_MANIFEST))
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS built_files (
+        file TEXT PRIMARY KEY,
+        hash TEXT,
+        build INTEGER
+    )
+    ''')
+    conn.commit()
+    return conn
+
+def write_article_pages(export_dir, pages):
+    """生成一批文章页面（在子进程中运行），pages 为 [(文件名, render_article_page 的参数)]"""
+    for filename, args in pages:
+        with open(os.path.join(export_dir, filename), "w", encoding="utf-8") as article_file:
+            article_file.write(render_article_page(*args))
+    return len(pages)
+
+class PageRenderer:
+    """把需要重新生成的文章页面分批交给进程池（仅在主线程中使用）
+
+    变化的页面较少时直接在主进程中生成，攒满一批后才启动进程池
+    """
+
+    def __init__(self, export_dir, processes=None):
+        self.export_dir = export_dir
+        self.processes = processes or os.cpu_count() or 1
+        self.pool = None
+        self.batch = []
+        self.pending = set()
+        self.rendered = 0
+
+    def add(self, filename, args):
+        self.batch.append((filename, args))
+        if len(self.batch) >= RENDER_CHUNK:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(self.processes)
+            self.pending.add(self.pool.submit(write_article_pages, self.export_dir, self.batch))
+            self.batch = []
+            # 限制在途批次数，避免待渲染的数据堆积在内存中
+            while len(self.pending) > self.processes * 2:
+                done, self.pending = wait(self.pending, return_when=FIRST_COMPLETED)
+                self.rendered += sum(future.result() for future in done)
+
+    def finish(self):
+        """等待全部页面生成完毕，返回生成的页面数"""
+        if self.batch:
+            self.rendered += write_article_pages(self.export_dir, self.batch)
+            self.batch = []
+        if self.pending:
+            done, self.pending = wait(self.pending)
+            self.rendered += sum(future.result() for future in done)
+        return self.rendered
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+
+def export_to_html(num_articles=20, open_browser=True, since=None, until=None,
+                   page_size=SUMMARY_PAGE_SIZE, force=False, processes=None):
+    """导出文章到HTML文件，since/until 按文章创建日期过滤
+
+    从游标中逐批读取文章，汇总按 page_size 篇分页，另写一个 JSON 索引记录各分页。
+    导出目录中的构建清单记录每个文件的输入哈希（文章字段、所在分页和模板），
+    只重新生成新增或变化的文章页面和汇总分页，并删除不再导出的文件；force 为真时全部重新生成
+    """
+    conn = sqlite3.connect(DB_FILE)
+    conn.row_factory = sqlite3.Row
+    
+    # 获取文章数量
+    print(f"正在从数据库获取最新的{num_articles}篇文章...")
+    total = count_articles(conn, limit=num_articles, since=since, until=until)
+    if not total:
+        print("没有找到文章")
+        conn.close()
+        return False
+    
+    print(f"找到了{total}篇文章，开始导出到HTML...")
+    
+    # 创建导出目录
+    export_dir = EXPORT_DIR
+    if not os.path.exists(export_dir):
+        os.makedirs(export_dir)
+    
+    export_date = datetime.now().strftime("%Y年%m月%d日")
+    # 序号和分页号按文章在全表中的排名确定，新增文章后已有文章的序号和所在分页不变
+    newest = newest_number(conn, since=since, until=until)
+    first_page = (newest - total) // page_size + 1
+    last_page = (newest - 1) // page_size + 1
+    pages = []
+    page_rows = []
+    summaries_written = 0
+    templates = template_hash()
+    manifest = open_build_manifest(export_dir)
+    build = (manifest.execute("SELECT MAX(build) FROM built_files").fetchone()[0] or 0) + 1
+    renderer = PageRenderer(export_dir, processes)
+    search_index = SearchIndexBuilder()
+
+    def built(filename, digest):
+        """判断文件是否需要重新生成，并在清单中登记本次构建"""
+        row = manifest.execute("SELECT hash FROM built_files WHERE file = ?", (filename,)).fetchone()
+        manifest.execute('''
+        INSERT INTO built_files (file, hash, build) VALUES (?, ?, ?)
+        ON CONFLICT(file) DO UPDATE SET hash = excluded.hash, build = excluded.build
+        ''', (filename, digest, build))
+        return (not force and row is not None and row[0] == digest
+                and os.path.exists(os.path.join(export_dir, filename)))
+
+    def finish_page():
+        """一个汇总分页的文章收齐后，按需重新生成该分页"""
+        nonlocal summaries_written
+        page_no = pages[-1]["page"]
+        summary_filename = pages[-1]["file"]
+        digest = row_hash(templates, page_no, page_no < last_page, page_no > first_page,
+                          *(digest for _, digest in page_rows))
+        if not built(summary_filename, digest):
+            with open(os.path.join(export_dir, summary_filename), "w", encoding="utf-8") as f:
+                f.write(render_summary_header(page_no, last_page, first_page))
+                f.writelines(html for html, _ in page_rows)
+                f.write(render_summary_footer(page_no, last_page, first_page))
+            summaries_written += 1
+        page_rows.clear()
+
+    try:
+        with manifest:
+            articles = iter_articles(conn, limit=num_articles, since=since, until=until)
+            for i, article in enumerate(tqdm(articles, total=total, desc="生成HTML文件"), 1):
+                # 按从旧到新的序号分页，最新的文章在编号最大的分页中
+                number = newest - i + 1
+                page_no = (number - 1) // page_size + 1
+                if not pages or pages[-1]["page"] != page_no:
+                    if pages:
+                        finish_page()
+                    pages.append({"page": page_no, "file": summary_page_name(page_no), "count": 0,
+                                  "first_article_id": article['article_id']})
+
+                article_id = article['article_id']
+                author = article['author_name'] or "佚名"
+                gmt_create = article['display_date'] or format_date(article['gmt_create'])
+                ai_summary = article['ai_summary_content'] or "未提供AI摘要"
+                
+                # 处理可能过长的摘要
+                if ai_summary and len(ai_summary) > 100:
+                    ai_summary_display = ai_summary[:97] + "..."
+                else:
+                    ai_summary_display = ai_summary
+                    
+                # 构建原文链接
+                original_link = f"{BASE_ARTICLE_URL}{article_id}"
+                
+                # 汇总表格中的一行
+                article_filename = f"article_{article_id}.html"
+                row_html = render_summary_row(number, article_id, author, gmt_create,
+                                              ai_summary_display, original_link, article_filename)
+                page_rows.append((row_html, row_hash(row_html)))
+                search_index.add(number, article_id, author, article['gmt_create_ts'],
+                                 article['ai_summary_content'] or "")
+                pages[-1]["count"] += 1
+                pages[-1]["last_article_id"] = article_id
+                
+                # 单独的文章HTML文件，内容未变化时跳过
+                args = (article_id, author, gmt_create, ai_summary, original_link, pages[-1]["file"])
+                if not built(article_filename, row_hash(templates, *args)):
+                    renderer.add(article_filename, args)
+            
+            # 完成最后一个汇总分页
+            finish_page()
+            articles_written = renderer.finish()
+
+            # 删除不再导出的文件（检索数据每次整体重写，不登记在清单中）
+            orphans = [row[0] for row in manifest.execute(
+                "SELECT file FROM built_files WHERE build != ?", (build,))]
+            for filename in orphans:
+                path = os.path.join(export_dir, filename)
+                if os.path.exists(path):
+                    os.remove(path)
+            manifest.execute("DELETE FROM built_files WHERE build != ?", (build,))
+    finally:
+        renderer.close()
+        manifest.close()
+        conn.close()
+
+    # 写入检索数据、目录页和分页索引
+    search_index.write(export_dir)
+    summary_file = os.path.join(export_dir, INDEX_PAGE)
+    with open(summary_file, "w", encoding="utf-8") as f:
+        f.write(render_index_page(export_date, total, last_page, first_page))
+    index_file = os.path.join(export_dir, PAGES_INDEX)
+    with open(index_file, "w", encoding="utf-8") as index:
+        json.dump({"export_date": export_date, "total": sum(p["count"] for p in pages),
+                   "page_size": page_size, "pages": pages}, index, ensure_ascii=False, indent=2)
     
-    print(f"\n导出完成! 汇总文件保存在: {summary_file}")
+    print(f"\n导出完成! 汇总文件保存在: {summary_file}（共 {len(pages)} 页，索引: {index_file}）")
+    print(f"重新生成 {articles_written} 个文章页面、{summaries_written} 个汇总分页，"
+          f"删除 {len(orphans)} 个过期文件")
     
     # 自动在浏览器中打开汇总文件
     if open_browser:
@@ -270,4 +953,15 @@ def export_to_html(num_articles=20, open_browser=True):
 
 if __name__ == "__main__":
     # 默认导出最新的20篇文章并在浏览器中打开
-    export_to_html(20, open_browser=True) 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="将爬取的文章导出为HTML文件")
+    parser.add_argument("-n", "--num", type=int, default=20,
+                        help="导出最新的文章数量，0为全部；序号为文章在全部文章中的排名，不随导出数量变化")
+    parser.add_argument("--since", help="只导出该日期（含）之后创建的文章，格式 YYYY-MM-DD")
+    parser.add_argument("--until", help="只导出该日期（含）之前创建的文章，格式 YYYY-MM-DD")
+    parser.add_argument("--no-browser", action="store_true", help="导出后不打开浏览器")
+    parser.add_argument("--force", action="store_true", help="忽略构建清单，重新生成全部页面")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="生成页面使用的进程数，默认使用全部CPU核心")
+    args = parser.parse_args()
+    export_to_html(args.num, open_browser=not args.no_browser, since=args.since, until=args.until,
+                   force=args.force, processes=args.processes) 
\ No newline at end of file
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+阅读记录服务：提供导出的HTML站点，并把阅读状态保存在SQLite中
+
+    python reading_tracker.py --port 8000
+    浏览器访问 http://127.0.0.1:8000/文章汇总.html
+"""
+
+import os
+import asyncio
+import sqlite3
+import argparse
+import threading
+import contextlib
+from datetime import datetime
+
+from async_http import serve, json_response, file_response, HTTPError
+
+# 阅读记录数据库和导出站点目录
+TRACKER_DB = "reading_state.db"
+SITE_DIR = "exported_articles"
+# 写入队列攒够多少条或等待多久（秒）后提交一次
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_INTERVAL = 0.2
+# 批量提交失败后等待多久（秒）重试
+WRITE_RETRY_DELAY = 1
+# 单次批量查询最多的文章数
+MAX_STATUS_IDS = 5000
+
+FIELDS = ("article_id", "reader", "is_read", "read_date", "notes", "updated_at")
+
+def open_tracker_db(db_file=None):
+    """打开阅读记录数据库（WAL模式，读写互不阻塞）"""
+    conn = sqlite3.connect(db_file or TRACKER_DB, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS reading_state (
+        article_id TEXT,
+        reader TEXT,
+        is_read TEXT,
+        read_date TEXT,
+        notes TEXT,
+        updated_at TEXT,
+        PRIMARY KEY (article_id, reader)
+    )
+    ''')
+    conn.commit()
+    return conn
+
+class ReadingStore:
+    """阅读状态存储
+
+    写入先进入队列，由后台任务按批次在一个事务中提交，同一文章和阅读者的多次写入只保留最后一次；
+    尚未提交的记录保存在 pending 中，查询时合并，保证写入后立即可读
+    """
+
+    def __init__(self, db_file=None):
+        self.write_conn = open_tracker_db(db_file)
+        self.read_conn = open_tracker_db(db_file)
+        self.read_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.queue = asyncio.Queue()
+        self.pending = {}
+        self.flusher = None
+
+    def start(self):
+        self.flusher = asyncio.create_task(self.flush_loop())
+
+    def put(self, record):
+        if self.flusher is not None and self.flusher.done():
+            # 后台提交任务已退出，记录无法保存
+            raise HTTPError(503, "阅读记录暂时无法保存")
+        key = (record["article_id"], record["reader"])
+        self.pending[key] = record
+        self.queue.put_nowait(key)
+
+    async def flush_loop(self):
+        """后台提交：攒满一批或等待超时后写入
+
+        写入失败时记录保留在 pending 中（查询仍可读到），等待 WRITE_RETRY_DELAY 秒后重新排队
+        """
+        while True:
+            keys = {await self.queue.get()}
+            deadline = asyncio.get_running_loop().time() + WRITE_FLUSH_INTERVAL
+            while len(keys) < WRITE_BATCH_SIZE:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    keys.add(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.flush(keys)
+            except Exception as e:
+                print(f"提交阅读记录失败，{WRITE_RETRY_DELAY} 秒后重试: {e!r}")
+                await asyncio.sleep(WRITE_RETRY_DELAY)
+                for key in keys:
+                    self.queue.put_nowait(key)
+
+    async def flush(self, keys=None):
+        """提交指定（默认全部）待写入的记录"""
+        if keys is None:
+            keys = set(self.pending)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+        records = [self.pending[key] for key in keys if key in self.pending]
+        if not records:
+            return
+        await asyncio.to_thread(self.write, records)
+        for record in records:
+            key = (record["article_id"], record["reader"])
+            # 提交期间又有新写入时保留新的记录
+            if self.pending.get(key) is record:
+                del self.pending[key]
+
+    def write(self, records):
+        """在一个事务中写入记录（在线程中运行，写锁保证同一时间只有一个提交）"""
+        with self.write_lock, self.write_conn:
+            self.write_conn.executemany('''
+            INSERT INTO reading_state (article_id, reader, is_read, read_date, notes, updated_at)
+            VALUES (:article_id, :reader, :is_read, :read_date, :notes, :updated_at)
+            ON CONFLICT(article_id, reader) DO UPDATE SET
+                is_read = excluded.is_read,
+                read_date = excluded.read_date,
+                notes = excluded.notes,
+                updated_at = excluded.updated_at
+            ''', records)
+
+    async def status(self, article_ids, reader=None):
+        """查询多篇文章的阅读状态，返回 {文章ID: [记录]}，每篇按更新时间从新到旧排列"""
+        result = await asyncio.to_thread(self.query, article_ids, reader)
+        # 合并尚未提交的记录（在事件循环中读取 pending，不与写入并发）
+        wanted = set(article_ids)
+        for (article_id, record_reader), record in self.pending.items():
+            if article_id in wanted and (not reader or record_reader == reader):
+                result.setdefault(article_id, {})[record_reader] = record
+        return {article_id: sorted(records.values(), key=lambda r: r["updated_at"], reverse=True)
+                for article_id, records in result.items()}
+
+    def query(self, article_ids, reader=None):
+        """从数据库读取阅读状态，返回 {文章ID: {阅读者: 记录}}（在线程中运行）"""
+        result = {}
+        with self.read_lock:
+            for i in range(0, len(article_ids), 500):
+                chunk = article_ids[i:i + 500]
+                sql = (f"SELECT {', '.join(FIELDS)} FROM reading_state "
+                       f"WHERE article_id IN ({','.join('?' * len(chunk))})")
+                params = list(chunk)
+                if reader:
+                    sql += " AND reader = ?"
+                    params.append(reader)
+                for row in self.read_conn.execute(sql, params):
+                    record = dict(zip(FIELDS, row))
+                    result.setdefault(record["article_id"], {})[record["reader"]] = record
+        return result
+
+    async def close(self):
+        """停止后台提交任务，同步写入剩余记录后关闭数据库
+
+        被取消的提交可能仍在线程中写入，最后一次写入需要等待写锁；
+        其中的记录还留在 pending 中，会被再次写入（按主键覆盖，结果相同）
+        """
+        if self.flusher:
+            self.flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.flusher
+        if self.pending:
+            self.write(list(self.pending.values()))
+            self.pending.clear()
+        with self.write_lock:
+            self.write_conn.close()
+        with self.read_lock:
+            self.read_conn.close()
+
+def parse_record(data):
+    """校验客户端提交的阅读记录"""
+    if not isinstance(data, dict) or not data.get("article_id") or not data.get("reader"):
+        raise HTTPError(400, "需要 article_id 和 reader")
+    if data.get("is_read", "否") not in ("是", "否"):
+        raise HTTPError(400, "is_read 只能为 是 或 否")
+    return {
+        "article_id": str(data["article_id"]),
+        "reader": str(data["reader"])[:100],
+        "is_read": data.get("is_read", "否"),
+        "read_date": str(data.get("read_date") or "")[:20],
+        "notes": str(data.get("notes") or ""),
+        "updated_at": datetime.now().isoformat(timespec="milliseconds"),
+    }
+
+def make_handler(store, site_dir):
+    """请求路由
+
+    POST /api/reading            保存一条阅读记录
+    GET  /api/reading            按 article_id（和可选的 reader）查询
+    POST /api/reading/status     批量查询 {"article_ids": [...], "reader": 可选}
+    GET  其他路径                 导出站点中的静态文件
+    """
+
+    async def handle(request):
+        if request.path == "/api/reading":
+            if request.method == "POST":
+                store.put(parse_record(request.json()))
+                return json_response({"queued": True}, 202)
+            if request.method == "GET":
+                article_id = request.query.get("article_id")
+                if not article_id:
+                    raise HTTPError(400, "需要 article_id")
+                status = await store.status([article_id], request.query.get("reader"))
+                return json_response(status.get(article_id, []))
+            raise HTTPError(405)
+        if request.path == "/api/reading/status":
+            if request.method != "POST":
+                raise HTTPError(405)
+            data = request.json() or {}
+            article_ids = data.get("article_ids")
+            if not isinstance(article_ids, list) or len(article_ids) > MAX_STATUS_IDS:
+                raise HTTPError(400, f"article_ids 需要为不超过 {MAX_STATUS_IDS} 个ID的列表")
+            status = await store.status([str(i) for i in article_ids], data.get("reader"))
+            return json_response(status)
+        if request.method not in ("GET", "HEAD"):
+            raise HTTPError(405)
+        path = "/文章汇总.html" if request.path == "/" else request.path
+        return await asyncio.to_thread(file_response, site_dir, path)
+
+    return handle
+
+async def run(host, port, site_dir, db_file):
+    store = ReadingStore(db_file)
+    store.start()
+    server = await serve(make_handler(store, site_dir), host, port)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await store.close()
+        print("阅读记录已保存")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="阅读记录服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--site", default=SITE_DIR, help="export_to_html.py 导出的站点目录")
+    parser.add_argument("--db", default=TRACKER_DB, help="阅读记录数据库文件")
+    args = parser.parse_args()
+    if not os.path.isdir(args.site):
+        print(f"站点目录不存在，请先运行 export_to_html.py: {args.site}")
+    else:
+        try:
+            asyncio.run(run(args.host, args.port, args.site, args.db))
+        except KeyboardInterrupt:
+            pass
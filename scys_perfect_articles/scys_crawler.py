@@ -4,14 +4,24 @@ import sqlite3
 import time
 import os
 import datetime
+import asyncio
+import random
+import argparse
+import gzip
+import glob
+import threading
+import zlib
+from requests.adapters import HTTPAdapter
 from tqdm import tqdm
 from dotenv import load_dotenv
 
+from text_search import TOKEN_RE, bigram_tokens, build_match_query, make_snippet
+
 # 加载环境变量
 load_dotenv()
 
 # 配置信息
-BASE_URL = "https://scys.com/shengcai-web/client/homePage/searchTopic"
+BASE_URL = os.getenv("SCYS_API_URL", "https://scys.com/shengcai-web/client/homePage/searchTopic")
 
 # 从环境变量或默认值获取Cookie
 COOKIES = {
@@ -24,8 +34,6 @@ COOKIES = {
 }
 
 HEADERS = {
-    "Host": "scys.com",
-    "Content-Length": "115",
     "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
     "Content-Type": "application/json",
     "Accept": "application/json, text/plain, */*",
@@ -38,33 +46,299 @@ DB_FILE = "scys_articles.db"
 TOTAL_ARTICLES = int(os.getenv("TOTAL_ARTICLES", "100"))
 ARTICLES_PER_PAGE = int(os.getenv("ARTICLES_PER_PAGE", "20"))
 REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", "30"))
+# 同时在途的最大页数，1 表示逐页串行抓取
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "8"))
+# 所有分区共享的每秒最大请求数，0 表示不限制
+CRAWL_RPS = float(os.getenv("CRAWL_RPS", "5"))
+# 自动发现 topicTypeId 时扫描的页数
+DISCOVERY_PAGES = 5
+# 单页请求失败后的最大重试次数
+PAGE_RETRIES = 3
+# 延迟不超过最低延迟的该倍数时视为平稳，可以继续增加并发
+LATENCY_TOLERANCE = 1.5
 # 保存原始数据的目录
 RAW_DATA_DIR = "raw_api_responses"
+# 原始响应归档的偏移索引
+RAW_INDEX_FILE = os.path.join(RAW_DATA_DIR, "index.db")
+# 单个归档分段文件的最大字节数，超过后写入新分段
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+# 归档索引批量提交的间隔（条）
+ARCHIVE_COMMIT_EVERY = 50
+# 全文索引的词元格式版本（PRAGMA user_version），变化后自动重建全文索引
+SEARCH_INDEX_VERSION = 2
+
+ARTICLES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    article_id TEXT,
+    ai_summary_content TEXT,
+    gmt_create TEXT,
+    gmt_create_ts INTEGER,
+    author_name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+def connect_db(db_file=None):
+    """打开数据库长连接（WAL模式，读写互不阻塞）"""
+    conn = sqlite3.connect(db_file or DB_FILE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def encode_content(text):
+    """压缩文章正文，存入 article_bodies 表"""
+    return zlib.compress((text or "").encode("utf-8"), 6)
+
+def decode_content(blob):
+    """解压 article_bodies 中的文章正文，缺失时返回空字符串"""
+    if not blob:
+        return ""
+    return zlib.decompress(blob).decode("utf-8")
+
+def get_article_content(conn, article_id):
+    """按文章ID读取并解压正文"""
+    row = conn.execute("SELECT content FROM article_bodies WHERE article_id = ?",
+                       (article_id,)).fetchone()
+    return decode_content(row[0] if row else None)
+
+def index_rows(conn, rows):
+    """把 [(articles.id, 正文, 汇总, 作者)] 写入全文索引，已有的条目先删除"""
+    rows = list(rows)
+    conn.executemany("DELETE FROM article_fts WHERE rowid = ?", [(row[0],) for row in rows])
+    conn.executemany(
+        "INSERT INTO article_fts (rowid, content, summary, author) VALUES (?, ?, ?, ?)",
+        [(rowid, bigram_tokens(content, unigrams=True), bigram_tokens(summary, unigrams=True),
+          bigram_tokens(author, unigrams=True))
+         for rowid, content, summary, author in rows])
+
+def rebuild_search_index(conn, batch_size=1000):
+    """清空并重建全文索引"""
+    total = conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+    rows = conn.cursor().execute('''
+    SELECT a.id, b.content, a.ai_summary_content, a.author_name
+    FROM articles a LEFT JOIN article_bodies b ON b.article_id = a.article_id
+    ''')
+    with conn:
+        conn.execute("DELETE FROM article_fts")
+        with tqdm(total=total, desc="建立全文索引", unit="篇") as progress:
+            while True:
+                batch = rows.fetchmany(batch_size)
+                if not batch:
+                    break
+                index_rows(conn, ((rowid, decode_content(body), summary, author)
+                                  for rowid, body, summary, author in batch))
+                progress.update(len(batch))
+        # 合并索引段，减少查询时需要读取的 b-tree 数量
+        conn.execute("INSERT INTO article_fts (article_fts) VALUES ('optimize')")
+    return total
+
+def search_articles(query, limit=20, db_file=None):
+    """按 bm25 相关度检索文章，返回 [(文章ID, 作者, 发布时间, 摘要)]
+
+    汇总和作者的命中权重高于正文；摘要优先取自正文，正文未命中时取自汇总
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    conn = connect_db(db_file)
+    rows = conn.execute('''
+    SELECT a.article_id, a.author_name, a.gmt_create, a.ai_summary_content, b.content
+    FROM article_fts f
+    JOIN articles a ON a.id = f.rowid
+    LEFT JOIN article_bodies b ON b.article_id = a.article_id
+    WHERE article_fts MATCH ?
+    ORDER BY bm25(article_fts, 1.0, 2.0, 5.0)
+    LIMIT ?
+    ''', (match, limit)).fetchall()
+    conn.close()
+
+    terms = [t.lower() for t in TOKEN_RE.findall(query)]
+    results = []
+    for article_id, author, gmt_create, summary, body in rows:
+        content = decode_content(body)
+        if summary and not any(t in content.lower() for t in terms):
+            content = summary
+        results.append((article_id, author, gmt_create, make_snippet(content or author or "", query)))
+    return results
+
+def parse_gmt_create(gmt_create):
+    """把 gmt_create 文本（本地时间或秒级时间戳）转换为秒级时间戳，无法解析时返回 None"""
+    if not gmt_create:
+        return None
+    if gmt_create.isdigit():
+        return int(gmt_create)
+    try:
+        return int(time.mktime(time.strptime(gmt_create, "%Y-%m-%d %H:%M:%S")))
+    except ValueError:
+        return None
+
+def migrate_database(conn):
+    """升级旧数据库
+
+    去除重复文章并建立 article_id 唯一索引，补充检查点的进度字段；
+    旧表中的 article_content 压缩后移入 article_bodies，articles 表重建为只含元数据的窄表；
+    补充并回填 gmt_create_ts 时间戳列，建立时间和作者索引；全文索引为空或词元格式
+    早于 SEARCH_INDEX_VERSION 时根据已有文章重建索引
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(crawl_checkpoints)")]
+    for column in ("pages_done", "saved_total"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE crawl_checkpoints ADD COLUMN {column} INTEGER DEFAULT 0")
+    conn.commit()
+
+    index_names = [row[1] for row in conn.execute("PRAGMA index_list(articles)")]
+    if "idx_articles_article_id" not in index_names:
+        with conn:
+            removed = conn.execute('''
+            DELETE FROM articles
+            WHERE id NOT IN (SELECT MIN(id) FROM articles GROUP BY article_id)
+            ''').rowcount
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_article_id ON articles(article_id)"
+            )
+        if removed:
+            print(f"已清理 {removed} 条重复文章")
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+    if "article_content" in columns:
+        print("正在压缩文章正文并移入 article_bodies 表...")
+        with conn:
+            rows = conn.cursor().execute("SELECT article_id, article_content FROM articles")
+            conn.executemany(
+                "INSERT OR IGNORE INTO article_bodies (article_id, content) VALUES (?, ?)",
+                ((article_id, encode_content(content)) for article_id, content in rows))
+            conn.execute(ARTICLES_SCHEMA.replace("articles", "articles_narrow", 1))
+            conn.execute('''
+            INSERT INTO articles_narrow (id, article_id, ai_summary_content, gmt_create, author_name, created_at)
+            SELECT id, article_id, ai_summary_content, gmt_create, author_name, created_at FROM articles
+            ''')
+            conn.execute("DROP TABLE articles")
+            conn.execute("ALTER TABLE articles_narrow RENAME TO articles")
+            conn.execute("CREATE UNIQUE INDEX idx_articles_article_id ON articles(article_id)")
+        # 回收旧正文占用的页面
+        conn.execute("VACUUM")
+        print("文章正文迁移完成")
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+    if "gmt_create_ts" not in columns:
+        conn.execute("ALTER TABLE articles ADD COLUMN gmt_create_ts INTEGER")
+    rows = conn.execute(
+        "SELECT id, gmt_create FROM articles WHERE gmt_create_ts IS NULL AND gmt_create != ''"
+    ).fetchall()
+    with conn:
+        conn.executemany("UPDATE articles SET gmt_create_ts = ? WHERE id = ?",
+                         [(ts, row_id) for row_id, ts in
+                          ((row_id, parse_gmt_create(value)) for row_id, value in rows)
+                          if ts is not None])
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_articles_gmt_create_ts ON articles(gmt_create_ts)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_author ON articles(author_name)")
+
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    indexed = conn.execute("SELECT COUNT(*) FROM article_fts").fetchone()[0]
+    if ((not indexed or version < SEARCH_INDEX_VERSION)
+            and conn.execute("SELECT 1 FROM articles LIMIT 1").fetchone()):
+        rebuild_search_index(conn)
+    if version < SEARCH_INDEX_VERSION:
+        conn.execute(f"PRAGMA user_version = {SEARCH_INDEX_VERSION}")
 
 def init_database():
     """初始化SQLite数据库"""
-    conn = sqlite3.connect(DB_FILE)
+    conn = connect_db()
     cursor = conn.cursor()
     
-    # 创建表格
+    # 创建表格：articles 只保存元数据，正文压缩后单独存放，扫描元数据时不必读取正文
+    cursor.execute(ARTICLES_SCHEMA)
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS article_bodies (
+        article_id TEXT PRIMARY KEY,
+        content BLOB
+    )
+    ''')
+    # 全文索引：各列保存二元切分后的词元，rowid 与 articles.id 对应
+    cursor.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS article_fts
+    USING fts5(content, summary, author)
+    ''')
+    
+    # 增量爬取的检查点：每个 topicTypeId 的高水位和断点页码
     cursor.execute('''
-    CREATE TABLE IF NOT EXISTS articles (
-        id INTEGER PRIMARY KEY,
-        article_id TEXT,
-        article_content TEXT,
-        ai_summary_content TEXT,
-        gmt_create TEXT,
-        author_name TEXT,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    CREATE TABLE IF NOT EXISTS crawl_checkpoints (
+        topic_type_id TEXT PRIMARY KEY,
+        high_water_gmt INTEGER,
+        high_water_article_id TEXT,
+        run_high_gmt INTEGER,
+        run_high_article_id TEXT,
+        next_page INTEGER,
+        pages_done INTEGER DEFAULT 0,
+        saved_total INTEGER DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     )
     ''')
     
     conn.commit()
+    migrate_database(conn)
     conn.close()
     print("数据库初始化完成")
 
-def fetch_articles(page=1, page_size=20):
-    """获取文章列表"""
+def load_checkpoint(conn, topic_type_id=""):
+    """读取检查点，返回 (高水位, 本轮最高点, 断点页码)，高水位形如 (gmtCreate毫秒, 文章ID)"""
+    row = conn.execute('''
+    SELECT high_water_gmt, high_water_article_id, run_high_gmt, run_high_article_id, next_page
+    FROM crawl_checkpoints WHERE topic_type_id = ?
+    ''', (topic_type_id,)).fetchone()
+    if row is None:
+        return None, None, None
+    high_water = (row[0], row[1]) if row[0] is not None else None
+    run_high = (row[2], row[3]) if row[2] is not None else None
+    return high_water, run_high, row[4]
+
+def seed_high_water(conn):
+    """根据已入库的最新文章估计高水位，数据库为空时返回 None
+
+    检查点中还没有高水位（旧数据库或只做过全量爬取）时使用，避免首次增量爬取
+    从头翻到底。gmt_create_ts 只精确到秒，取该秒的起点，宁可多读一页也不漏文章；
+    文章表不区分分类，各分区共用全表的最新时间
+    """
+    row = conn.execute('''
+    SELECT gmt_create_ts, article_id FROM articles WHERE gmt_create_ts IS NOT NULL
+    ORDER BY gmt_create_ts DESC LIMIT 1
+    ''').fetchone()
+    if row is None:
+        return None
+    return row[0] * 1000, str(row[1])
+
+def save_checkpoint(conn, topic_type_id, high_water, run_high, next_page):
+    """保存检查点；next_page 为全量爬取的断点页码，None 表示没有未完成的全量爬取"""
+    high_water = high_water or (None, None)
+    run_high = run_high or (None, None)
+    with conn:
+        conn.execute('''
+        INSERT INTO crawl_checkpoints (topic_type_id, high_water_gmt, high_water_article_id,
+                                       run_high_gmt, run_high_article_id, next_page, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(topic_type_id) DO UPDATE SET
+            high_water_gmt = excluded.high_water_gmt,
+            high_water_article_id = excluded.high_water_article_id,
+            run_high_gmt = excluded.run_high_gmt,
+            run_high_article_id = excluded.run_high_article_id,
+            next_page = excluded.next_page,
+            updated_at = excluded.updated_at
+        ''', (topic_type_id, *high_water, *run_high, next_page))
+
+def create_session(pool_size=CRAWL_CONCURRENCY):
+    """创建复用长连接的会话"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(HEADERS)
+    session.cookies.update(COOKIES)
+    return session
+
+def request_page(session, page=1, page_size=20, topic_type_id=""):
+    """请求一页文章，返回 (是否成功, 文章列表)"""
     payload = {
         "isDigested": True,
         "isSimpleModel": False,
@@ -72,14 +346,12 @@ def fetch_articles(page=1, page_size=20):
         "pageScene": "homePage", 
         "pageIndex": page,
         "pageSize": page_size,
-        "topicTypeId": ""  # 可根据需要修改参数
+        "topicTypeId": topic_type_id
     }
     
     try:
-        response = requests.post(
+        response = session.post(
             BASE_URL, 
-            headers=HEADERS, 
-            cookies=COOKIES, 
             json=payload,
             timeout=REQUEST_TIMEOUT
         )
@@ -88,27 +360,199 @@ def fetch_articles(page=1, page_size=20):
             data = response.json()
             
             # 保存原始响应到文件
-            saved_file = save_raw_response(data, page)
+            saved_file = save_raw_response(data, page, topic_type_id)
             print(f"已保存第 {page} 页原始响应到: {saved_file}")
             
             if data.get("success"):
                 # 根据新的JSON结构，文章列表在data.items中
-                return data.get("data", {}).get("items", [])
+                return True, data.get("data", {}).get("items", [])
             else:
                 print(f"请求失败: {data.get('message')}")
-                return []
+                return False, []
         else:
             print(f"HTTP错误: {response.status_code}")
             print(f"响应内容: {response.text[:200]}...")  # 打印部分响应内容
-            return []
+            return False, []
     except Exception as e:
         print(f"请求异常: {str(e)}")
-        return []
+        return False, []
 
-def save_article(article_item):
-    """保存文章到数据库"""
-    if not article_item:
+def fetch_articles(page=1, page_size=20, session=None, topic_type_id=""):
+    """获取文章列表"""
+    if session is None:
+        with create_session(1) as session:
+            return request_page(session, page, page_size, topic_type_id)[1]
+    return request_page(session, page, page_size, topic_type_id)[1]
+
+class AimdLimiter:
+    """加性增、乘性减的并发控制
+
+    请求成功且延迟平稳时逐步增加并发；失败或非 success 响应时并发减半
+    """
+
+    def __init__(self, maximum, initial=2):
+        self.maximum = max(maximum, 1)
+        self.limit = float(min(initial, self.maximum))
+        self.base_latency = None
+
+    @property
+    def allowed(self):
+        return int(self.limit)
+
+    def on_success(self, latency):
+        if self.base_latency is None or latency < self.base_latency:
+            self.base_latency = latency
+        if latency <= self.base_latency * LATENCY_TOLERANCE:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+    def on_error(self):
+        self.limit = max(1.0, self.limit / 2)
+
+class RequestGate:
+    """多个分区共享的请求闸门：限制总在途请求数和每秒请求数（仅在事件循环中使用）"""
+
+    def __init__(self, concurrency=None, rate=None):
+        concurrency = CRAWL_CONCURRENCY if concurrency is None else concurrency
+        rate = CRAWL_RPS if rate is None else rate
+        self.semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_time = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.interval:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+            if wait_time > 0:
+                await asyncio.sleep(wait_time)
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+async def fetch_page_async(session, page, page_size, delay=0, topic_type_id="", gate=None):
+    """在线程中请求一页，返回 (页码, 是否成功, 文章列表, 耗时)"""
+    if delay:
+        await asyncio.sleep(delay)
+    async with gate or RequestGate(rate=0):
+        started = time.monotonic()
+        ok, items = await asyncio.to_thread(request_page, session, page, page_size, topic_type_id)
+    return page, ok, items, time.monotonic() - started
+
+async def crawl_pages(pages_needed, page_size, on_page, concurrency=CRAWL_CONCURRENCY,
+                      start_page=1, topic_type_id="", session=None, gate=None):
+    """从 start_page 开始并发预取页面，并严格按页码顺序交给 on_page 处理
+
+    on_page(page, articles) 返回 False 时停止抓取；pages_needed 为 None 时不限页数。
+    失败的页面按指数退避重试，重试用尽后视为空页，与串行爬取的结束条件一致。
+    多个分区同时爬取时传入共享的 session 和 gate
+    """
+    if session is None:
+        with create_session(concurrency) as session:
+            return await crawl_pages(pages_needed, page_size, on_page, concurrency,
+                                     start_page, topic_type_id, session, gate)
+
+    limiter = AimdLimiter(concurrency)
+    retries = {}
+    retry_pages = []
+    results = {}
+    in_flight = {}
+    next_page = start_page
+    expected = start_page
+    stopped = False
+
+    while not stopped:
+        while len(in_flight) < limiter.allowed and (
+                retry_pages or pages_needed is None or next_page <= pages_needed):
+            if retry_pages:
+                page = retry_pages.pop(0)
+                delay = 2 ** retries[page] / 2 + random.uniform(0, 0.5)
+            else:
+                page, delay = next_page, 0
+                next_page += 1
+            task = asyncio.create_task(
+                fetch_page_async(session, page, page_size, delay, topic_type_id, gate))
+            in_flight[task] = page
+        if not in_flight:
+            break
+
+        done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            page, ok, items, latency = task.result()
+            del in_flight[task]
+            if ok:
+                limiter.on_success(latency)
+                results[page] = items
+                continue
+            limiter.on_error()
+            retries[page] = retries.get(page, 0) + 1
+            if retries[page] <= PAGE_RETRIES:
+                print(f"第 {page} 页请求失败，并发降为 {limiter.allowed}，稍后重试")
+                retry_pages.append(page)
+            else:
+                results[page] = []
+
+        # 按页码顺序处理已到达的页面
+        while expected in results and not stopped:
+            stopped = on_page(expected, results.pop(expected)) is False
+            expected += 1
+
+    # 等待已发出的请求结束后再关闭连接
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+def discover_topic_types(pages=DISCOVERY_PAGES):
+    """从不限分类的前几页文章中收集出现过的 topicTypeId"""
+    topic_type_ids = []
+    with create_session(1) as session:
+        for page in range(1, pages + 1):
+            for attempt in range(PAGE_RETRIES + 1):
+                ok, items = request_page(session, page, ARTICLES_PER_PAGE)
+                if ok:
+                    break
+                time.sleep(2 ** attempt / 2)
+            if not items:
+                break
+            for item in items:
+                topic_type_id = (item.get("topicDTO") or {}).get("topicTypeId")
+                if topic_type_id not in (None, "") and str(topic_type_id) not in topic_type_ids:
+                    topic_type_ids.append(str(topic_type_id))
+    print(f"发现 {len(topic_type_ids)} 个分类: {', '.join(topic_type_ids) or '无'}")
+    return topic_type_ids
+
+def record_progress(conn, topic_type_id, pages, saved):
+    """累加分区的已处理页数和新保存文章数"""
+    with conn:
+        conn.execute('''
+        INSERT INTO crawl_checkpoints (topic_type_id, pages_done, saved_total, updated_at)
+        VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(topic_type_id) DO UPDATE SET
+            pages_done = pages_done + excluded.pages_done,
+            saved_total = saved_total + excluded.saved_total,
+            updated_at = excluded.updated_at
+        ''', (topic_type_id, pages, saved))
+
+def article_mark(article_item):
+    """返回文章在时间线上的位置 (gmtCreate毫秒, 文章ID)，无法判断时返回 None"""
+    topic_dto = (article_item or {}).get("topicDTO") or {}
+    gmt = topic_dto.get("gmtCreate")
+    article_id = topic_dto.get("entityId") or topic_dto.get("topicId") or topic_dto.get("articleId")
+    if not isinstance(gmt, int) or not article_id:
+        return None
+    if len(str(gmt)) <= 10:
+        gmt *= 1000  # 统一为毫秒
+    return gmt, str(article_id)
+
+def below_mark(mark, high_water):
+    """文章是否不新于高水位（即上次已经爬取过）"""
+    if mark is None or high_water is None:
         return False
+    return mark[0] < high_water[0] or mark == tuple(high_water)
+
+def parse_article(article_item):
+    """从接口返回的文章中提取入库字段，数据不完整时返回 None"""
+    if not article_item:
+        return None
         
     # 从新的JSON结构中提取数据
     topic_dto = article_item.get("topicDTO", {})
@@ -116,10 +560,7 @@ def save_article(article_item):
     
     if not topic_dto:
         print("文章数据结构不完整，跳过")
-        return False
-        
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+        return None
     
     # 提取需要的字段
     article_id = topic_dto.get("entityId") or topic_dto.get("topicId") or topic_dto.get("articleId") or "未知ID"
@@ -131,10 +572,12 @@ def save_article(article_item):
     if gmt_create_timestamp and isinstance(gmt_create_timestamp, int):
         # 判断时间戳是秒还是毫秒
         if len(str(gmt_create_timestamp)) > 10:
-            gmt_create_timestamp = gmt_create_timestamp / 1000  # 转换为秒
+            gmt_create_timestamp = gmt_create_timestamp // 1000  # 转换为秒
         gmt_create = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(gmt_create_timestamp))
+        gmt_create_ts = gmt_create_timestamp
     else:
         gmt_create = str(gmt_create_timestamp) if gmt_create_timestamp else ""
+        gmt_create_ts = parse_gmt_create(gmt_create)
     
     # 获取作者信息
     author_name = topic_user_dto.get("name", "")
@@ -142,23 +585,97 @@ def save_article(article_item):
     # 检查是否有文章ID，没有则跳过
     if not article_id:
         print("无法获取文章ID，跳过")
-        return False
-        
-    # 检查文章是否已存在
-    cursor.execute("SELECT id FROM articles WHERE article_id = ?", (str(article_id),))
-    if cursor.fetchone() is None:
-        cursor.execute('''
-        INSERT INTO articles (article_id, article_content, ai_summary_content, gmt_create, author_name)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (str(article_id), article_content, ai_summary_content, gmt_create, author_name))
-        
-        conn.commit()
-        result = True
-    else:
-        result = False
-    
-    conn.close()
-    return result
+        return None
+
+    return (str(article_id), article_content, ai_summary_content, gmt_create, author_name,
+            gmt_create_ts)
+
+class ArticleWriter:
+    """批量写入文章
+
+    使用一个长连接，每页文章在一个事务中通过 executemany 写入，
+    article_id 上有唯一索引，已存在的文章由 ON CONFLICT 处理；
+    元数据写入 articles，压缩后的正文写入 article_bodies，同时更新全文索引
+    """
+
+    def __init__(self, db_file=None):
+        self.conn = connect_db(db_file)
+
+    def save_page(self, article_items, limit=None, update_existing=False):
+        """保存一页文章，返回 [(文章ID, 是否新保存)]
+
+        limit 为本页最多新保存的篇数，达到后不再处理后续文章；
+        update_existing 为真时用新数据覆盖已存在的文章（用于重新入库）
+        """
+        rows = [parse_article(item) for item in article_items]
+
+        ids = list({row[0] for row in rows if row})
+        existing = set()
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            existing.update(r[0] for r in self.conn.execute(
+                f"SELECT article_id FROM articles WHERE article_id IN ({','.join('?' * len(chunk))})",
+                chunk))
+
+        results = []
+        new_rows = []
+        for row in rows:
+            if limit is not None and len(new_rows) >= limit:
+                break
+            if row is None:
+                results.append((None, False))
+                continue
+            is_new = row[0] not in existing
+            existing.add(row[0])
+            if is_new or update_existing:
+                new_rows.append(row)
+            results.append((row[0], is_new))
+
+        if update_existing:
+            conflict = '''DO UPDATE SET
+            ai_summary_content = excluded.ai_summary_content,
+            gmt_create = excluded.gmt_create,
+            gmt_create_ts = excluded.gmt_create_ts,
+            author_name = excluded.author_name'''
+            body_conflict = "DO UPDATE SET content = excluded.content"
+        else:
+            conflict = body_conflict = "DO NOTHING"
+        with self.conn:
+            self.conn.executemany(f'''
+            INSERT INTO articles (article_id, ai_summary_content, gmt_create, author_name, gmt_create_ts)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(article_id) {conflict}
+            ''', [(row[0],) + row[2:] for row in new_rows])
+            self.conn.executemany(f'''
+            INSERT INTO article_bodies (article_id, content) VALUES (?, ?)
+            ON CONFLICT(article_id) {body_conflict}
+            ''', [(row[0], encode_content(row[1])) for row in new_rows])
+            self.index_written(new_rows)
+        return results
+
+    def index_written(self, rows):
+        """为本次写入的文章更新全文索引（在写入事务中调用）"""
+        by_id = {row[0]: row for row in rows}
+        ids = list(by_id)
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rowids = self.conn.execute(
+                f"SELECT id, article_id FROM articles WHERE article_id IN ({','.join('?' * len(chunk))})",
+                chunk).fetchall()
+            index_rows(self.conn, ((rowid, by_id[article_id][1], by_id[article_id][2],
+                                    by_id[article_id][4]) for rowid, article_id in rowids))
+
+    def close(self):
+        self.conn.close()
+
+def save_article(article_item):
+    """保存单篇文章到数据库，返回是否新保存"""
+    writer = ArticleWriter()
+    try:
+        results = writer.save_page([article_item])
+    finally:
+        writer.close()
+    return results[0][1]
 
 def show_stats():
     """显示数据库统计信息"""
@@ -171,7 +688,7 @@ def show_stats():
     
     # 获取最新的5篇文章
     cursor.execute('''
-    SELECT article_id, author_name, gmt_create, substr(article_content, 1, 30) as preview
+    SELECT article_id, author_name, gmt_create, substr(ai_summary_content, 1, 30) as preview
     FROM articles
     ORDER BY id DESC
     LIMIT 5
@@ -197,73 +714,403 @@ def ensure_raw_data_dir():
         os.makedirs(RAW_DATA_DIR)
         print(f"创建原始数据保存目录: {RAW_DATA_DIR}")
 
-def save_raw_response(response_data, page):
-    """保存原始API响应到文件"""
-    ensure_raw_data_dir()
-    
-    # 生成带有时间戳的文件名，格式为 YYYYMMDD_HHMMSS_page_X.json
-    date_str = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"{date_str}_page_{page}.json"
-    file_path = os.path.join(RAW_DATA_DIR, filename)
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(response_data, f, ensure_ascii=False, indent=2)
-    
-    print(f"原始API响应已保存至: {file_path}")
-    return file_path
+class RawArchive:
+    """原始API响应归档
 
-def main():
-    """主函数"""
-    print("盛财有数文章爬虫启动...")
-    print(f"配置信息: 目标爬取 {TOTAL_ARTICLES} 篇文章，每页 {ARTICLES_PER_PAGE} 篇")
-    
-    print("初始化数据库...")
+    每条响应压缩为一个独立的 gzip 成员追加到分段文件末尾，整个分段仍是合法的
+    .jsonl.gz 文件；索引记录每条响应所属的爬取批次、页码、分段、偏移和长度，
+    可以按批次顺序重放，也可以按页随机读取。可在多个线程中同时写入。
+    索引每 ARCHIVE_COMMIT_EVERY 条提交一次，关闭时提交剩余记录
+    """
+
+    def __init__(self, directory=RAW_DATA_DIR, index_file=RAW_INDEX_FILE):
+        self.directory = directory
+        self.run_id = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.lock = threading.Lock()
+        self.segment = None
+        self.file = None
+        self.sequence = 0
+        self.unsaved = 0
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(index_file, check_same_thread=False)
+        self.conn.execute('''
+        CREATE TABLE IF NOT EXISTS raw_responses (
+            id INTEGER PRIMARY KEY,
+            run_id TEXT,
+            page INTEGER,
+            topic_type_id TEXT,
+            segment TEXT,
+            offset INTEGER,
+            length INTEGER,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_raw_responses_run_page ON raw_responses(run_id, page)"
+        )
+        self.conn.commit()
+
+    def _rotate(self):
+        """开始写入新的分段文件"""
+        if self.file:
+            self.file.close()
+        self.sequence += 1
+        self.segment = f"{self.run_id}-{self.sequence:04d}.jsonl.gz"
+        self.file = open(os.path.join(self.directory, self.segment), 'ab')
+
+    def append(self, response_data, page, topic_type_id="", run_id=None):
+        """追加一条响应，返回其位置 "分段@偏移" """
+        line = json.dumps(response_data, ensure_ascii=False) + "\n"
+        member = gzip.compress(line.encode('utf-8'))
+        with self.lock:
+            if self.file is None or self.file.tell() >= SEGMENT_MAX_BYTES:
+                self._rotate()
+            offset = self.file.tell()
+            self.file.write(member)
+            self.file.flush()
+            self.conn.execute('''
+            INSERT INTO raw_responses (run_id, page, topic_type_id, segment, offset, length)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (run_id or self.run_id, page, topic_type_id, self.segment, offset, len(member)))
+            self.unsaved += 1
+            if self.unsaved >= ARCHIVE_COMMIT_EVERY:
+                self.conn.commit()
+                self.unsaved = 0
+        return f"{self.segment}@{offset}"
+
+    def commit(self):
+        """提交尚未提交的索引记录"""
+        with self.lock:
+            self.conn.commit()
+            self.unsaved = 0
+
+    def read(self, segment, offset, length):
+        """读取指定位置的一条响应"""
+        with open(os.path.join(self.directory, segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(gzip.decompress(f.read(length)))
+
+    def read_location(self, location):
+        """读取 append 返回的位置 "分段@偏移" 处的响应"""
+        segment, offset = location.rsplit("@", 1)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT length FROM raw_responses WHERE segment = ? AND offset = ?",
+                (segment, int(offset))).fetchone()
+        return self.read(segment, int(offset), row[0])
+
+    def iter_records(self, run_id=None):
+        """按写入顺序遍历响应，返回 (批次, 页码, topicTypeId, 响应数据)"""
+        query = "SELECT run_id, page, topic_type_id, segment, offset, length FROM raw_responses"
+        params = ()
+        if run_id:
+            query += " WHERE run_id = ?"
+            params = (run_id,)
+        rows = self.conn.execute(query + " ORDER BY id", params).fetchall()
+
+        handle = None
+        current = None
+        try:
+            for run, page, topic_type_id, segment, offset, length in rows:
+                if segment != current:
+                    if handle:
+                        handle.close()
+                    handle = open(os.path.join(self.directory, segment), 'rb')
+                    current = segment
+                handle.seek(offset)
+                yield run, page, topic_type_id, json.loads(gzip.decompress(handle.read(length)))
+        finally:
+            if handle:
+                handle.close()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+            self.conn.commit()
+            self.conn.close()
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_archive():
+    """获取本进程共用的原始响应归档"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = RawArchive()
+        return _archive
+
+def close_archive():
+    """关闭原始响应归档"""
+    global _archive
+    with _archive_lock:
+        if _archive is not None:
+            _archive.close()
+            _archive = None
+
+def save_raw_response(response_data, page, topic_type_id=""):
+    """把原始API响应追加到压缩归档，返回保存位置"""
+    return get_archive().append(response_data, page, topic_type_id)
+
+def import_legacy_responses():
+    """把旧版逐页保存的 JSON 文件导入归档并重放入库，返回删除的原文件数
+
+    原文件只在校验通过后删除：从归档读回的内容与原文件一致，且其中的文章都已入库；
+    校验失败的文件保留，修复后可以重新导入（重放按 article_id 去重）
+    """
+    archive = get_archive()
+    imported = []
+    for path in sorted(glob.glob(os.path.join(RAW_DATA_DIR, "*_page_*.json"))):
+        # 旧文件名格式为 YYYYMMDD_HHMMSS_page_X.json
+        name = os.path.basename(path)[:-len(".json")]
+        date_str, page = name.split("_page_")
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        run_id = f"legacy-{date_str}"
+        imported.append((path, run_id, archive.append(data, int(page), run_id=run_id)))
+    archive.commit()
+    print(f"已导入 {len(imported)} 个旧版原始响应文件")
+
+    for run_id in sorted({run_id for _, run_id, _ in imported}):
+        replay_archive(run_id)
+
+    removed = 0
+    conn = connect_db()
+    try:
+        for path, _, location in imported:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if archive.read_location(location) != data or not page_saved(conn, data):
+                print(f"校验失败，保留原文件: {path}")
+                continue
+            os.remove(path)
+            removed += 1
+    finally:
+        conn.close()
+    print(f"校验通过并删除 {removed} 个旧版文件")
+    return removed
+
+def page_saved(conn, data):
+    """响应中的文章是否都已入库；失败的响应没有需要入库的文章"""
+    if not data.get("success"):
+        return True
+    rows = [parse_article(item) for item in data.get("data", {}).get("items", [])]
+    ids = list({row[0] for row in rows if row})
+    found = 0
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        found += conn.execute(
+            f"SELECT COUNT(*) FROM articles WHERE article_id IN ({','.join('?' * len(chunk))})",
+            chunk).fetchone()[0]
+    return found == len(ids)
+
+def replay_archive(run_id=None, update_existing=False):
+    """从原始响应归档重建或补充数据库，不访问网络
+
+    update_existing 为真时用归档数据覆盖已有文章，便于调整字段映射后重新入库
+    """
     init_database()
-    
-    # 确保原始数据目录存在
-    ensure_raw_data_dir()
-    
-    print("开始爬取文章...")
-    total_articles = TOTAL_ARTICLES
+    writer = ArticleWriter()
+    pages = 0
+    saved_count = 0
+    try:
+        for run, page, topic_type_id, data in tqdm(get_archive().iter_records(run_id),
+                                                    desc="重放进度"):
+            if not data.get("success"):
+                continue
+            items = data.get("data", {}).get("items", [])
+            results = writer.save_page(items, update_existing=update_existing)
+            saved_count += sum(1 for _, saved in results if saved)
+            pages += 1
+    finally:
+        writer.close()
+    print(f"重放完成，共处理 {pages} 页，新增 {saved_count} 篇文章")
+    return saved_count
+
+async def crawl_partition(writer, session, gate, progress, topic_type_id="", incremental=False):
+    """爬取一个 topicTypeId 分区，返回新保存的文章数
+
+    incremental 为真时按该分区的检查点增量爬取：总是从第1页开始，整页文章都不新于
+    高水位时停止，还没有高水位时以库中最新文章为准；中途中断后下次重新从第1页衔接。
+    有高水位时不受 TOTAL_ARTICLES 限制，两次运行之间新增再多文章也会一直翻到高水位，
+    否则高水位永远无法推进。
+    全量爬取中断时记录断点页码，下次全量爬取从该页继续
+    """
+    label = f"[分类 {topic_type_id}] " if topic_type_id else ""
     articles_per_page = ARTICLES_PER_PAGE
-    pages_needed = (total_articles + articles_per_page - 1) // articles_per_page
     
     saved_count = 0
-    
-    for page in tqdm(range(1, pages_needed + 1), desc="爬取进度"):
-        print(f"\n正在爬取第 {page} 页...")
-        articles = fetch_articles(page=page, page_size=articles_per_page)
-        
+    start_page = 1
+    caught_up = False
+    high_water, run_high, next_page = load_checkpoint(writer.conn, topic_type_id)
+    if incremental:
+        if high_water:
+            print(f"{label}上次爬取的最新文章: {high_water[1]}")
+        else:
+            high_water = seed_high_water(writer.conn)
+            if high_water:
+                print(f"{label}没有增量检查点，以库中最新文章为起点: {high_water[1]}")
+    elif next_page:
+        start_page = next_page
+        print(f"{label}从上次中断的第 {start_page} 页继续")
+    if incremental and high_water:
+        total_articles = pages_needed = None
+    else:
+        total_articles = TOTAL_ARTICLES
+        pages_needed = (total_articles + articles_per_page - 1) // articles_per_page
+
+    def on_page(page, articles):
+        """按页码顺序保存文章，返回 False 表示结束爬取"""
+        nonlocal saved_count, run_high, caught_up
+        progress.update(1)
+        print(f"\n{label}正在处理第 {page} 页...")
         if not articles:
-            print(f"页面 {page} 没有找到文章，结束爬取")
-            break
-            
-        print(f"已获取 {len(articles)} 篇文章")
-        for i, article in enumerate(articles, 1):
-            article_dto = article.get("topicDTO", {})
-            article_id = article_dto.get("topicId") or article_dto.get("articleId") or "未知ID"
+            print(f"{label}页面 {page} 没有找到文章，结束爬取")
+            caught_up = True
+            return False
             
-            if save_article(article):
-                saved_count += 1
+        print(f"{label}已获取 {len(articles)} 篇文章")
+        results = writer.save_page(
+            articles, limit=None if total_articles is None else total_articles - saved_count)
+        page_saved = 0
+        for i, (article_id, saved) in enumerate(results, 1):
+            if saved:
+                page_saved += 1
                 print(f"  [{i}/{len(articles)}] 已保存文章 (ID: {article_id})")
             else:
                 print(f"  [{i}/{len(articles)}] 文章已存在或无效，跳过 (ID: {article_id})")
-                
-            if saved_count >= total_articles:
-                break
+        saved_count += page_saved
+        record_progress(writer.conn, topic_type_id, 1, page_saved)
+
+        if incremental:
+            marks = [article_mark(article) for article in articles]
+            run_high = max([m for m in marks if m] + ([tuple(run_high)] if run_high else []),
+                           default=None)
+            if all(below_mark(m, high_water) for m in marks):
+                print(f"{label}第 {page} 页的文章均已爬取过，增量爬取结束")
+                caught_up = True
+                return False
+            # 增量爬取不记录页码，保留全量爬取的断点
+            save_checkpoint(writer.conn, topic_type_id, high_water, run_high, next_page)
+        else:
+            save_checkpoint(writer.conn, topic_type_id, high_water, run_high, page + 1)
         
-        if saved_count >= total_articles:
-            print(f"已达到目标数量 {total_articles} 篇，结束爬取")
-            break
-            
-        # 添加延迟避免请求过于频繁
-        print(f"等待 1 秒后继续...")
-        time.sleep(1)
+        if total_articles is not None and saved_count >= total_articles:
+            print(f"{label}已达到目标数量 {total_articles} 篇，结束爬取")
+            return False
+        return True
+
+    await crawl_pages(pages_needed, articles_per_page, on_page, start_page=start_page,
+                      topic_type_id=topic_type_id, session=session, gate=gate)
+    if incremental and caught_up:
+        # 已衔接上次的高水位，推进高水位
+        if run_high and (not high_water or tuple(run_high) > tuple(high_water)):
+            high_water = run_high
+        save_checkpoint(writer.conn, topic_type_id, high_water, None, next_page)
+    elif not incremental:
+        # 全量爬取正常结束，清除断点
+        save_checkpoint(writer.conn, topic_type_id, high_water, run_high, None)
+    return saved_count
+
+async def crawl_partitions(topic_type_ids, incremental=False):
+    """并发爬取多个分区，共享连接池和请求频率限制，结果按 article_id 去重写入同一张表"""
+    writer = ArticleWriter()
+    gate = RequestGate()
+    progress = tqdm(desc="爬取进度", unit="页")
+    try:
+        with create_session(CRAWL_CONCURRENCY) as session:
+            counts = await asyncio.gather(*(
+                crawl_partition(writer, session, gate, progress, topic_type_id, incremental)
+                for topic_type_id in topic_type_ids
+            ))
+    finally:
+        writer.close()
+        progress.close()
+    return dict(zip(topic_type_ids, counts))
+
+def main(incremental=False, topic_type_ids=None, discover=False):
+    """主函数
+
+    topic_type_ids 为要爬取的分类列表（默认不限分类），discover 为真时自动发现分类；
+    各分类作为独立分区并发爬取，每个分区有自己的检查点和进度，
+    TOTAL_ARTICLES 为每个分区的目标数量
+    """
+    print("盛财有数文章爬虫启动...")
+    print(f"配置信息: 目标爬取 {TOTAL_ARTICLES} 篇文章，每页 {ARTICLES_PER_PAGE} 篇，"
+          f"最多 {CRAWL_CONCURRENCY} 页并发{'，增量模式' if incremental else ''}")
+    
+    print("初始化数据库...")
+    init_database()
     
-    print(f"\n爬取完成，共保存了 {saved_count} 篇文章")
+    # 确保原始数据目录存在
+    ensure_raw_data_dir()
+
+    try:
+        if discover:
+            topic_type_ids = discover_topic_types() or topic_type_ids
+        topic_type_ids = topic_type_ids or [""]
+        
+        print("开始爬取文章...")
+        counts = asyncio.run(crawl_partitions(topic_type_ids, incremental))
+    finally:
+        close_archive()
+
+    if len(counts) > 1:
+        for topic_type_id, count in counts.items():
+            print(f"分类 {topic_type_id}: 保存了 {count} 篇文章")
+    print(f"\n爬取完成，共保存了 {sum(counts.values())} 篇文章")
     
     # 显示统计信息
     show_stats()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="盛财有数文章爬虫")
+    parser.add_argument("command", nargs="?", default="crawl",
+                        choices=["crawl", "replay", "import-legacy", "search", "reindex"],
+                        help="crawl: 爬取文章（默认）；replay: 从原始响应归档重新入库；"
+                             "import-legacy: 把旧版逐页JSON文件导入归档并重放入库；"
+                             "search: 全文检索文章；reindex: 重建全文索引")
+    parser.add_argument("--incremental", action="store_true",
+                        help="增量爬取：到达上次爬取的最新文章即停止，支持断点续爬")
+    parser.add_argument("--topics", default="",
+                        help="要爬取的 topicTypeId，多个用逗号分隔，默认不限分类")
+    parser.add_argument("--discover-topics", action="store_true",
+                        help="从最新文章中自动发现 topicTypeId 并分别并发爬取")
+    parser.add_argument("--run", default=None, help="replay 只重放指定批次")
+    parser.add_argument("--update-existing", action="store_true",
+                        help="replay 时覆盖已存在的文章")
+    parser.add_argument("-q", "--query", help="search 命令的检索词")
+    parser.add_argument("--limit", type=int, default=20, help="search 命令返回的结果数")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        try:
+            replay_archive(args.run, args.update_existing)
+        finally:
+            close_archive()
+    elif args.command == "search":
+        if not args.query:
+            parser.error("search 命令需要 -q/--query 参数")
+        init_database()
+        started = time.perf_counter()
+        results = search_articles(args.query, args.limit)
+        elapsed = (time.perf_counter() - started) * 1000
+        for article_id, author, gmt_create, snippet in results:
+            print(f"ID: {article_id} | 作者: {author} | 日期: {gmt_create}\n    {snippet}")
+        print(f"\n共 {len(results)} 条结果，用时 {elapsed:.1f} 毫秒")
+    elif args.command == "reindex":
+        init_database()
+        conn = connect_db()
+        print(f"已为 {rebuild_search_index(conn)} 篇文章建立全文索引")
+        conn.close()
+    elif args.command == "import-legacy":
+        try:
+            import_legacy_responses()
+        finally:
+            close_archive()
+    else:
+        topic_type_ids = [t.strip() for t in args.topics.split(",") if t.strip()]
+        main(incremental=args.incremental, topic_type_ids=topic_type_ids,
+             discover=args.discover_topics)
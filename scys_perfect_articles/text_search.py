@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+SQLite FTS5 全文检索的切词和查询构造，文章爬虫（scys_crawler.py）和合同下载（importFDD.py）共用
+
+中文没有空格分词，按相邻两字切分为二元词元；建索引时每段中文再追加单字词元，
+单字查询才能命中词中间或末尾的字
+"""
+
+import re
+
+# 切词规则：连续汉字或连续字母数字
+TOKEN_RE = re.compile(r'[\u4e00-\u9fff]+|[0-9A-Za-z]+')
+
+def bigram_tokens(text, unigrams=False):
+    """把文本切分为检索词元：中文按相邻两字切分，字母数字按整词（小写）
+
+    unigrams 为真时（建索引用）每段中文在二元词元之后再追加单字词元，
+    二元词元的相邻位置不受影响，短语查询照常匹配
+    """
+    tokens = []
+    for run in TOKEN_RE.findall(text or ""):
+        if run.isascii():
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+            if unigrams:
+                tokens.extend(run)
+    return ' '.join(tokens)
+
+def build_match_query(query):
+    """把用户输入转换为 FTS5 查询：每段连续文字作为一个短语，各段之间为 AND"""
+    return ' '.join(f'"{bigram_tokens(run)}"' for run in TOKEN_RE.findall(query))
+
+def make_snippet(text, query, width=40):
+    """截取首个命中位置附近的文本，命中词用【】标出"""
+    terms = TOKEN_RE.findall(query)
+    lowered = text.lower()
+    hit = min((pos for pos in (lowered.find(t.lower()) for t in terms) if pos >= 0),
+              default=0)
+    start = max(0, hit - width)
+    snippet = text[start:hit + width * 2].replace('\n', ' ')
+    for term in terms:
+        snippet = re.sub(re.escape(term), lambda m: f"【{m.group(0)}】", snippet,
+                         flags=re.IGNORECASE)
+    return ('...' if start else '') + snippet + ('...' if hit + width * 2 < len(text) else '')
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+测试公共配置：导入路径和本地假服务（bench/fake_services.py）
+"""
+
+import os
+import sys
+import json
+import socket
+import subprocess
+import time
+import urllib.request
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "scys_perfect_articles"), os.path.join(ROOT, "bench")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+# 假服务提供的文章数和合同PDF大小
+FAKE_ARTICLES = 300
+FAKE_PDF_KB = 4
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def call_service(base_url, path, data=None):
+    body = json.dumps(data).encode("utf-8") if data is not None else None
+    request = urllib.request.Request(base_url + path, data=body, method="POST" if body else "GET",
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.loads(response.read())
+
+@pytest.fixture(scope="session")
+def fake_services():
+    """启动一个没有延迟和故障的假服务，返回其地址"""
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "bench", "fake_services.py"), "--port", str(port),
+         "--articles", str(FAKE_ARTICLES), "--pdf-kb", str(FAKE_PDF_KB)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            call_service(base_url, "/_stats")
+            break
+        except OSError:
+            time.sleep(0.05)
+    else:
+        process.terminate()
+        pytest.fail("假服务启动失败")
+    yield base_url
+    process.terminate()
+    process.wait()
+
+@pytest.fixture
+def faults(fake_services):
+    """修改假服务的故障配置，测试结束后恢复为无故障"""
+
+    def configure(service=None, **values):
+        call_service(fake_services, "/_config", dict(values, service=service))
+
+    call_service(fake_services, "/_reset", {})
+    yield configure
+    call_service(fake_services, "/_config", {"latency_ms": 0, "jitter_ms": 0, "error_rate": 0,
+                                            "throttle_rate": 0, "retry_after": 1})
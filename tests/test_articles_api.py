@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import asyncio
+
+import pytest
+
+import articles_api
+import scys_crawler
+from async_http import Request
+from gen_data import article_item
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """临时文章库上的接口处理函数"""
+    db_file = str(tmp_path / "articles.db")
+    monkeypatch.setattr(scys_crawler, "DB_FILE", db_file)
+    scys_crawler.init_database()
+    add_articles(range(30))
+    reader = articles_api.ArticleReader(db_file)
+    cache = articles_api.ResponseCache(reader)
+    return articles_api.make_handler(reader, cache), cache
+
+def add_articles(numbers):
+    writer = scys_crawler.ArticleWriter()
+    try:
+        writer.save_page([article_item(n) for n in numbers])
+    finally:
+        writer.close()
+
+def get(handler, target, **headers):
+    request = Request("GET", target, {k.replace("_", "-"): v for k, v in headers.items()}, b"")
+    return asyncio.run(handler(request))
+
+def test_matching_etag_returns_304(api):
+    handler, cache = api
+    first = get(handler, "/api/articles?limit=5")
+    assert first.status == 200
+    etag = first.headers["ETag"]
+
+    again = get(handler, "/api/articles?limit=5", if_none_match=f'"other", {etag}')
+    assert again.status == 304 and again.body == b""
+    assert again.headers["ETag"] == etag
+    assert cache.hits == 1
+
+def test_etag_changes_after_database_commit(api):
+    handler, _ = api
+    etag = get(handler, "/api/articles?limit=5").headers["ETag"]
+
+    # 爬虫写入更新的文章后缓存失效，旧的 ETag 不再匹配
+    add_articles([-1])
+    response = get(handler, "/api/articles?limit=5", if_none_match=etag)
+    assert response.status == 200
+    assert response.headers["ETag"] != etag
+    assert json.loads(response.body)["items"][0]["article_id"] == "B-1"
+
+def test_keyset_pagination_and_gzip(api):
+    handler, _ = api
+    seen = []
+    target = "/api/articles?limit=12"
+    while target:
+        response = get(handler, target, accept_encoding="gzip")
+        body = response.body
+        if response.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        page = json.loads(body)
+        seen += [item["article_id"] for item in page["items"]]
+        target = page["next_cursor"] and f"/api/articles?limit=12&cursor={page['next_cursor']}"
+    assert seen == [f"B{n}" for n in range(29, -1, -1)]
+
+def test_single_article_and_errors(api):
+    handler, _ = api
+    article = json.loads(get(handler, "/api/articles/B3").body)
+    assert article["article_content"] == article_item(3)["topicDTO"]["articleContent"]
+    for target, status in (("/api/articles/missing", 404), ("/api/articles?limit=x", 400),
+                           ("/api/articles?since=2025-13-01", 400)):
+        with pytest.raises(articles_api.HTTPError) as error:
+            get(handler, target)
+        assert error.value.status == status
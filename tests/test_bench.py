@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+import run_bench
+from conftest import ROOT, free_port
+
+ARTICLES = 200
+CONTRACTS = 30
+
+def bench(workdir, *options):
+    """运行一次小规模的端到端基准测试，返回 (退出码, 报告)"""
+    output = workdir / "result.json"
+    command = [sys.executable, os.path.join(ROOT, "bench", "run_bench.py"),
+               "--workdir", str(workdir), "--port", str(free_port()), "--output", str(output),
+               "--articles", str(ARTICLES), "--contracts", str(CONTRACTS), "--pdf-kb", "4",
+               "--workers", "4", "--latency-ms", "0", "--jitter-ms", "0", *options]
+    code = subprocess.call(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                           timeout=120)
+    report = json.loads(output.read_text(encoding="utf-8")) if output.exists() else None
+    return code, report
+
+def test_all_stages_process_every_record(tmp_path):
+    # 上次运行留下的原始响应归档应在爬取前清除
+    stale = tmp_path / "raw_api_responses" / "stale.jsonl.gz"
+    stale.parent.mkdir()
+    stale.write_bytes(b"")
+
+    code, report = bench(tmp_path, "--error-rate", "0", "--throttle-rate", "0")
+
+    assert code == 0
+    stages = report["stages"]
+    assert {stage: stages[stage]["records"] for stage in run_bench.STAGES} == {
+        "crawl": ARTICLES, "download": CONTRACTS, "export_html": ARTICLES,
+        "export_feishu": ARTICLES}
+    assert stages["crawl"]["pages"] == ARTICLES // 20
+    assert stages["download"]["errors"] == stages["export_feishu"]["errors"] == 0
+    assert not stale.exists()
+
+def test_stages_recover_from_injected_errors_and_throttling(tmp_path):
+    code, report = bench(tmp_path, "--error-rate", "0.05", "--throttle-rate", "0.05",
+                         "--retry-after", "0.1")
+
+    assert code == 0
+    stages = report["stages"]
+    assert stages["download"]["records"] == CONTRACTS
+    assert stages["export_feishu"]["records"] == ARTICLES
+    assert stages["crawl"]["records"] == ARTICLES
+
+def test_compare_reports_throughput_and_memory_regressions():
+    baseline = {"stages": {
+        "crawl": {"pages_per_s": 100, "mb_per_s": 10, "records_per_s": 1000, "peak_rss_mb": 50},
+        "download": {"error": "exit code 1"},
+    }}
+    report = {"stages": {
+        "crawl": {"pages_per_s": 95, "mb_per_s": 8, "records_per_s": 1200, "peak_rss_mb": 60},
+        "download": {"mb_per_s": 1},
+    }}
+    assert run_bench.compare(report, baseline, 0.1) == ["crawl.mb_per_s", "crawl.peak_rss_mb"]
+    assert run_bench.compare(report, baseline, 0.25) == []
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+import export_to_feishu
+import scys_crawler
+from gen_data import article_item
+from conftest import call_service
+
+@pytest.fixture
+def feishu(fake_services, faults, tmp_path, monkeypatch):
+    """指向假服务的飞书导出，文章库、同步状态和令牌缓存都在临时目录中"""
+    db_file = str(tmp_path / "articles.db")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(export_to_feishu, "FEISHU_API_BASE", fake_services + "/open-apis")
+    monkeypatch.setattr(export_to_feishu, "FEISHU_APP_ID", "cli_test")
+    monkeypatch.setattr(export_to_feishu, "FEISHU_APP_SECRET", "secret")
+    monkeypatch.setattr(export_to_feishu, "FEISHU_BITABLE_ID", "apptest")
+    monkeypatch.setattr(export_to_feishu, "DB_FILE", db_file)
+    monkeypatch.setattr(scys_crawler, "DB_FILE", db_file)
+    scys_crawler.init_database()
+    return export_to_feishu
+
+def add_articles(numbers):
+    writer = scys_crawler.ArticleWriter()
+    try:
+        writer.save_page([article_item(n) for n in numbers])
+    finally:
+        writer.close()
+
+def feishu_requests(fake_services):
+    return call_service(fake_services, "/_stats")["feishu"]["requests"]
+
+def sync(feishu, capsys):
+    assert feishu.export_to_feishu_bitable(0, use_existing=True, sync=True)
+    out = capsys.readouterr().out
+    return tuple(int(n) for n in re.search(r"新增 (\d+) 篇，更新 (\d+) 篇，(\d+) 篇未变化", out).groups())
+
+def test_sync_only_writes_new_and_changed_articles(feishu, fake_services, capsys):
+    add_articles(range(30))
+    assert sync(feishu, capsys) == (30, 0, 0)
+
+    # 修改一篇文章的摘要，再新增两篇
+    conn = sqlite3.connect(feishu.DB_FILE)
+    with conn:
+        conn.execute("UPDATE articles SET ai_summary_content = '新摘要' WHERE article_id = 'B5'")
+    conn.close()
+    add_articles([30, 31])
+    assert sync(feishu, capsys) == (2, 1, 29)
+
+    # 没有变化时不发送任何请求（令牌来自缓存，数据表来自同步状态）
+    call_service(fake_services, "/_reset", {})
+    assert sync(feishu, capsys) == (0, 0, 32)
+    assert feishu_requests(fake_services) == 0
+
+    state = feishu.open_sync_db()
+    try:
+        assert state.execute("SELECT COUNT(DISTINCT record_id) FROM synced_records").fetchone()[0] == 32
+        assert state.execute("SELECT COUNT(*) FROM sync_tables").fetchone()[0] == 1
+    finally:
+        state.close()
+
+def test_content_hash_ignores_reader_fields(feishu):
+    fields = {"文章ID": "B1", "AI摘要": "摘要", "是否已读": "否"}
+    assert feishu.content_hash(fields) == feishu.content_hash(dict(fields, 是否已读="是", 阅读摘要="笔记"))
+    assert feishu.content_hash(fields) != feishu.content_hash(dict(fields, AI摘要="新摘要"))
+
+class FakeResponse:
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+        self.text = str(data)
+
+    def json(self):
+        return self.data
+
+def fake_create_requests(feishu, monkeypatch, responses, tables=()):
+    """按顺序返回 POST 的响应，GET 返回数据表列表，记录请求方法"""
+    calls = []
+
+    def fake_request(tokens, method, url, session=None, **kwargs):
+        calls.append(method)
+        if method == "GET":
+            return FakeResponse(200, {"code": 0, "data": {"items": list(tables), "has_more": False}})
+        return responses.pop(0)
+
+    monkeypatch.setattr(feishu, "MAX_BACKOFF", 0)
+    monkeypatch.setattr(feishu, "feishu_request", fake_request)
+    monkeypatch.setattr(feishu.RateLimitBackoff, "on_limited", lambda self, retry_after=None: 0)
+    return calls
+
+def test_create_table_looks_up_before_retrying_server_errors(feishu, monkeypatch):
+    calls = fake_create_requests(feishu, monkeypatch, [
+        FakeResponse(500, {"code": 1255040, "msg": "internal error"}),
+        FakeResponse(429, {"code": 99991400, "msg": "frequency limit"}, {"Retry-After": "0"}),
+        FakeResponse(200, {"code": 0, "data": {"table_id": "tbl1"}}),
+    ])
+    assert feishu.create_table(None, "app", "精华文章", []) == "tbl1"
+    # 服务端错误后请求可能已经生效，每次重新创建前先按名称查找
+    assert calls == ["POST", "GET", "POST", "GET", "POST"]
+
+def test_create_table_returns_table_created_by_failed_request(feishu, monkeypatch):
+    calls = fake_create_requests(feishu, monkeypatch, [
+        FakeResponse(502, {"code": 1255040, "msg": "bad gateway"}),
+    ], tables=[{"name": "精华文章", "table_id": "tbl_created"}])
+    assert feishu.create_table(None, "app", "精华文章", []) == "tbl_created"
+    assert calls == ["POST", "GET"]
+
+def test_create_table_retries_rate_limits_without_lookup(feishu, monkeypatch):
+    calls = fake_create_requests(feishu, monkeypatch, [
+        FakeResponse(429, {"code": 99991400, "msg": "frequency limit"}, {"Retry-After": "0"}),
+        FakeResponse(200, {"code": 0, "data": {"table_id": "tbl1"}}),
+    ])
+    assert feishu.create_table(None, "app", "精华文章", []) == "tbl1"
+    assert calls == ["POST", "POST"]
+
+def test_create_bitable_does_not_repeat_possibly_applied_request(feishu, monkeypatch):
+    calls = fake_create_requests(feishu, monkeypatch, [
+        FakeResponse(500, {"code": 1255040, "msg": "internal error"}),
+        FakeResponse(200, {"code": 0, "data": {"app": {"app_token": "app_dup"}}}),
+    ])
+    # 没有按名称查找多维表格的接口，请求可能已生效时不再重试
+    assert feishu.create_bitable(None, "精华文章") is None
+    assert calls == ["POST"]
+
+def test_table_lookup_gives_up_on_permanent_errors(feishu, monkeypatch):
+    calls = []
+
+    def fake_request(tokens, method, url, session=None, **kwargs):
+        calls.append(method)
+        return FakeResponse(403, {"code": 91403, "msg": "Forbidden"})
+
+    monkeypatch.setattr(feishu, "feishu_request", fake_request)
+    assert feishu.find_table(None, "app", "精华文章") is None
+    assert calls == ["GET"]
+
+def test_sync_state_is_closed_when_table_setup_fails(feishu, monkeypatch):
+    add_articles(range(3))
+    closed = []
+    open_sync_db = feishu.open_sync_db
+
+    def tracking_open(db_file=None):
+        conn = open_sync_db(db_file)
+        closing = conn.close
+
+        class Tracked:
+            def __getattr__(self, name):
+                return getattr(conn, name)
+
+            def __enter__(self):
+                return conn.__enter__()
+
+            def __exit__(self, *exc_info):
+                return conn.__exit__(*exc_info)
+
+            def close(self):
+                closed.append(True)
+                closing()
+
+        return Tracked()
+
+    def broken_table(*args):
+        raise requests.exceptions.ConnectionError("断开")
+
+    monkeypatch.setattr(feishu, "open_sync_db", tracking_open)
+    monkeypatch.setattr(feishu, "get_sync_table", broken_table)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        feishu.export_to_feishu_bitable(0, use_existing=True, sync=True)
+    assert closed == [True]
+
+def token_requests(feishu, monkeypatch):
+    calls = []
+    get_access_token = feishu.get_access_token
+
+    def counting():
+        calls.append(True)
+        return get_access_token()
+
+    monkeypatch.setattr(feishu, "get_access_token", counting)
+    return calls
+
+def test_token_is_cached_across_providers(feishu, monkeypatch, tmp_path):
+    calls = token_requests(feishu, monkeypatch)
+    token = feishu.TenantTokenProvider().get()
+    assert token and calls == [True]
+
+    # 新进程从磁盘缓存读取，不再申请
+    assert feishu.TenantTokenProvider().get() == token
+    assert calls == [True]
+    assert oct((tmp_path / feishu.TOKEN_CACHE).stat().st_mode & 0o777) == "0o600"
+
+    # 其他应用的缓存不使用
+    monkeypatch.setattr(feishu, "FEISHU_APP_ID", "cli_other")
+    assert feishu.TenantTokenProvider().get() != token
+    assert len(calls) == 2
+
+def test_token_is_refreshed_before_expiry(feishu, monkeypatch):
+    calls = token_requests(feishu, monkeypatch)
+    tokens = feishu.TenantTokenProvider()
+    token = tokens.get()
+    tokens.expire_at = feishu.time.time() + feishu.TOKEN_REFRESH_MARGIN - 1
+    assert tokens.get() != token
+    assert len(calls) == 2
+
+def test_rejected_token_is_refreshed_once_for_concurrent_callers(feishu, fake_services, monkeypatch):
+    calls = token_requests(feishu, monkeypatch)
+    tokens = feishu.TenantTokenProvider()
+    tokens.get()
+    # 缓存中的令牌在服务端已失效，多个线程同时被拒绝，只应刷新一次
+    tokens.token = "t-revoked"
+    url = f"{feishu.FEISHU_API_BASE}/bitable/v1/apps/apptest/tables"
+    barrier = threading.Barrier(8)
+
+    def list_tables():
+        barrier.wait()
+        return feishu.feishu_request(tokens, "GET", url).json()["code"]
+
+    with ThreadPoolExecutor(8) as executor:
+        codes = list(executor.map(lambda _: list_tables(), range(8)))
+    assert codes == [0] * 8
+    assert len(calls) == 2
+
+def test_feishu_request_retries_once_with_new_token(feishu, fake_services, monkeypatch):
+    calls = token_requests(feishu, monkeypatch)
+    tokens = feishu.TenantTokenProvider()
+    tokens.get()
+    # 缓存中的令牌在服务端已失效（例如服务端重启），请求被拒绝后重新获取并重试
+    tokens.token = "t-revoked"
+    response = feishu.feishu_request(tokens, "GET",
+                                     f"{feishu.FEISHU_API_BASE}/bitable/v1/apps/apptest/tables")
+    assert response.status_code == 200 and response.json()["code"] == 0
+    assert len(calls) == 2 and tokens.token != "t-revoked"
+
+def test_token_request_retries_server_errors_and_rate_limits(feishu, monkeypatch):
+    monkeypatch.setattr(feishu, "MAX_BACKOFF", 0)
+    monkeypatch.setattr(feishu.RateLimitBackoff, "on_limited", lambda self, retry_after=None: 0)
+    responses = [
+        FakeResponse(500, {"code": 1255040, "msg": "internal error"}),
+        FakeResponse(429, {"code": 99991400, "msg": "frequency limit"}, {"Retry-After": "0"}),
+        FakeResponse(200, {"code": 0, "tenant_access_token": "t-ok", "expire": 7200}),
+    ]
+    monkeypatch.setattr(feishu.requests, "post", lambda *args, **kwargs: responses.pop(0))
+    assert feishu.get_access_token() == ("t-ok", 7200)
+    assert responses == []
+
+def test_date_range_filters_exported_articles(feishu):
+    day = int(datetime(2025, 4, 10).timestamp())
+    items = [article_item(n) for n in range(1, 5)]
+    for item, created in zip(items, [day - 1, day, day + 86399, day + 86400]):
+        item["topicDTO"]["gmtCreate"] = created * 1000
+    writer = scys_crawler.ArticleWriter()
+    try:
+        writer.save_page(items)
+    finally:
+        writer.close()
+
+    rows = feishu.get_articles_from_db(since="2025-04-10", until="2025-04-10")
+    assert [(row["article_id"], row["display_date"], row["filter_month"]) for row in rows] == [
+        ("B2", "2025/04/10", "2025-04"), ("B3", "2025/04/10", "2025-04")]
+    assert feishu.count_articles(since="2025-04-11") == 1
+
+def test_prefetch_closes_source_in_producer_thread_when_consumer_fails():
+    events = {}
+
+    def source():
+        events["thread"] = threading.current_thread()
+        try:
+            for n in range(1000):
+                yield n
+        finally:
+            events["closed_in"] = threading.current_thread()
+
+    consumed = []
+    with pytest.raises(RuntimeError):
+        for item in export_to_feishu.prefetch(source(), 4):
+            consumed.append(item)
+            if len(consumed) == 3:
+                raise RuntimeError("上传失败")
+
+    # 生成器在生产者线程中关闭，prefetch 返回前生产者已经退出
+    assert consumed == [0, 1, 2]
+    assert events["closed_in"] is events["thread"]
+    assert events["thread"] is not threading.current_thread()
+    assert not events["thread"].is_alive()
+
+def test_prefetch_keeps_order_and_bounds_read_ahead():
+    produced = []
+
+    def source():
+        for n in range(100):
+            produced.append(n)
+            yield n
+
+    items = export_to_feishu.prefetch(source(), 4)
+    assert next(items) == 0
+    time.sleep(0.3)
+    # 调用方停下时生产者最多领先队列容量加上正在等待放入的一项
+    assert len(produced) <= 4 + 2
+    assert list(items) == list(range(1, 100))
+
+def test_prefetch_reraises_producer_errors_after_queued_items():
+    def source():
+        yield from range(3)
+        raise ValueError("读取失败")
+
+    consumed = []
+    with pytest.raises(ValueError, match="读取失败"):
+        for item in export_to_feishu.prefetch(source(), 2):
+            consumed.append(item)
+    assert consumed == [0, 1, 2]
+
+def uploaded_fields(n):
+    return [{"fields": {"文章ID": f"B{i}"}} for i in range(n)]
+
+def test_retried_batches_reuse_client_token(feishu, monkeypatch):
+    monkeypatch.setattr(feishu, "MAX_BACKOFF", 0)
+    feishu_call = feishu.feishu_call
+    lost = {}
+
+    def lose_first_response(tokens, method, url, session=None, **kwargs):
+        data = feishu_call(tokens, method, url, session, **kwargs)
+        client_token = kwargs["params"]["client_token"]
+        if client_token not in lost:
+            # 服务端已经写入，但响应在返回途中丢失
+            lost[client_token] = [item["record_id"] for item in data["records"]]
+            raise feishu.UploadError("读取响应超时", retryable=True)
+        return data
+
+    monkeypatch.setattr(feishu, "feishu_call", lose_first_response)
+    uploader = feishu.RecordUploader(feishu.TenantTokenProvider(), "apptest", "tbl_retry",
+                                     concurrency=3, batch_size=10)
+    batches = []
+    assert uploader.run(uploaded_fields(45), on_batch=lambda batch, ids, error: batches.append(
+        (ids, error))) == (45, 0)
+
+    # 重试使用同一个 client_token，服务端返回第一次写入的记录，没有产生重复记录
+    assert len(lost) == 5
+    assert sorted(ids for ids, _ in batches) == sorted(lost.values())
+    assert all(error is None for _, error in batches)
+
+def test_concurrent_upload_survives_faults(feishu, fake_services, faults, monkeypatch):
+    monkeypatch.setattr(feishu, "MAX_BACKOFF", 0)
+    uploader = feishu.RecordUploader(feishu.TenantTokenProvider(), "apptest", "tbl_faults",
+                                     concurrency=4, batch_size=50)
+    faults("feishu", error_rate=0.15, throttle_rate=0.1, retry_after=0)
+
+    record_ids = []
+    succeeded, failed = uploader.run(
+        uploaded_fields(600), on_batch=lambda batch, ids, error: record_ids.extend(ids))
+
+    assert (succeeded, failed) == (600, 0)
+    assert len(set(record_ids)) == 600
+    stats = call_service(fake_services, "/_stats")["feishu"]
+    assert stats["ok"] >= 12
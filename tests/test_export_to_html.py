@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import export_to_html
+import scys_crawler
+from gen_data import article_item
+
+@pytest.fixture
+def exporter(tmp_path, monkeypatch):
+    """临时数据库和导出目录"""
+    db_file = str(tmp_path / "articles.db")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scys_crawler, "DB_FILE", db_file)
+    monkeypatch.setattr(export_to_html, "DB_FILE", db_file)
+    monkeypatch.setattr(export_to_html, "EXPORT_DIR", str(tmp_path / "export"))
+    scys_crawler.init_database()
+    return export_to_html
+
+def add_articles(numbers):
+    writer = scys_crawler.ArticleWriter()
+    try:
+        writer.save_page([article_item(n) for n in numbers])
+    finally:
+        writer.close()
+
+def exported_numbers(export_dir):
+    """各篇文章在汇总分页中的序号 {文章ID: 序号}"""
+    numbers = {}
+    for name in os.listdir(export_dir):
+        if name.startswith("文章汇总_"):
+            with open(os.path.join(export_dir, name), encoding="utf-8") as f:
+                for article_id, number in re.findall(
+                        r'data-article-id="([^"]+)">\s*<td>(\d+)</td>', f.read()):
+                    numbers[article_id] = int(number)
+    return numbers
+
+def export(exporter, num, page_size=10):
+    assert exporter.export_to_html(num, open_browser=False, page_size=page_size, processes=1)
+    return exported_numbers(exporter.EXPORT_DIR)
+
+def test_numbers_are_stable_when_articles_are_added(exporter):
+    # 文章编号越大越旧；先入库较旧的 30 篇
+    add_articles(range(20, 50))
+    before = export(exporter, 20)
+    assert before == {f"B{n}": 50 - n for n in range(20, 40)}
+
+    add_articles(range(20))
+    after = export(exporter, 0)
+    assert len(after) == 50
+    assert all(after[article_id] == number for article_id, number in before.items())
+    assert after["B0"] == 50
+
+def test_partial_export_only_links_exported_pages(exporter):
+    add_articles(range(45))
+    export(exporter, 12, page_size=10)
+
+    with open(os.path.join(exporter.EXPORT_DIR, exporter.PAGES_INDEX), encoding="utf-8") as f:
+        pages = json.load(f)["pages"]
+    # 序号 34-45 分布在第4页（31-40）和第5页（41-45）
+    assert [(p["page"], p["count"]) for p in pages] == [(5, 5), (4, 7)]
+    with open(os.path.join(exporter.EXPORT_DIR, "文章汇总_4.html"), encoding="utf-8") as f:
+        html = f.read()
+    assert "文章汇总_5.html" in html and "文章汇总_3.html" not in html
+
+def load_search_file(export_dir, name):
+    with open(os.path.join(export_dir, export_to_html.SEARCH_DIR, f"{name}.js"),
+              encoding="utf-8") as f:
+        text = f.read()
+    prefix = f"scysSearch.loaded({json.dumps(name)},"
+    assert text.startswith(prefix) and text.endswith(");\n")
+    return json.loads(text[len(prefix):-3])
+
+def test_search_index_covers_single_characters_beyond_summary_prefix(tmp_path):
+    builder = export_to_html.SearchIndexBuilder(shards=8)
+    summaries = {"A1": "开头" * 40 + "结尾有鲸鱼", "A2": "鲸", "A3": "没有相关内容"}
+    for number, (article_id, summary) in enumerate(summaries.items(), 1):
+        builder.add(number, article_id, "作者", 1700000000 + number, summary)
+    spill_dir = builder.spill.name
+    builder.write(str(tmp_path))
+
+    assert not os.path.exists(spill_dir)
+    meta = load_search_file(str(tmp_path), "meta")
+    assert meta["shards"] == 8 and meta["authors"] == ["作者"]
+    assert [row[:2] for row in meta["rows"]] == [[1, "A1"], [2, "A2"], [3, "A3"]]
+    assert len(meta["rows"][0][4]) == export_to_html.SEARCH_SUMMARY_CHARS
+
+    def found(query):
+        rows = None
+        tokens = [query] if len(query) == 1 else [query[i:i + 2] for i in range(len(query) - 1)]
+        for token in tokens:
+            index = load_search_file(str(tmp_path), f"index_{export_to_html.search_shard(token, 8)}")
+            postings, row = [], 0
+            for delta in index.get(token, []):
+                row += delta
+                postings.append(row)
+            rows = postings if rows is None else [r for r in rows if r in postings]
+        return {meta["rows"][r][1] for r in rows}
+
+    # 单字出现在摘要开头之后也能检索到
+    assert found("鲸") == {"A1", "A2"}
+    assert found("鲸鱼") == {"A1"}
+    assert found("内容") == {"A3"}
+
+def dated_item(n, created):
+    item = article_item(n)
+    item["topicDTO"]["gmtCreate"] = created
+    return item
+
+def add_dated_articles():
+    """2025-04-10 前后的文章，gmtCreate 为毫秒或秒级时间戳，返回当天零点的时间戳"""
+    day = int(datetime(2025, 4, 10).timestamp())
+    writer = scys_crawler.ArticleWriter()
+    try:
+        writer.save_page([dated_item(1, (day - 1) * 1000), dated_item(2, day * 1000),
+                          dated_item(3, day + 86399), dated_item(4, (day + 86400) * 1000)])
+    finally:
+        writer.close()
+    return day
+
+def test_date_range_filters_by_epoch_timestamp(exporter):
+    day = add_dated_articles()
+    conn = sqlite3.connect(scys_crawler.DB_FILE)
+    try:
+        # 秒级和毫秒级的 gmtCreate 都换算为秒
+        assert dict(conn.execute("SELECT article_id, gmt_create_ts FROM articles")) == {
+            "B1": day - 1, "B2": day, "B3": day + 86399, "B4": day + 86400}
+        # 起止日期都包含当天
+        rows = list(exporter.iter_articles(conn, since="2025-04-10", until="2025-04-10"))
+        assert [row[1] for row in rows] == ["B3", "B2"]
+        assert [row[-1] for row in rows] == ["2025年04月10日 23:59", "2025年04月10日 00:00"]
+        assert exporter.count_articles(conn, since="2025-04-10") == 3
+        assert exporter.count_articles(conn, until="2025-04-09") == 1
+    finally:
+        conn.close()
+
+def test_iter_articles_streams_all_rows_in_order(exporter):
+    add_articles(range(23))
+    conn = sqlite3.connect(scys_crawler.DB_FILE)
+    try:
+        sql, params = exporter.build_query()
+        expected = conn.execute(sql, params).fetchall()
+        # 按小批次读取的结果与一次性读取完全一致
+        assert list(exporter.iter_articles(conn, fetch_size=7)) == expected
+        assert [row[1] for row in expected] == [f"B{n}" for n in range(23)]
+    finally:
+        conn.close()
+
+def test_full_export_writes_linked_summary_pages(exporter):
+    add_articles(range(45))
+    numbers = export(exporter, 0, page_size=10)
+    assert numbers == {f"B{n}": 45 - n for n in range(45)}
+
+    with open(os.path.join(exporter.EXPORT_DIR, exporter.PAGES_INDEX), encoding="utf-8") as f:
+        index = json.load(f)
+    assert index["total"] == 45 and index["page_size"] == 10
+    assert [(p["page"], p["count"], p["first_article_id"], p["last_article_id"])
+            for p in index["pages"]] == [(5, 5, "B0", "B4"), (4, 10, "B5", "B14"),
+                                         (3, 10, "B15", "B24"), (2, 10, "B25", "B34"),
+                                         (1, 10, "B35", "B44")]
+    for page_no in range(1, 6):
+        with open(os.path.join(exporter.EXPORT_DIR, f"文章汇总_{page_no}.html"),
+                  encoding="utf-8") as f:
+            html = f.read()
+        assert (f"文章汇总_{page_no + 1}.html" in html) == (page_no < 5)
+        assert (f"文章汇总_{page_no - 1}.html" in html) == (page_no > 1)
+    with open(os.path.join(exporter.EXPORT_DIR, "article_B20.html"), encoding="utf-8") as f:
+        assert 'href="文章汇总_3.html">返回汇总' in f.read()
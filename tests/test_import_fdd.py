@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import threading
+import time
+
+import importFDD
+from gen_data import pdf_bytes, contract_url
+from conftest import FAKE_PDF_KB, call_service
+
+PDF_SIZE = FAKE_PDF_KB * 1024
+
+def pdf_url(base_url, contract_id):
+    return contract_url(base_url, contract_id).replace("/viewdocs.action?", "/getdocs.action?")
+
+def test_fetch_pdf_resumes_part_file_with_range(fake_services, tmp_path):
+    expected = pdf_bytes("C1", PDF_SIZE)
+    target = tmp_path / "c1.pdf"
+    (tmp_path / "c1.pdf.part").write_bytes(expected[:1000])
+
+    with importFDD.create_session() as session:
+        digest, size, error = importFDD.fetch_pdf(session, pdf_url(fake_services, "C1"),
+                                                  str(target), max_retries=1)
+
+    assert error is None
+    assert size == len(expected)
+    assert target.read_bytes() == expected
+    assert digest == hashlib.sha256(expected).hexdigest()
+    assert not (tmp_path / "c1.pdf.part").exists()
+
+def test_fetch_pdf_restarts_when_range_not_satisfiable(fake_services, tmp_path):
+    expected = pdf_bytes("C2", PDF_SIZE)
+    target = tmp_path / "c2.pdf"
+    # 临时文件比服务器上的文件还长，续传请求得到 416，应丢弃后重新下载
+    (tmp_path / "c2.pdf.part").write_bytes(b"x" * (len(expected) + 10))
+
+    with importFDD.create_session() as session:
+        digest, size, error = importFDD.fetch_pdf(session, pdf_url(fake_services, "C2"),
+                                                  str(target), max_retries=2, retry_delay=0)
+
+    assert error is None
+    assert target.read_bytes() == expected
+    assert digest == hashlib.sha256(expected).hexdigest()
+
+def test_fetch_pdf_reports_throttling_without_retrying(fake_services, faults, tmp_path):
+    faults("pdf", throttle_rate=1, retry_after=3)
+
+    with importFDD.create_session() as session:
+        digest, _, error = importFDD.fetch_pdf(session, pdf_url(fake_services, "C3"),
+                                               str(tmp_path / "c3.pdf"), max_retries=3)
+
+    assert digest is None
+    assert isinstance(error, importFDD.ThrottledError)
+    assert error.retry_after == 3
+
+def write_csv(path, base_url, rows):
+    lines = ["合同ID,合同文件,合同地址"]
+    lines += [f"{contract_id},{name},{contract_url(base_url, contract_id)}" for contract_id, name in rows]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def manifest_rows(output_dir, shard=None):
+    conn = importFDD.open_manifest(str(output_dir), shard)
+    try:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT contract_id, filename, url, state, sha256 FROM contracts")}
+    finally:
+        conn.close()
+
+def sha256_of(contract_id):
+    return hashlib.sha256(pdf_bytes(contract_id, PDF_SIZE)).hexdigest()
+
+def test_shard_of_is_stable_and_partitions_all_contracts():
+    ids = [f"C{n:07d}" for n in range(2000)]
+    for count in (1, 2, 3, 7):
+        shards = [importFDD.shard_of(contract_id, count) for contract_id in ids]
+        assert shards == [importFDD.shard_of(contract_id, count) for contract_id in ids]
+        assert all(0 <= shard < count for shard in shards)
+        # 哈希应大致均匀，每个分片都分到合同
+        assert len(set(shards)) == count
+    assert importFDD.shard_of("C0000001", 4) == int.from_bytes(
+        hashlib.md5(b"C0000001").digest()[:8], "big") % 4
+
+def test_parse_shard_rejects_invalid_values():
+    assert importFDD.parse_shard("1/3") == (1, 3)
+    for text in ("3/3", "-1/2", "0/0"):
+        try:
+            importFDD.parse_shard(text)
+        except ValueError:
+            continue
+        raise AssertionError(text)
+
+def test_same_name_in_other_shard_is_not_adopted(fake_services, tmp_path):
+    first = next(f"C{n}" for n in range(100) if importFDD.shard_of(f"C{n}", 2) == 1)
+    second = next(f"C{n}" for n in range(100) if importFDD.shard_of(f"C{n}", 2) == 0)
+    csv_path = tmp_path / "contracts.csv"
+    output_dir = tmp_path / "out"
+    write_csv(csv_path, fake_services, [(first, "同名合同"), (second, "同名合同")])
+
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0, shard=(1, 2))
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0, shard=(0, 2))
+
+    assert manifest_rows(output_dir, (1, 2))[first][0] == "同名合同.pdf"
+    filename, url, state, digest = manifest_rows(output_dir, (0, 2))[second]
+    assert (filename, state, digest) == (f"同名合同_{second}.pdf", "done", sha256_of(second))
+    assert url is not None
+    assert (output_dir / "同名合同.pdf").read_bytes() == pdf_bytes(first, PDF_SIZE)
+    assert (output_dir / filename).read_bytes() == pdf_bytes(second, PDF_SIZE)
+
+def test_file_owned_by_same_contract_in_other_manifest_is_reused(fake_services, faults, tmp_path):
+    contract_id = "C42"
+    csv_path = tmp_path / "contracts.csv"
+    output_dir = tmp_path / "out"
+    write_csv(csv_path, fake_services, [(contract_id, "合同甲")])
+
+    # 先不分片下载，再改为分片运行：分片清单中没有记录，但未分片清单确认文件属于本合同
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0)
+    faults("pdf", error_rate=1)
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0,
+                                 shard=(importFDD.shard_of(contract_id, 3), 3))
+
+    filename, url, state, digest = manifest_rows(
+        output_dir, (importFDD.shard_of(contract_id, 3), 3))[contract_id]
+    assert (filename, state, digest) == ("合同甲.pdf", "done", sha256_of(contract_id))
+    assert url is not None
+
+def test_legacy_file_is_adopted_without_download(fake_services, faults, tmp_path):
+    csv_path = tmp_path / "contracts.csv"
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    write_csv(csv_path, fake_services, [("C7", "旧合同")])
+    (output_dir / "旧合同.pdf").write_bytes(b"%PDF-1.4 legacy")
+    faults("pdf", error_rate=1)
+
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0)
+
+    filename, url, state, digest = manifest_rows(output_dir)["C7"]
+    assert (filename, url, state) == ("旧合同.pdf", None, "done")
+    assert digest == hashlib.sha256(b"%PDF-1.4 legacy").hexdigest()
+    assert os.stat(output_dir / "旧合同.pdf").st_nlink == 2
+
+def test_audit_store_reports_missing_and_corrupt_blobs(fake_services, tmp_path):
+    csv_path = tmp_path / "contracts.csv"
+    output_dir = tmp_path / "out"
+    write_csv(csv_path, fake_services, [("C1", "合同一"), ("C2", "合同二"), ("C3", "合同三")])
+    for index in range(2):
+        importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0,
+                                     shard=(index, 2))
+    missing = importFDD.blob_path(str(output_dir), sha256_of("C1"))
+    corrupt = importFDD.blob_path(str(output_dir), sha256_of("C2"))
+    os.remove(missing)
+    with open(corrupt, "ab") as f:
+        f.write(b"garbage")
+
+    bad = importFDD.audit_store(str(output_dir), processes=1)
+
+    assert set(bad) == {missing, corrupt}
+    assert "文件缺失" in bad[missing][0]
+
+def output_files(output_dir):
+    return {path.name: path.read_bytes() for path in output_dir.iterdir() if path.suffix == ".pdf"}
+
+def test_concurrent_download_matches_serial(fake_services, tmp_path):
+    csv_path = tmp_path / "contracts.csv"
+    rows = [(f"C{n}", f"合同{n % 7}") for n in range(30)]
+    write_csv(csv_path, fake_services, rows)
+
+    importFDD.download_contracts(str(csv_path), str(tmp_path / "serial"), retry_delay=0)
+    importFDD.download_contracts(str(csv_path), str(tmp_path / "parallel"), retry_delay=0,
+                                 workers=8, per_host_limit=4)
+
+    serial = output_files(tmp_path / "serial")
+    assert len(serial) == len(rows)
+    assert output_files(tmp_path / "parallel") == serial
+    assert manifest_rows(tmp_path / "parallel") == manifest_rows(tmp_path / "serial")
+
+def test_downloads_respect_per_host_limit(fake_services, faults, tmp_path, monkeypatch):
+    faults("pdf", latency_ms=30)
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+    fetch_pdf = importFDD.fetch_pdf
+
+    def counting_fetch(*args, **kwargs):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        try:
+            return fetch_pdf(*args, **kwargs)
+        finally:
+            with lock:
+                active["now"] -= 1
+
+    monkeypatch.setattr(importFDD, "fetch_pdf", counting_fetch)
+    csv_path = tmp_path / "contracts.csv"
+    write_csv(csv_path, fake_services, [(f"C{n}", f"合同{n}") for n in range(20)])
+
+    importFDD.download_contracts(str(csv_path), str(tmp_path / "out"), retry_delay=0,
+                                 workers=8, per_host_limit=2)
+
+    # 线程池有8个线程，但同一主机的在途下载不超过2个
+    assert active["peak"] == 2
+    assert len(output_files(tmp_path / "out")) == 20
+
+def test_download_resumes_part_file_in_store(fake_services, faults, tmp_path):
+    csv_path = tmp_path / "contracts.csv"
+    output_dir = tmp_path / "out"
+    write_csv(csv_path, fake_services, [("C5", "续传合同"), ("C6", "过长合同")])
+    expected = {contract_id: pdf_bytes(contract_id, PDF_SIZE) for contract_id in ("C5", "C6")}
+    incoming = output_dir / importFDD.STORE_DIR / "incoming"
+    incoming.mkdir(parents=True)
+    # C5 中断在一半，续传即可；C6 的临时文件比服务器上的文件还长，得到 416 后重新下载
+    (incoming / "C5.pdf.part").write_bytes(expected["C5"][:PDF_SIZE // 2])
+    (incoming / "C6.pdf.part").write_bytes(b"x" * (PDF_SIZE + 10))
+
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0)
+
+    assert (output_dir / "续传合同.pdf").read_bytes() == expected["C5"]
+    assert (output_dir / "过长合同.pdf").read_bytes() == expected["C6"]
+    assert list(incoming.iterdir()) == []
+    stats = call_service(fake_services, "/_stats")["pdf"]
+    # C5 只请求剩余的一半；C6 先得到 416，再完整下载一次
+    assert stats["requests"] == 3
+    assert stats["bytes"] == PDF_SIZE // 2 + PDF_SIZE
+
+def test_retry_failed_only_downloads_failed_contracts(fake_services, faults, tmp_path):
+    output_dir = tmp_path / "out"
+    write_csv(tmp_path / "bad.csv", fake_services, [("C11", "失败一"), ("C12", "失败二")])
+    write_csv(tmp_path / "good.csv", fake_services, [("C13", "成功一"), ("C14", "成功二")])
+    faults("pdf", error_rate=1)
+    importFDD.download_contracts(str(tmp_path / "bad.csv"), str(output_dir),
+                                 max_retries=1, retry_delay=0)
+    faults("pdf", error_rate=0)
+    importFDD.download_contracts(str(tmp_path / "good.csv"), str(output_dir), retry_delay=0)
+
+    rows = manifest_rows(output_dir)
+    assert {contract_id: row[2] for contract_id, row in rows.items()} == {
+        "C11": "failed", "C12": "failed", "C13": "done", "C14": "done"}
+    with open(output_dir / "failed_downloads.csv", encoding="utf-8") as f:
+        assert [line.split(",")[0] for line in f.read().splitlines()[1:]] == ["C11", "C12"]
+
+    call_service(fake_services, "/_reset", {})
+    importFDD.download_contracts(None, str(output_dir), retry_delay=0, retry_failed=True)
+
+    # 只重新请求清单中失败的两份合同，成功后状态和哈希写回清单
+    assert call_service(fake_services, "/_stats")["pdf"]["requests"] == 2
+    rows = manifest_rows(output_dir)
+    assert all(row[2] == "done" for row in rows.values())
+    assert rows["C11"][3] == sha256_of("C11")
+    assert (output_dir / "失败二.pdf").read_bytes() == pdf_bytes("C12", PDF_SIZE)
+    conn = importFDD.open_manifest(str(output_dir))
+    try:
+        attempts = dict(conn.execute("SELECT contract_id, attempts FROM contracts"))
+    finally:
+        conn.close()
+    assert attempts == {"C11": 2, "C12": 2, "C13": 1, "C14": 1}
+
+def test_host_scheduler_round_robin_and_per_host_limit():
+    scheduler = importFDD.HostScheduler(per_host_limit=2, retry_delay=0)
+    for n in range(3):
+        scheduler.add("a", f"a{n}")
+    scheduler.add("b", "b0")
+
+    taken = [scheduler.next_ready() for _ in range(4)]
+
+    # 两个主机轮流出队，a 的在途任务达到上限后不再分派
+    assert taken == [("a", "a0"), ("b", "b0"), ("a", "a1"), None]
+    scheduler.finished("a")
+    assert scheduler.next_ready() == ("a", "a2")
+    assert len(scheduler) == 0
+
+def test_host_scheduler_pauses_throttled_host(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(importFDD.time, "monotonic", lambda: now[0])
+    scheduler = importFDD.HostScheduler(per_host_limit=1, retry_delay=0)
+    scheduler.add("a", "a0")
+    scheduler.add("b", "b0")
+    host, task = scheduler.next_ready()
+    scheduler.finished(host, throttled=True, retry_after=5)
+    scheduler.add(host, task, front=True)
+
+    # 被限流的主机按 Retry-After 暂停，其他主机照常分派
+    assert scheduler.next_ready() == ("b", "b0")
+    assert scheduler.next_ready() is None
+    assert scheduler.next_wakeup() == 5
+    now[0] += 5
+    assert scheduler.next_ready() == ("a", "a0")
+
+def test_token_bucket_caps_average_rate():
+    bucket = importFDD.TokenBucket(50)
+    started = time.monotonic()
+    threads = [threading.Thread(target=lambda: [bucket.consume() for _ in range(25)])
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 桶初始有50个令牌，其余50个按每秒50个补充
+    assert time.monotonic() - started >= 0.9
+
+def test_throttled_downloads_are_requeued_until_done(fake_services, faults, tmp_path):
+    faults("pdf", throttle_rate=0.3, retry_after=0)
+    csv_path = tmp_path / "contracts.csv"
+    write_csv(csv_path, fake_services, [(f"C{n}", f"合同{n}") for n in range(20)])
+
+    importFDD.download_contracts(str(csv_path), str(tmp_path / "out"), max_retries=1,
+                                 retry_delay=0, workers=4, max_rps=200)
+
+    stats = call_service(fake_services, "/_stats")["pdf"]
+    assert stats["throttled"] > 0
+    assert stats["ok"] == 20
+    assert all(row[2] == "done" for row in manifest_rows(tmp_path / "out").values())
+
+def index_text(output_dir, documents):
+    """直接写入提取好的文本（跳过PDF解析），返回索引器"""
+    indexer = importFDD.TextIndexer(str(output_dir), processes=1)
+    try:
+        for contract_id, name, text in documents:
+            indexer.save(contract_id, name, sha256_of(contract_id), 0, 0, 1, text, None)
+    finally:
+        indexer.close()
+    return indexer
+
+def test_search_contracts_matches_single_characters_and_phrases(tmp_path):
+    index_text(tmp_path, [
+        ("C1", "推广合同", "甲方委托乙方运营小红书，推广费用按月结算。"),
+        ("C2", "采购合同", "乙方向甲方供应办公用品，Payment within 30 days。"),
+    ])
+
+    def found(query):
+        return [row[0] for row in importFDD.search_contracts(str(tmp_path), query)]
+
+    # 单字命中词中间和末尾的字，不只是二元词元的开头
+    assert found("书") == ["C1"]
+    assert found("红") == ["C1"]
+    assert set(found("用")) == {"C1", "C2"}
+    assert found("小红书") == ["C1"]
+    assert found("红小") == []
+    assert found("payment 办公") == ["C2"]
+    assert found("推广 采购") == []
+    snippet = importFDD.search_contracts(str(tmp_path), "书")[0][3]
+    assert "小红【书】" in snippet
+
+def test_old_text_index_is_cleared_for_reindex(tmp_path):
+    index_text(tmp_path, [("C1", "推广合同", "小红书推广")])
+    conn = importFDD.open_text_index(str(tmp_path))
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    conn = importFDD.open_text_index(str(tmp_path))
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 0
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == importFDD.TEXT_INDEX_VERSION
+    finally:
+        conn.close()
+
+def test_download_with_text_extraction_indexes_contracts(fake_services, tmp_path):
+    csv_path = tmp_path / "contracts.csv"
+    output_dir = tmp_path / "out"
+    write_csv(csv_path, fake_services, [("C1", "小红书推广合同"), ("C2", "办公采购合同")])
+
+    importFDD.download_contracts(str(csv_path), str(output_dir), retry_delay=0, extract_text=True)
+
+    # 假服务的PDF没有文本层，合同名称仍然进入索引
+    assert [row[0] for row in importFDD.search_contracts(str(output_dir), "书")] == ["C1"]
+    assert {row[0] for row in importFDD.search_contracts(str(output_dir), "合同")} == {"C1", "C2"}
+    indexer = importFDD.TextIndexer(str(output_dir), processes=1)
+    try:
+        assert not indexer.submit("C1", "小红书推广合同", sha256_of("C1"))
+    finally:
+        indexer.close()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+import json
+import asyncio
+import sqlite3
+import time
+
+import reading_tracker
+from async_http import serve, HTTPError
+
+def record(article_id, reader="甲"):
+    return reading_tracker.parse_record({"article_id": article_id, "reader": reader,
+                                         "is_read": "是", "notes": "笔记"})
+
+def saved_ids(db_file):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {row[0] for row in conn.execute("SELECT article_id FROM reading_state")}
+    finally:
+        conn.close()
+
+def test_failed_flush_is_retried_and_flusher_survives(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "reading.db")
+    monkeypatch.setattr(reading_tracker, "WRITE_FLUSH_INTERVAL", 0.01)
+    monkeypatch.setattr(reading_tracker, "WRITE_RETRY_DELAY", 0.01)
+
+    async def scenario():
+        store = reading_tracker.ReadingStore(db_file)
+        write = store.write
+        failures = []
+
+        def flaky_write(records):
+            if not failures:
+                failures.append(records)
+                raise sqlite3.OperationalError("database is locked")
+            write(records)
+
+        store.write = flaky_write
+        store.start()
+        try:
+            store.put(record("A1"))
+            await asyncio.sleep(0.2)
+            assert failures and not store.flusher.done()
+            # 失败后记录仍可读到，重试成功后写入数据库
+            assert saved_ids(db_file) == {"A1"}
+            assert not store.pending
+            store.put(record("A2"))
+            await asyncio.sleep(0.1)
+            assert saved_ids(db_file) == {"A1", "A2"}
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
+
+def test_put_returns_503_when_flusher_has_stopped(tmp_path):
+    async def scenario():
+        store = reading_tracker.ReadingStore(str(tmp_path / "reading.db"))
+        store.start()
+        store.flusher.cancel()
+        await asyncio.sleep(0)
+        try:
+            store.put(record("A1"))
+        except HTTPError as e:
+            assert e.status == 503
+        else:
+            raise AssertionError("应返回 503")
+        finally:
+            await store.close()
+
+    asyncio.run(scenario())
+
+async def raw_request(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+def test_bad_content_length_returns_400():
+    async def handler(request):
+        raise AssertionError("不应调用")
+
+    async def scenario():
+        server = await serve(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            for value in ("-5", "abc"):
+                response = await raw_request(port, (
+                    f"POST /api/reading HTTP/1.1\r\nHost: x\r\nContent-Length: {value}\r\n\r\n{{}}"
+                ).encode("ascii"))
+                head, _, body = response.partition(b"\r\n\r\n")
+                assert head.startswith(b"HTTP/1.1 400 "), head
+                assert "Content-Length" in json.loads(body)["error"]
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(scenario())
+
+class SlowConnection:
+    """第一次批量写入前等待一段时间的数据库连接，记录写入时的异常"""
+
+    def __init__(self, conn, started, loop):
+        self.conn = conn
+        self.started = started
+        self.loop = loop
+        self.errors = []
+
+    def __enter__(self):
+        return self.conn.__enter__()
+
+    def __exit__(self, *exc_info):
+        return self.conn.__exit__(*exc_info)
+
+    def executemany(self, sql, records):
+        if not self.started.is_set():
+            self.loop.call_soon_threadsafe(self.started.set)
+            time.sleep(0.2)
+        try:
+            return self.conn.executemany(sql, records)
+        except Exception as e:
+            self.errors.append(e)
+            raise
+
+    def close(self):
+        self.conn.close()
+
+def test_close_waits_for_flusher_and_writes_pending_records(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "reading.db")
+    monkeypatch.setattr(reading_tracker, "WRITE_FLUSH_INTERVAL", 0.01)
+
+    async def scenario():
+        store = reading_tracker.ReadingStore(db_file)
+        started = asyncio.Event()
+        store.write_conn = SlowConnection(store.write_conn, started, asyncio.get_running_loop())
+        store.start()
+        store.put(record("A1"))
+        # 后台提交正在线程中写入时关闭，新记录还没有进入任何批次
+        await started.wait()
+        store.put(record("A2"))
+        await store.close()
+        assert store.flusher.done()
+        assert not store.pending
+        # 等待被取消的提交线程结束
+        await asyncio.sleep(0.3)
+        return store.write_conn.errors
+
+    assert asyncio.run(scenario()) == []
+    assert saved_ids(db_file) == {"A1", "A2"}
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import scys_crawler
+from gen_data import article_item
+from conftest import call_service, FAKE_ARTICLES
+
+PAGE_SIZE = 20
+
+@pytest.fixture
+def crawler(fake_services, faults, tmp_path, monkeypatch):
+    """指向假服务和临时数据库的爬虫"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(scys_crawler, "BASE_URL",
+                        fake_services + "/shengcai-web/client/homePage/searchTopic")
+    monkeypatch.setattr(scys_crawler, "DB_FILE", str(tmp_path / "articles.db"))
+    monkeypatch.setattr(scys_crawler, "TOTAL_ARTICLES", FAKE_ARTICLES)
+    monkeypatch.setattr(scys_crawler, "ARTICLES_PER_PAGE", PAGE_SIZE)
+    monkeypatch.setattr(scys_crawler, "CRAWL_RPS", 0)
+    scys_crawler.init_database()
+    yield scys_crawler
+    scys_crawler.close_archive()
+
+def crawl(crawler, incremental):
+    return asyncio.run(crawler.crawl_partitions([""], incremental))[""]
+
+def checkpoint(crawler):
+    conn = crawler.connect_db()
+    try:
+        return crawler.load_checkpoint(conn)
+    finally:
+        conn.close()
+
+def article_requests(fake_services):
+    return call_service(fake_services, "/_stats")["articles"]["requests"]
+
+def existing_articles(crawler, numbers):
+    writer = crawler.ArticleWriter()
+    try:
+        writer.save_page([article_item(n) for n in numbers])
+    finally:
+        writer.close()
+
+def test_first_incremental_run_seeds_high_water_from_database(crawler, fake_services):
+    # 库中已有较旧的文章但没有检查点：应从第1页开始，到达库中最新文章所在页后停止
+    existing_articles(crawler, range(50, FAKE_ARTICLES))
+
+    saved = crawl(crawler, incremental=True)
+
+    assert saved == 50
+    high_water, run_high, next_page = checkpoint(crawler)
+    assert high_water == crawler.article_mark(article_item(0))
+    assert run_high is None and next_page is None
+    # 第4页（文章60-79）整页都不新于高水位，并发预取的页数有限，远少于全部15页
+    assert article_requests(fake_services) < FAKE_ARTICLES // PAGE_SIZE
+
+def test_incremental_run_always_restarts_from_first_page(crawler, fake_services):
+    existing_articles(crawler, range(FAKE_ARTICLES))
+    conn = crawler.connect_db()
+    # 全量爬取在第8页中断留下的断点，增量爬取不应使用，也不应清除
+    crawler.save_checkpoint(conn, "", crawler.article_mark(article_item(0)), None, 8)
+    conn.close()
+
+    assert crawl(crawler, incremental=True) == 0
+    assert checkpoint(crawler)[2] == 8
+
+    # 全量爬取从断点继续，正常结束后清除断点
+    call_service(fake_services, "/_reset", {})
+    crawl(crawler, incremental=False)
+    assert checkpoint(crawler)[2] is None
+    assert article_requests(fake_services) == FAKE_ARTICLES // PAGE_SIZE - 7
+
+def test_full_crawl_then_incremental_run_stops_at_first_page(crawler, fake_services):
+    assert crawl(crawler, incremental=False) == FAKE_ARTICLES
+
+    call_service(fake_services, "/_reset", {})
+    assert crawl(crawler, incremental=True) == 0
+    assert checkpoint(crawler)[0] == crawler.article_mark(article_item(0))
+
+def test_aimd_limiter_grows_slowly_and_halves_on_errors():
+    limiter = scys_crawler.AimdLimiter(8, initial=2)
+    for _ in range(3):
+        limiter.on_success(0.1)
+    # 加性增：每个成功请求增加 1/limit，约一轮并发后才加一
+    assert limiter.allowed == 3
+    for _ in range(50):
+        limiter.on_success(0.1)
+    assert limiter.allowed == 8
+
+    # 延迟明显升高时不再增加
+    limiter.on_error()
+    assert limiter.allowed == 4
+    limiter.on_success(1.0)
+    assert limiter.allowed == 4
+
+    for _ in range(5):
+        limiter.on_error()
+    assert limiter.allowed == 1
+
+def test_crawl_recovers_from_throttled_pages(crawler, fake_services, faults, monkeypatch):
+    monkeypatch.setattr(scys_crawler, "PAGE_RETRIES", 10)
+    fetch_page_async = scys_crawler.fetch_page_async
+
+    async def without_backoff(session, page, page_size, delay=0, *args):
+        return await fetch_page_async(session, page, page_size, 0, *args)
+
+    # 去掉重试前的退避等待，只保留并发减半
+    monkeypatch.setattr(scys_crawler, "fetch_page_async", without_backoff)
+    faults("articles", throttle_rate=0.2, retry_after=0)
+
+    assert crawl(crawler, incremental=False) == FAKE_ARTICLES
+
+    stats = call_service(fake_services, "/_stats")["articles"]
+    assert stats["ok"] == FAKE_ARTICLES // PAGE_SIZE
+    conn = crawler.connect_db()
+    try:
+        assert conn.execute("SELECT COUNT(DISTINCT article_id) FROM articles").fetchone()[0] \
+            == FAKE_ARTICLES
+    finally:
+        conn.close()
+
+def test_article_writer_skips_duplicates_and_respects_limit(crawler):
+    writer = crawler.ArticleWriter()
+    try:
+        # 同一页内重复的文章只算一次，无法解析的条目原位返回 None
+        page = [article_item(0), {"topicDTO": None}, article_item(1), article_item(0)]
+        assert writer.save_page(page) == [("B0", True), (None, False), ("B1", True),
+                                          ("B0", False)]
+        assert writer.save_page([article_item(n) for n in range(5)], limit=2) == [
+            ("B0", False), ("B1", False), ("B2", True), ("B3", True)]
+
+        changed = article_item(2)
+        changed["topicDTO"]["articleContent"] = "更新后的正文"
+        assert writer.save_page([changed]) == [("B2", False)]
+        assert crawler.get_article_content(writer.conn, "B2") != "更新后的正文"
+        assert writer.save_page([changed], update_existing=True) == [("B2", False)]
+        assert crawler.get_article_content(writer.conn, "B2") == "更新后的正文"
+
+        counts = [writer.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                  for table in ("articles", "article_bodies", "article_fts")]
+        assert counts == [4, 4, 4]
+        with pytest.raises(sqlite3.IntegrityError):
+            writer.conn.execute("INSERT INTO articles (article_id) VALUES ('B0')")
+    finally:
+        writer.close()
+
+def test_incremental_run_catches_up_gaps_larger_than_total_articles(crawler, monkeypatch):
+    # 两次同步之间新增了200篇，超过每次的目标数量50篇：仍应一直翻到高水位并推进高水位
+    monkeypatch.setattr(scys_crawler, "TOTAL_ARTICLES", 50)
+    existing_articles(crawler, range(200, FAKE_ARTICLES))
+
+    assert crawl(crawler, incremental=True) == 200
+
+    high_water, run_high, _ = checkpoint(crawler)
+    assert high_water == crawler.article_mark(article_item(0))
+    assert run_high is None
+    conn = crawler.connect_db()
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0] == FAKE_ARTICLES
+    finally:
+        conn.close()
+
+def test_incremental_run_without_high_water_keeps_total_limit(crawler, monkeypatch):
+    # 空库没有高水位，增量爬取等同于全量爬取，仍按目标数量结束
+    monkeypatch.setattr(scys_crawler, "TOTAL_ARTICLES", 50)
+
+    assert crawl(crawler, incremental=True) == 50
+
+def article_rows(crawler):
+    conn = crawler.connect_db()
+    try:
+        return sorted(
+            (article_id, summary, gmt_create, gmt_create_ts, author, crawler.decode_content(body))
+            for article_id, summary, gmt_create, gmt_create_ts, author, body in conn.execute('''
+            SELECT a.article_id, a.ai_summary_content, a.gmt_create, a.gmt_create_ts,
+                   a.author_name, b.content
+            FROM articles a LEFT JOIN article_bodies b ON b.article_id = a.article_id
+            '''))
+    finally:
+        conn.close()
+
+def reset_database(crawler):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(crawler.DB_FILE + suffix):
+            os.remove(crawler.DB_FILE + suffix)
+    crawler.init_database()
+
+def test_replaying_the_archive_rebuilds_identical_rows(crawler):
+    crawl(crawler, incremental=False)
+    crawled = article_rows(crawler)
+    crawler.close_archive()
+    reset_database(crawler)
+
+    assert crawler.replay_archive() == FAKE_ARTICLES
+    assert article_rows(crawler) == crawled
+    assert [row[0] for row in crawler.search_articles("作者7", db_file=crawler.DB_FILE)]
+
+def write_legacy_page(directory, name, numbers):
+    data = {"success": True, "data": {"items": [article_item(n) for n in numbers]}}
+    path = directory / name
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    return path
+
+def test_legacy_files_are_deleted_only_after_verified_replay(crawler, tmp_path, monkeypatch):
+    raw_dir = tmp_path / crawler.RAW_DATA_DIR
+    raw_dir.mkdir()
+    first = write_legacy_page(raw_dir, "20250101_120000_page_1.json", range(0, 20))
+    second = write_legacy_page(raw_dir, "20250101_120000_page_2.json", range(20, 40))
+
+    # 重放没有写入数据库时，原文件必须保留
+    replay_archive = crawler.replay_archive
+    monkeypatch.setattr(crawler, "replay_archive", lambda run_id=None: 0)
+    assert crawler.import_legacy_responses() == 0
+    assert first.exists() and second.exists()
+    monkeypatch.setattr(crawler, "replay_archive", replay_archive)
+
+    assert crawler.import_legacy_responses() == 2
+    assert not first.exists() and not second.exists()
+    assert [row[0] for row in article_rows(crawler)] == sorted(f"B{n}" for n in range(40))
+    records = list(crawler.get_archive().iter_records("legacy-20250101_120000"))
+    # 两次导入都写入了归档，重放按 article_id 去重
+    assert [page for _, page, _, _ in records] == [1, 2, 1, 2]
+    assert records[-1][3]["data"]["items"][0] == article_item(20)
+
+def test_archive_index_commits_in_batches(crawler, tmp_path, monkeypatch):
+    monkeypatch.setattr(scys_crawler, "ARCHIVE_COMMIT_EVERY", 3)
+    archive = crawler.RawArchive(str(tmp_path / "archive"), str(tmp_path / "archive.db"))
+
+    def committed():
+        conn = sqlite3.connect(str(tmp_path / "archive.db"))
+        try:
+            return conn.execute("SELECT COUNT(*) FROM raw_responses").fetchone()[0]
+        finally:
+            conn.close()
+
+    locations = [archive.append({"page": page}, page) for page in range(1, 5)]
+    assert committed() == 3
+    assert archive.read_location(locations[3]) == {"page": 4}
+    archive.close()
+    assert committed() == 4
+
+def test_partitions_crawl_concurrently_with_separate_checkpoints(crawler, fake_services):
+    topics = ["0", "1", "2"]
+    counts = asyncio.run(crawler.crawl_partitions(topics, incremental=False))
+
+    assert counts == {topic: FAKE_ARTICLES // 3 for topic in topics}
+    conn = crawler.connect_db()
+    try:
+        progress = dict((topic, (pages, saved)) for topic, pages, saved in conn.execute(
+            "SELECT topic_type_id, pages_done, saved_total FROM crawl_checkpoints"))
+    finally:
+        conn.close()
+    assert progress == {topic: (FAKE_ARTICLES // 3 // PAGE_SIZE, FAKE_ARTICLES // 3)
+                        for topic in topics}
+
+    # 分区之间和不限分类的爬取共用一张表，按 article_id 去重
+    assert crawl(crawler, incremental=False) == 0
+    assert len(article_rows(crawler)) == FAKE_ARTICLES
+
+    call_service(fake_services, "/_reset", {})
+    counts = asyncio.run(crawler.crawl_partitions(topics, incremental=True))
+    assert counts == {topic: 0 for topic in topics}
+    # 没有增量检查点时各分区都以全表最新的文章为起点，第1页即停止（只多预取几页）
+    assert article_requests(fake_services) < FAKE_ARTICLES // PAGE_SIZE
+    conn = crawler.connect_db()
+    try:
+        for topic in topics:
+            assert crawler.load_checkpoint(conn, topic)[0] == crawler.article_mark(article_item(0))
+    finally:
+        conn.close()
+
+def run_through_gate(gate, requests, hold):
+    """让 requests 个请求通过闸门，返回 (最大在途数, 总耗时)"""
+    active = {"now": 0, "peak": 0}
+
+    async def request():
+        async with gate:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+            await asyncio.sleep(hold)
+            active["now"] -= 1
+
+    async def run():
+        started = time.monotonic()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    return active["peak"], elapsed
+
+def test_request_gate_limits_concurrency_and_rate():
+    peak, _ = run_through_gate(scys_crawler.RequestGate(concurrency=2, rate=0), 10, 0.02)
+    assert peak == 2
+
+    # 不限并发时按每秒50个放行，10个请求至少需要9个间隔
+    _, elapsed = run_through_gate(scys_crawler.RequestGate(concurrency=10, rate=50), 10, 0)
+    assert elapsed >= 9 / 50 - 0.01
+
+BASELINE_SCHEMA = '''
+CREATE TABLE articles (
+    id INTEGER PRIMARY KEY,
+    article_id TEXT,
+    article_content TEXT,
+    ai_summary_content TEXT,
+    gmt_create TEXT,
+    author_name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+def test_migrating_baseline_database(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "old.db")
+    created = 1745000000
+    local = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+    conn = sqlite3.connect(db_file)
+    conn.execute(BASELINE_SCHEMA)
+    conn.executemany(
+        "INSERT INTO articles (article_id, article_content, ai_summary_content, gmt_create,"
+        " author_name) VALUES (?, ?, ?, ?, ?)", [
+            ("A1", "第一篇正文，做小红书", "汇总一", local, "作者甲"),
+            ("A2", "第二篇正文", "汇总二", "", "作者乙"),
+            ("A1", "重复抓取的正文", "重复汇总", local, "作者甲"),
+            ("A3", "第三篇正文" * 100, "汇总三", str(created - 60), "作者丙"),
+        ])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(scys_crawler, "DB_FILE", db_file)
+
+    scys_crawler.init_database()
+
+    conn = scys_crawler.connect_db()
+    try:
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(articles)")]
+        assert "article_content" not in columns
+        rows = conn.execute(
+            "SELECT article_id, ai_summary_content, gmt_create, gmt_create_ts FROM articles"
+            " ORDER BY id").fetchall()
+        # 重复文章只保留最早的一条，时间戳从本地时间或秒级时间戳回填
+        assert rows == [("A1", "汇总一", local, created), ("A2", "汇总二", "", None),
+                        ("A3", "汇总三", str(created - 60), created - 60)]
+        assert conn.execute("SELECT COUNT(*) FROM article_bodies").fetchone()[0] == 3
+        assert scys_crawler.get_article_content(conn, "A1") == "第一篇正文，做小红书"
+        assert scys_crawler.get_article_content(conn, "A3") == "第三篇正文" * 100
+        assert conn.execute("SELECT COUNT(*) FROM article_fts").fetchone()[0] == 3
+        with pytest.raises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO articles (article_id) VALUES ('A2')")
+        before = list(conn.iterdump())
+    finally:
+        conn.close()
+
+    # 再次运行不做任何改动
+    scys_crawler.init_database()
+    conn = scys_crawler.connect_db()
+    try:
+        assert list(conn.iterdump()) == before
+    finally:
+        conn.close()
+
+def save_content(crawler, article_id, content):
+    item = article_item(0)
+    item["topicDTO"].update(entityId=article_id, articleContent=content, aiSummaryContent="")
+    writer = crawler.ArticleWriter()
+    try:
+        writer.save_page([item])
+    finally:
+        writer.close()
+
+def found_articles(crawler, query):
+    return [row[0] for row in crawler.search_articles(query, db_file=crawler.DB_FILE)]
+
+def test_single_character_search_matches_end_of_word(tmp_path, monkeypatch):
+    monkeypatch.setattr(scys_crawler, "DB_FILE", str(tmp_path / "articles.db"))
+    scys_crawler.init_database()
+    save_content(scys_crawler, "S1", "教你做小红书，三个月涨粉")
+    save_content(scys_crawler, "S2", "书单推荐")
+
+    assert sorted(found_articles(scys_crawler, "书")) == ["S1", "S2"]
+    assert found_articles(scys_crawler, "粉") == ["S1"]
+    assert found_articles(scys_crawler, "小红书") == ["S1"]
+    snippets = {row[0]: row[3] for row in scys_crawler.search_articles(
+        "书", db_file=scys_crawler.DB_FILE)}
+    assert snippets["S1"] == "教你做小红【书】，三个月涨粉"
+
+def test_old_search_index_is_rebuilt_with_unigrams(tmp_path, monkeypatch):
+    monkeypatch.setattr(scys_crawler, "DB_FILE", str(tmp_path / "articles.db"))
+    scys_crawler.init_database()
+    save_content(scys_crawler, "S1", "教你做小红书")
+    conn = scys_crawler.connect_db()
+    # 模拟旧版本只有二元词元的索引
+    conn.execute("UPDATE article_fts SET content = ? WHERE rowid = 1", ("教你 你做 做小 小红 红书",))
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+    assert found_articles(scys_crawler, "书") == []
+
+    scys_crawler.init_database()
+
+    assert found_articles(scys_crawler, "书") == ["S1"]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+
+from text_search import bigram_tokens, build_match_query, make_snippet
+
+def test_index_tokens_add_unigrams_after_bigrams():
+    assert bigram_tokens("做小红书 AI工具") == "做小 小红 红书 ai 工具"
+    assert bigram_tokens("做小红书 AI工具", unigrams=True) == \
+        "做小 小红 红书 做 小 红 书 ai 工具 工 具"
+    assert bigram_tokens("书", unigrams=True) == "书"
+    assert bigram_tokens(None) == ""
+
+def test_match_query_uses_exact_tokens():
+    assert build_match_query("书") == '"书"'
+    assert build_match_query("小红书 变现") == '"小红 红书" "变现"'
+    assert build_match_query("，。") == ""
+
+def test_snippet_marks_terms():
+    assert make_snippet("教你做小红书", "书") == "教你做小红【书】"